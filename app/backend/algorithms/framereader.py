@@ -0,0 +1,109 @@
+import subprocess
+from typing import Iterator
+
+import cv2
+import numpy as np
+
+# Sequential frame samplers.
+#
+# Seeking with CAP_PROP_POS_FRAMES makes the decoder restart from the previous
+# keyframe for every sample, so sampling every N frames costs far more than just
+# decoding straight through. These readers walk the stream once: skipped frames
+# are only demuxed/decoded (grab), sampled frames are converted (retrieve).
+
+Box = tuple[int, int, int, int]  # (y0, y1, x0, x1)
+
+
+def is_sampled(i: int, step: int, offset: int = 0) -> bool:
+    return i >= offset and (i - offset) % step == 0
+
+
+def video_size(v_path: str) -> tuple[int, int, int]:
+    cap = cv2.VideoCapture(v_path)
+    try:
+        w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0)
+        h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0)
+        n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    finally:
+        cap.release()
+    return w, h, n
+
+
+def iter_sampled_opencv(
+    v_path: str, step: int, *, offset: int = 0, box: Box | None = None
+) -> Iterator[tuple[int, np.ndarray]]:
+    step = max(1, int(step))
+    cap = cv2.VideoCapture(v_path)
+    try:
+        i = 0
+        while True:
+            if not cap.grab():
+                break
+            if is_sampled(i, step, offset):
+                ok, frame = cap.retrieve()
+                if not ok or frame is None:
+                    break
+                if box is not None:
+                    y0, y1, x0, x1 = box
+                    frame = frame[y0:y1, x0:x1]
+                yield i, frame
+            i += 1
+    finally:
+        cap.release()
+
+
+def iter_sampled_ffmpeg(
+    v_path: str,
+    step: int,
+    *,
+    offset: int = 0,
+    box: Box | None = None,
+    size: tuple[int, int] | None = None,
+) -> Iterator[tuple[int, np.ndarray]]:
+    """Let ffmpeg select, crop and optionally scale the samples so only the
+    requested band (``size`` is the output ``(w, h)``) crosses the pipe."""
+    import ffmpeg
+
+    step = max(1, int(step))
+    w, h, _ = video_size(v_path)
+    y0, y1, x0, x1 = box if box is not None else (0, h, 0, w)
+    out_w, out_h = size if size is not None else (x1 - x0, y1 - y0)
+    if out_w <= 0 or out_h <= 0:
+        # An unreadable size or an empty box would make every read(0) an "empty frame".
+        raise ValueError(f"Cannot sample {v_path}: empty frame size {out_w}x{out_h}")
+
+    stream = ffmpeg.input(v_path).filter("select", f"gte(n,{offset})*not(mod(n-{offset},{step}))")
+    if box is not None:
+        stream = stream.filter("crop", x1 - x0, y1 - y0, x0, y0)
+    if size is not None:
+        stream = stream.filter("scale", out_w, out_h)
+    proc = (
+        stream.output("pipe:", format="rawvideo", pix_fmt="bgr24", vsync=0)
+        .global_args("-loglevel", "error", "-nostdin")
+        .run_async(pipe_stdout=True)
+    )
+    frame_bytes = out_w * out_h * 3
+    try:
+        k = 0
+        while True:
+            buf = proc.stdout.read(frame_bytes)
+            if len(buf) < frame_bytes:
+                break
+            yield offset + k * step, np.frombuffer(buf, np.uint8).reshape(out_h, out_w, 3)
+            k += 1
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+def iter_sampled(
+    v_path: str, step: int, *, offset: int = 0, box: Box | None = None, backend: str = "opencv"
+) -> Iterator[tuple[int, np.ndarray]]:
+    if backend == "ffmpeg":
+        return iter_sampled_ffmpeg(v_path, step, offset=offset, box=box)
+    return iter_sampled_opencv(v_path, step, offset=offset, box=box)
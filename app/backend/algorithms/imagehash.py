@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+
+# Average-hash (aHash) over small grayscale thumbnails, bit-packed.
+#
+# A 16x4 hash is returned as one uint64 per image so Hamming distance is a single
+# XOR + popcount. Larger sizes (e.g. 32x8 for cache keys) come back as packed
+# uint8 rows. Batches are thresholded and packed in one vectorized pass.
+
+
+def _thumbnails(images, size: tuple[int, int]) -> np.ndarray:
+    w, h = size
+    out = np.empty((len(images), h, w), dtype=np.float32)
+    for k, img in enumerate(images):
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        out[k] = cv2.resize(img, (w, h), interpolation=cv2.INTER_AREA)
+    return out
+
+
+def ahash_batch(images, size: tuple[int, int] = (16, 4)) -> np.ndarray:
+    if len(images) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    gray = _thumbnails(images, size).reshape(len(images), -1)
+    bits = gray > gray.mean(axis=1, keepdims=True)
+    packed = np.packbits(bits, axis=1)
+    if packed.shape[1] == 8:
+        return np.ascontiguousarray(packed).view(">u8").astype(np.uint64).reshape(-1)
+    return packed
+
+
+def ahash(image, size: tuple[int, int] = (16, 4)) -> int:
+    packed = ahash_batch([image], size)[0]
+    if isinstance(packed, np.ndarray):
+        return int.from_bytes(packed.tobytes(), "big")
+    return int(packed)
+
+
+def hamming(a, b) -> np.ndarray:
+    diff = np.bitwise_xor(np.asarray(a), np.asarray(b))
+    counts: np.ndarray = np.bitwise_count(diff)
+    if diff.dtype == np.uint8:
+        counts = counts.sum(axis=-1)
+    return counts
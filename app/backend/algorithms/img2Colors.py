@@ -2,9 +2,9 @@ import os
 from collections import Counter
 from PIL import Image
 import numpy as np
-from matplotlib import pyplot as plt
-from scipy.cluster.vq import vq, kmeans
-import math
+from scipy.cluster.vq import vq
+from app.backend.charts import render_to_file
+from .palette import color_histogram, weighted_kmeans
 from .resultsave import resultsave
 
 
@@ -13,36 +13,41 @@ class ColorAnalysis:
         self.filename = filename
 
     def load_image(self):
-        img = Image.open(self.filename)
+        img = Image.open(self.filename).convert("RGB")
         img = img.rotate(-90)
         img.thumbnail((200, 200))
+        points, _ = self.load_weighted(img)
+        return points
+
+    def load_weighted(self, img=None):
+        # 保留 getcolors 的像素计数，作为 k-means 的权重
+        if img is None:
+            img = Image.open(self.filename).convert("RGB")
+            img.thumbnail((200, 200))
         w, h = img.size
         points = []
+        counts = []
         for count, color in img.getcolors(w * h):
-            points.append(color)
-        return points
+            points.append(color[:3])
+            counts.append(count)
+        return points, counts
 
-    def kmeans(self, imgdata, n):
-        data = np.array(imgdata, dtype=float)
-        centers, loss = kmeans(data, n)
+    def kmeans(self, imgdata, n, weights=None):
+        # 量化直方图 + 计数加权 k-means（k-means++ 初始化，固定随机种子）
+        bins, mass = color_histogram(np.array(imgdata, dtype=np.uint8), weights=weights)
+        centers, _ = weighted_kmeans(bins, mass, n)
         centers = np.array(centers, dtype=int)
         return centers
 
-    def calculate_distances(self, centers):
-        imgdata = self.load_image()
-        result = []
-        for one_center in centers:
-            dis = math.sqrt(one_center[0] ** 2 +
-                            one_center[1] ** 2 + one_center[2] ** 2)
-            flag = -1
-            for index, one_color in enumerate(imgdata):
-                temp = math.sqrt((one_color[0] - one_center[0]) ** 2 + (one_color[1] - one_center[1]) ** 2 + (
-                    one_color[2] - one_center[2]) ** 2)
-                if temp < dis:
-                    dis = temp
-                    flag = index
-            result.append(list(imgdata[flag]))
-        return result
+    def calculate_distances(self, centers, imgdata=None):
+        if imgdata is None:
+            imgdata = self.load_image()
+        data = np.array(imgdata, dtype=float)
+        centers = np.array(centers, dtype=float)
+        # 每个聚类中心取图像中最近的真实颜色
+        dist = ((data[None, :, :] - centers[:, None, :]) ** 2).sum(axis=2)
+        nearest = np.argmin(dist, axis=1)
+        return [list(imgdata[i]) for i in nearest]
 
     def rgb_to_hex(self, real_color):
         colors_16 = []
@@ -92,13 +97,13 @@ class ColorAnalysis:
 
         for i in imglist:
             self.filename = os.path.join(frame_dir, i)
-            imgdata = self.load_image()
+            imgdata, counts = self.load_weighted()
             if not imgdata:
                 realcolor = [[0, 0, 0] for _ in range(colorsC)]
             else:
                 cluster_count = min(colorsC, len(imgdata))
-                colors = self.kmeans(imgdata, cluster_count)  # 提取几种色彩
-                realcolor = self.calculate_distances(colors)
+                colors = self.kmeans(imgdata, cluster_count, counts)  # 提取几种色彩
+                realcolor = self.calculate_distances(colors, imgdata)
                 realcolor = self.normalize_color_count(realcolor, colorsC)
             color_16 = self.rgb_to_hex(realcolor)
             allcolor_16 += color_16
@@ -122,27 +127,20 @@ class ColorAnalysis:
 
     def analysis1img(self, imgpath, colorC):
         self.filename = imgpath
-        imgdata = self.load_image()
+        imgdata, counts = self.load_weighted()
         if not imgdata:
             realcolor = [[0, 0, 0] for _ in range(colorC)]
         else:
             cluster_count = min(colorC, len(imgdata))
-            colors = self.kmeans(imgdata, cluster_count)  # 提取几种色彩
-            realcolor = self.calculate_distances(colors)
+            colors = self.kmeans(imgdata, cluster_count, counts)  # 提取几种色彩
+            realcolor = self.calculate_distances(colors, imgdata)
             realcolor = self.normalize_color_count(realcolor, colorC)
         color_16 = self.rgb_to_hex(realcolor)
         self.drawpie(imgdata, realcolor, color_16)
 
     def drawpie(self, imgdata, colors, colors_16):
-        cluster1, _ = vq(imgdata, colors)
+        cluster1, _ = vq(np.array(imgdata, dtype=float), np.array(colors, dtype=float))
         result = Counter(cluster1.tolist())
         sizes = [result.get(idx, 0) for idx in range(len(colors))]
-        plt.style.use("dark_background")
-        plt.pie(x=sizes,  # 指定绘图数据
-                colors=colors_16,  # 为饼图添加标签说明
-                wedgeprops=dict(width=0.2, edgecolor='w'),  # 设置环图
-                labels=colors_16,
-                autopct='%1.2f%%',
-                )
-        plt.savefig('/'.join(self.filename.split("/")[:2]) + '/colortmp.png')
-        # plt.show()
+        render_to_file("palette", {"colors": colors_16, "sizes": sizes},
+                       '/'.join(self.filename.split("/")[:2]) + '/colortmp.png')
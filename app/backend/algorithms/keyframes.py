@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+import cv2
+import numpy as np
+
+from app.backend.cancellation import cancellable
+
+# Keyframe encoding.
+#
+# Shot keyframes used to be written as full-resolution PNGs on the decoding
+# thread. KeyframeWriter takes the decoded frame, downsizes it to max_dim,
+# encodes it (JPEG by default, PNG/WebP configurable) together with a small
+# thumbnail, and does all of that on a thread pool: cv2.imencode releases the
+# GIL, so encoding overlaps decoding of the next keyframe. Decoding is faster
+# than encoding, so submit() blocks once 2 x workers frames are waiting: only a
+# bounded number of full-resolution frames is ever held in memory. Bytes
+# written and encode time are recorded per frame.
+
+FORMATS = {
+    "jpg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+    "png": (".png", cv2.IMWRITE_PNG_COMPRESSION),
+}
+FRAME_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+
+
+def _fit(image: np.ndarray, max_dim: int | None) -> np.ndarray:
+    h, w = image.shape[:2]
+    if not max_dim or max(h, w) <= max_dim:
+        return image
+    scale = max_dim / max(h, w)
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+class KeyframeWriter:
+    def __init__(
+        self,
+        frame_dir: str,
+        fmt: str = "jpg",
+        quality: int = 90,
+        max_dim: int | None = 1920,
+        thumb_dim: int | None = 320,
+        thumb_dir: str | None = None,
+        workers: int | None = None,
+    ) -> None:
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported keyframe format: {fmt}")
+        self.frame_dir = frame_dir
+        self.thumb_dir = (thumb_dir or f"{frame_dir.rstrip(os.sep)}_thumb") if thumb_dim else None
+        self.fmt = fmt
+        self.ext, flag = FORMATS[fmt]
+        # PNG takes a compression level (0-9) instead of a quality.
+        level = 3 if fmt == "png" else max(1, min(100, int(quality)))
+        self._params = [int(flag), level]
+        self.max_dim = max_dim
+        self.thumb_dim = thumb_dim
+        workers = workers or min(4, os.cpu_count() or 1)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="keyframes")
+        self._slots = threading.BoundedSemaphore(2 * workers)
+        self._futures: list[Future] = []
+        self._lock = threading.Lock()
+        self._frames: list[dict[str, Any]] = []
+
+    def __enter__(self) -> "KeyframeWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def clear(self) -> None:
+        for d in (self.frame_dir, self.thumb_dir):
+            if d is None:
+                continue
+            os.makedirs(d, exist_ok=True)
+            for name in os.listdir(d):
+                os.remove(os.path.join(d, name))
+
+    def filename(self, name: str) -> str:
+        return name + self.ext
+
+    def _encode(self, image: np.ndarray, dim: int | None, path: str) -> int:
+        ok, buf = cv2.imencode(self.ext, _fit(image, dim), self._params)
+        if not ok:
+            raise RuntimeError(f"Encoding {path} failed")
+        with open(path, "wb") as f:
+            f.write(buf.tobytes())
+        return int(buf.size)
+
+    def _write(self, name: str, image: np.ndarray) -> None:
+        try:
+            self._write_frame(name, image)
+        finally:
+            self._slots.release()
+
+    def _write_frame(self, name: str, image: np.ndarray) -> None:
+        start = time.perf_counter()
+        filename = self.filename(name)
+        size = self._encode(image, self.max_dim, os.path.join(self.frame_dir, filename))
+        thumb_size = 0
+        if self.thumb_dir is not None:
+            thumb_size = self._encode(image, self.thumb_dim, os.path.join(self.thumb_dir, filename))
+        with self._lock:
+            self._frames.append(
+                {
+                    "file": filename,
+                    "bytes": size,
+                    "thumbBytes": thumb_size,
+                    "encodeMs": round((time.perf_counter() - start) * 1000, 2),
+                }
+            )
+
+    def submit(self, name: str, image: np.ndarray | None) -> Future | None:
+        if image is None:
+            return None
+        os.makedirs(self.frame_dir, exist_ok=True)
+        if self.thumb_dir is not None:
+            os.makedirs(self.thumb_dir, exist_ok=True)
+        # Waits while 2 x workers frames are queued or encoding.
+        self._slots.acquire()
+        try:
+            fut = self._executor.submit(self._write, name, image)
+        except BaseException:
+            self._slots.release()
+            raise
+        self._futures.append(fut)
+        return fut
+
+    def close(self) -> dict[str, Any]:
+        futures, self._futures = self._futures, []
+        for fut in futures:
+            fut.result()
+        self._executor.shutdown(wait=True)
+        return self.stats
+
+    @property
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            frames = sorted(self._frames, key=lambda f: f["file"])
+        encode_ms = [f["encodeMs"] for f in frames]
+        return {
+            "format": self.fmt,
+            "frameDir": self.frame_dir,
+            "thumbDir": self.thumb_dir,
+            "count": len(frames),
+            "bytes": sum(f["bytes"] for f in frames),
+            "thumbBytes": sum(f["thumbBytes"] for f in frames),
+            "encodeSec": round(sum(encode_ms) / 1000, 3),
+            "encodeMsPerFrame": round(sum(encode_ms) / len(frames), 2) if frames else 0.0,
+            "frames": frames,
+        }
+
+
+def extract_keyframes(v_path, number, writer):
+    cap = cv2.VideoCapture(v_path)
+    # print(cap)
+    frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    # print(frame_count)
+    frame_len = len(str((int)(frame_count)))
+    shot_len = []
+    start = 0
+    # 第一帧的图片
+    i = 0
+    _, img1 = cap.read()
+    writer.submit("frame" + ('%0{}d'.format(frame_len)) % i, img1)
+
+    # 后续的分镜图片（每个关键帧之间检查取消，取消时同样释放解码器和编码线程）
+    try:
+        for i in cancellable(number):
+            i = i + 1
+            cap.set(cv2.CAP_PROP_POS_FRAMES, i)
+            _, img2 = cap.read()
+            j = ('%0{}d'.format(frame_len)) % i
+            writer.submit("frame" + str(j), img2)
+            shot_len.append([start, i, i - start])
+            start = i
+    finally:
+        cap.release()
+        writer.close()
+    return shot_len
@@ -1,6 +1,7 @@
 import os
 import numpy as np
 from collections import Counter
+from functools import lru_cache
 
 from PIL import Image
 import csv
@@ -9,12 +10,27 @@ import torch.nn
 import torchvision.models as models
 import torch.cuda
 from torchvision import transforms
+from app.backend.cancellation import cancellable
+from app.backend.embedding_cache import frame_key
 from .wordcloud2frame import WordCloud2Frame
 
+FRAME_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.webp', '.bmp']
+
+
+@lru_cache(maxsize=None)
+def get_vgg19():
+    # VGG19 权重只加载一次，之后每次检测复用同一个 eval 模型
+    model = models.vgg19(pretrained=True)
+    model = model.eval()
+    if torch.cuda.is_available():
+        model.cuda()
+    return model
+
 
 class ObjectDetection:
     def __init__(self, image_path):
         self.image_path = image_path
+        self.frame_keys = {}
         self.transform = transforms.Compose([
             transforms.Resize(256),
             transforms.CenterCrop(224),
@@ -25,63 +41,76 @@ class ObjectDetection:
             )])
 
     def make_model(self):
-        model = models.vgg19(pretrained=True)
-        model = model.eval()
-        if torch.cuda.is_available():
-            model.cuda()
-        return model
-
-    def object_detection(self):
-        model = self.make_model()
-        if self.image_path is None or self.image_path == '':
-            return
-
-        file_list = os.listdir(self.image_path+"/frame/")
-        framelist = []
+        return get_vgg19()
 
+    def load_classes(self):
         # Use absolute path to the imagenet_classes.txt file
         classes_file_path = os.path.join(
             os.path.dirname(__file__), 'imagenet_classes.txt')
         with open(classes_file_path, 'r') as f:
-            classes = [line.strip() for line in f.readlines()]
-        for file_name in file_list:
-            if os.path.splitext(file_name)[-1] in ['.jpg', '.png', '.bmp']:
-                img_path = self.image_path+"/frame/"+file_name
-                img_t = self.transform(Image.open(img_path))
+            return [line.strip() for line in f.readlines()]
 
+    def embed(self, paths, cache=None, top_k=5, batch_size=8):
+        # 每张关键帧返回 {"key", "embedding", "labels", "scores"}：
+        # embedding 为 VGG19 倒数第二层（第二个全连接层，4096 维）的输出，labels/scores 为 top-k 类别。
+        # 命中缓存（按帧文件内容哈希）的帧不再跑网络，未命中的按 batch 前向后写回缓存
+        keys = [frame_key(p) for p in paths]
+        results = cache.get_many(set(keys)) if cache is not None else {}
+        # 内容相同的帧只算一次
+        missing = sorted({k: i for i, k in enumerate(keys) if k not in results}.values())
+        if missing:
+            model = self.make_model()
+            classes = self.load_classes()
+            batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+            for batch in cancellable(batches):
+                batch_t = torch.stack([self.transform(Image.open(paths[i]).convert('RGB')) for i in batch])
                 if torch.cuda.is_available():
-                    batch_t = torch.unsqueeze(img_t, 0).cuda()
-                else:
-                    batch_t = torch.unsqueeze(img_t, 0)
+                    batch_t = batch_t.cuda()
+                # 与 model(batch_t) 相同的前向，只是在最后一个全连接层之前取出特征
+                with torch.no_grad():
+                    x = torch.flatten(model.avgpool(model.features(batch_t)), 1)
+                    features = model.classifier[:-1](x)
+                    out = model.classifier[-1](features)
+                percentage = torch.nn.functional.softmax(out, dim=1) * 100
+                top = torch.topk(percentage, top_k, dim=1)
+                # 缓存按 float16 存储：新算出的 embedding 也先舍入到 float16，保证命中与否结果一致
+                embeddings = features.cpu().numpy().astype(np.float16).astype(np.float32)
+                for row, i in enumerate(batch):
+                    entry = {
+                        'embedding': embeddings[row],
+                        'labels': [classes[j] for j in top.indices[row].tolist()],
+                        'scores': [round(v, 4) for v in top.values[row].tolist()],
+                    }
+                    results[keys[i]] = entry
+                    if cache is not None:
+                        cache.put(keys[i], **entry)
+        return [dict(results[k], key=k) for k in keys]
 
-                out = model(batch_t)
-                _, indices = torch.sort(out, descending=True)
-                percentage = torch.nn.functional.softmax(out, dim=1)[0] * 100
+    def object_detection(self, plot=True, write_csv=True, cache=None, top_k=5):
+        if self.image_path is None or self.image_path == '':
+            return
 
-                for idx in indices[0][:1]:
-                    frame_id = file_name[5:-4]
-                    framelist.append(
-                        [frame_id, (classes[idx], percentage[idx].item())[0]])
+        frame_dir = self.image_path + "/frame/"
+        file_list = [f for f in os.listdir(frame_dir) if os.path.splitext(f)[-1].lower() in FRAME_EXTENSIONS]
+        entries = self.embed([frame_dir + f for f in file_list], cache=cache, top_k=top_k)
+        # 帧文件 -> 内容哈希，调用方据此从缓存取 embedding（场景分组、去重、相似检索）
+        self.frame_keys = {f: e['key'] for f, e in zip(file_list, entries)}
+        framelist = [[os.path.splitext(f)[0][5:], e['labels'][0]] for f, e in zip(file_list, entries)]
 
-        self.object_detection_csv(framelist, self.image_path)
+        # write_csv=False 时由调用方写入列式结果存储，CSV 按需导出
+        if write_csv:
+            self.object_detection_csv(framelist, self.image_path, plot)
+        return framelist
 
-    def object_detection_csv(self, framelist, save_path):
-        csv_file = open(os.path.join(
-            save_path, 'objects.csv'), "w+", newline='')
+    def object_detection_csv(self, framelist, save_path, plot=True):
         name = ['FrameId', 'Top1-Objects']
+        rows = [name] + [[frame_id, label] for frame_id, label in framelist]
+        # 一次性写入，避免逐行写文件
+        with open(os.path.join(save_path, 'objects.csv'), "w", newline='') as csv_file:
+            csv.writer(csv_file).writerows(rows)
 
-        try:
-            writer = csv.writer(csv_file)
-            writer.writerow(name)
-            datarow = []
-
-            for i in range(len(framelist)):
-                datarow = [framelist[i][0]]
-                datarow.append(framelist[i][1])
-                writer.writerow(datarow)
-        finally:
-            csv_file.close()
-
-        wc2f = WordCloud2Frame()
-        tf = wc2f.wordfrequency(os.path.join(save_path, 'objects.csv'))
-        wc2f.plotwordcloud(tf, save_path, "/objects")
+        # plot=False 时由调用方（图表服务）按需渲染词云
+        if plot:
+            wc2f = WordCloud2Frame()
+            tf = wc2f.wordfrequency(os.path.join(save_path, 'objects.csv'))
+            wc2f.plotwordcloud(tf, save_path, "/objects")
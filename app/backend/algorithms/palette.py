@@ -0,0 +1,189 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Generator, cast
+
+import numpy as np
+from PIL import Image
+
+from app.backend.cancellation import cancellable
+
+# Count-weighted palette extraction.
+#
+# Pixels are quantized into a 3D colour histogram (2**bin_bits levels per channel)
+# and k-means runs over the occupied bins weighted by their pixel counts, so a
+# thumbnail with ~40k distinct colours collapses to a few thousand weighted points.
+
+
+def load_pixels(image, max_size: int = 200) -> np.ndarray:
+    if isinstance(image, np.ndarray):
+        return image.reshape(-1, image.shape[-1])[:, :3].astype(np.uint8, copy=False)
+    img: Image.Image = Image.open(image)
+    img.draft("RGB", (max_size, max_size))
+    img = img.convert("RGB")
+    img.thumbnail((max_size, max_size))
+    return np.asarray(img, dtype=np.uint8).reshape(-1, 3)
+
+
+def color_histogram(
+    pixels: np.ndarray, bin_bits: int = 5, weights: np.ndarray | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    pixels = np.asarray(pixels, dtype=np.uint8).reshape(-1, 3)
+    if pixels.size == 0:
+        return np.zeros((0, 3), dtype=float), np.zeros(0, dtype=float)
+    if weights is None:
+        weights = np.ones(len(pixels), dtype=float)
+    weights = np.asarray(weights, dtype=float)
+
+    shift = 8 - bin_bits
+    q = (pixels >> shift).astype(np.int64)
+    index = (q[:, 0] << (2 * bin_bits)) | (q[:, 1] << bin_bits) | q[:, 2]
+    size = 1 << (3 * bin_bits)
+
+    counts = np.bincount(index, weights=weights, minlength=size)
+    occupied = np.nonzero(counts)[0]
+    mass = counts[occupied]
+    # Bin colour is the exact (weighted) mean of its pixels rather than the bin centre.
+    sums = np.stack(
+        [np.bincount(index, weights=weights * pixels[:, c], minlength=size)[occupied] for c in range(3)],
+        axis=1,
+    )
+    return sums / mass[:, None], mass
+
+
+def _sq_distances(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    d = (
+        np.einsum("ij,ij->i", points, points)[:, None]
+        - 2.0 * points @ centers.T
+        + np.einsum("ij,ij->i", centers, centers)[None, :]
+    )
+    out: np.ndarray = np.maximum(d, 0.0)
+    return out
+
+
+def _kmeans_pp(points: np.ndarray, weights: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    n = len(points)
+    centers = np.empty((k, points.shape[1]), dtype=float)
+    centers[0] = points[rng.choice(n, p=weights / weights.sum())]
+    closest = _sq_distances(points, centers[:1])[:, 0]
+    for c in range(1, k):
+        p = weights * closest
+        total = p.sum()
+        if total <= 0:
+            centers[c:] = centers[c - 1]
+            break
+        centers[c] = points[rng.choice(n, p=p / total)]
+        closest = np.minimum(closest, _sq_distances(points, centers[c : c + 1])[:, 0])
+    return centers
+
+
+def weighted_kmeans(
+    points: np.ndarray,
+    weights: np.ndarray,
+    k: int,
+    *,
+    seed: int = 0,
+    max_iter: int = 30,
+    tol: float = 0.5,
+) -> tuple[np.ndarray, np.ndarray]:
+    points = np.asarray(points, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    if len(points) == 0 or k <= 0:
+        return np.zeros((0, points.shape[-1] if points.ndim == 2 else 3)), np.zeros(0)
+    if len(points) <= k:
+        return points.copy(), weights.copy()
+
+    rng = np.random.default_rng(seed)
+    centers = _kmeans_pp(points, weights, k, rng)
+    labels = np.zeros(len(points), dtype=np.int64)
+    for _ in range(max_iter):
+        labels = np.argmin(_sq_distances(points, centers), axis=1)
+        mass = np.bincount(labels, weights=weights, minlength=k)
+        sums = np.stack(
+            [np.bincount(labels, weights=weights * points[:, c], minlength=k) for c in range(points.shape[1])],
+            axis=1,
+        )
+        # Empty clusters keep their previous centre.
+        new_centers = np.where(mass[:, None] > 0, sums / np.maximum(mass, 1e-12)[:, None], centers)
+        shift = float(np.max(np.abs(new_centers - centers)))
+        centers = new_centers
+        if shift <= tol:
+            break
+
+    labels = np.argmin(_sq_distances(points, centers), axis=1)
+    mass = np.bincount(labels, weights=weights, minlength=k)
+    return centers, mass
+
+
+def extract_palette(
+    image,
+    k: int = 5,
+    *,
+    bin_bits: int = 5,
+    max_size: int = 200,
+    seed: int = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return ``(colors, shares)`` sorted by share: ``colors`` is ``(k, 3)`` uint8 RGB,
+    ``shares`` sums to 1. Fewer than ``k`` rows come back for near-flat images."""
+    colors, counts = color_histogram(load_pixels(image, max_size), bin_bits)
+    if len(colors) == 0:
+        return np.zeros((0, 3), dtype=np.uint8), np.zeros(0, dtype=float)
+
+    centers, mass = weighted_kmeans(colors, counts, k, seed=seed)
+    keep = mass > 0
+    centers, mass = centers[keep], mass[keep]
+    order = np.argsort(-mass, kind="stable")
+    rgb = np.clip(np.rint(centers[order]), 0, 255).astype(np.uint8)
+    return rgb, mass[order] / mass.sum()
+
+
+def extract_palettes(
+    images: list,
+    k: int = 5,
+    *,
+    workers: int | None = None,
+    seed: int = 0,
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    task = partial(extract_palette, k=k, seed=seed)
+    workers = min(workers or os.cpu_count() or 1, len(images))
+    # Pool start-up costs more than a handful of thumbnails.
+    if workers <= 1 or len(images) < 16:
+        return [task(img) for img in cancellable(images)]
+
+    chunksize = max(1, len(images) // (workers * 4))
+    # Executor.map returns a generator (typed as a plain Iterator).
+    results = cast(
+        Generator[tuple[np.ndarray, np.ndarray], None, None],
+        _pool(workers).map(task, images, chunksize=chunksize),
+    )
+    try:
+        return list(cancellable(results))
+    finally:
+        # On cancellation, closing the map iterator cancels the chunks that have not started yet.
+        results.close()
+
+
+_POOL: ProcessPoolExecutor | None = None
+_POOL_WORKERS = 0
+_POOL_LOCK = threading.Lock()
+
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    # One spawn pool, reused across calls. The palette stage runs on a stage-graph
+    # thread next to OpenPose (cv2.dnn) and VGG19 (torch), whose thread pools do not
+    # survive fork(); spawning once keeps the interpreter start-up off every film.
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_WORKERS < workers:
+            if _POOL is not None:
+                _POOL.shutdown(wait=False)
+            _POOL = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _POOL_WORKERS = workers
+        return _POOL
+
+
+def rgb_to_hex(rgb) -> str:
+    r, g, b = (int(x) for x in rgb)
+    return f"#{r:02X}{g:02X}{b:02X}"
@@ -1,7 +1,7 @@
 import os
-import cv2
 import csv
-import matplotlib.pyplot as plt
+
+from app.backend.charts import render_to_file
 
 class resultsave:
     def __init__(self, image_save_path):
@@ -10,81 +10,35 @@ class resultsave:
     # 其他方法保持不变...
 
     def diff_csv(self, diff, shot_len):
-        shotcut_csv = open(os.path.join(self.image_save_path, "shotcut.csv"), "w+", newline='')
-        shotlen_csv = open(os.path.join(self.image_save_path, "shotlen.csv"), "w+", newline='')
         name1 = ['Id', 'frameDiff']
         name2 = ['start', 'end', 'length']
 
         if diff != 0:
-            try:
-                writer = csv.writer(shotcut_csv)
-                writer.writerow(name1)
-                for i in range(len(diff)):
-                    writer.writerow([i, diff[i]])
-            finally:
-                shotcut_csv.close()
+            with open(os.path.join(self.image_save_path, "shotcut.csv"), "w", newline='') as shotcut_csv:
+                csv.writer(shotcut_csv).writerows([name1] + [[i, d] for i, d in enumerate(diff)])
 
-        try:
-            writer = csv.writer(shotlen_csv)
-            writer.writerow(name2)
-            for i in range(len(shot_len)):
-                writer.writerow(shot_len[i])
-        finally:
-            shotlen_csv.close()
+        with open(os.path.join(self.image_save_path, "shotlen.csv"), "w", newline='') as shotlen_csv:
+            csv.writer(shotlen_csv).writerows([name2] + [list(row) for row in shot_len])
 
     def plot_transnet_shotcut(self, shot_len):
-        shot_id = [i for i in range(len(shot_len))]
-        shot_length = [shot_len[i][2] for i in range(len(shot_len))]
-        plt.clf()
-        # 创建一个黑底的图形
-        plt.figure(figsize=(8, 6))
-        plt.style.use('dark_background')
-        plt.bar(shot_id, shot_length, color='blue')
-        plt.title('shot length',color="white")
-        plt.savefig(os.path.join(self.image_save_path, 'shotlen.png'))
+        # 面向对象的 Agg 绘图，不使用 pyplot 全局状态
+        lengths = [int(shot_len[i][2]) for i in range(len(shot_len))]
+        render_to_file("shotlen", {"lengths": lengths}, os.path.join(self.image_save_path, 'shotlen.png'))
 
     def color_csv(self, colors):
-        csv_file = open(os.path.join(self.image_save_path, "colors.csv"), "w+", newline='')
         name = ['FrameId']
         color_dim = len(colors[0][1]) if colors else 0
         for i in range(color_dim):
             name.append("Color" + str(i))
 
-        try:
-            writer = csv.writer(csv_file)
-            writer.writerow(name)
-            for i in range(len(colors)):
-                datarow = [colors[i][0][5:-4]]
-                for j in range(color_dim):
-                    datarow.append(colors[i][1][j])
-                writer.writerow(datarow)
-        finally:
-            csv_file.close()
+        rows = [name]
+        for frame_name, flat_colors in colors:
+            frame_id = os.path.splitext(frame_name)[0][5:]
+            rows.append([frame_id] + [int(c) for c in flat_colors[:color_dim]])
+        # 一次性写入，避免逐行写文件
+        with open(os.path.join(self.image_save_path, "colors.csv"), "w", newline='') as csv_file:
+            csv.writer(csv_file).writerows(rows)
 
     def plot_scatter_3d(self, all_colors):
-        plt.clf()
-        plt.style.use('dark_background')
-        movie_colors = []
-
-        for i in all_colors:
-            i = list(i)
-            for j in i:
-                movie_colors.append(list(j))
-
-        x = []
-        y = []
-        z = []
-        dot_color = []
-
-        for c in movie_colors:
-            x.append(c[0])
-            y.append(c[1])
-            z.append(c[2])
-            dot_color.append([c[0] / 255, c[1] / 255, c[2] / 255, 1])
-
-        fig, ax = plt.subplots(subplot_kw={"projection": "3d"})
-        ax.scatter(x, y, z, c=dot_color, edgecolor='black')
-        fig.canvas.manager.set_window_title('imgcolors')
-        plt.title("color analysis")
-        plt.savefig(os.path.join(self.image_save_path, 'colors.png'))
-        # plt.show()
+        colors = [[[int(v) for v in c] for c in group] for group in all_colors]
+        render_to_file("colors3d", {"colors": colors}, os.path.join(self.image_save_path, 'colors.png'))
@@ -1,7 +1,15 @@
 import os
+import threading
+from functools import lru_cache
+
 import numpy as np
 import tensorflow as tf
-import cv2
+
+from app.backend.cancellation import cancellable, check_cancelled, current_token
+from app.backend.instrumentation import span
+from app.backend.shot_metrics import frame_motion
+
+from .keyframes import KeyframeWriter, extract_keyframes
 
 
 def _resolve_transnet_model_dir() -> str:
@@ -73,7 +81,8 @@ class TransNetV2:
 
         predictions = []
 
-        for inp in input_iterator():
+        # 每个 100 帧窗口之间检查取消
+        for inp in cancellable(input_iterator()):
             single_frame_pred, all_frames_pred = self.predict_raw(inp)
             predictions.append((single_frame_pred.numpy()[0, 25:75, 0],
                                 all_frames_pred.numpy()[0, 25:75, 0]))
@@ -100,22 +109,35 @@ class TransNetV2:
                                       "install python wrapper by `pip install ffmpeg-python`.")
 
         # print("[TransNetV2] Extracting frames from {}".format(video_fn))
-        try:
-            video_stream, err = ffmpeg.input(video_fn).output(
+        # 异步启动 ffmpeg：取消时直接 kill 解码进程，stdout 随即结束
+        with span("decode"):
+            process = ffmpeg.input(video_fn).output(
                 "pipe:", format="rawvideo", pix_fmt="rgb24", s="48x27"
-            ).run(capture_stdout=True, capture_stderr=True)
-        except ffmpeg.Error as e:
+            ).run_async(pipe_stdout=True, pipe_stderr=True)
+            token = current_token()
+            unregister = token.on_cancel(process.kill) if token is not None else (lambda: None)
+            err_chunks = []
+            drain = threading.Thread(target=lambda: err_chunks.append(process.stderr.read()), daemon=True)
+            drain.start()
+            try:
+                video_stream = process.stdout.read()
+                process.wait()
+            finally:
+                unregister()
+            drain.join()
+        check_cancelled()
+        if process.returncode != 0:
+            err = b"".join(err_chunks).decode(errors="replace")
             print(f"[TransNetV2] FFmpeg error processing video: {video_fn}")
-            print(
-                f"[TransNetV2] FFmpeg stdout: {e.stdout.decode() if e.stdout else 'No stdout'}")
-            print(
-                f"[TransNetV2] FFmpeg stderr: {e.stderr.decode() if e.stderr else 'No stderr'}")
+            print(f"[TransNetV2] FFmpeg stderr: {err or 'No stderr'}")
             raise RuntimeError(
-                f"FFmpeg failed to process video: {video_fn}. Error: {e.stderr.decode() if e.stderr else str(e)}")
+                f"FFmpeg failed to process video: {video_fn}. Error: {err or process.returncode}")
 
         video = np.frombuffer(video_stream, np.uint8).reshape([-1, 27, 48, 3])
         # print(video)
-        return (video, *self.predict_frames(video))
+        with span("transnetv2") as sp:
+            sp.items = len(video)
+            return (video, *self.predict_frames(video))
 
     @staticmethod
     def predictions_to_scenes(predictions: np.ndarray, threshold: float = 0.5):
@@ -197,79 +219,43 @@ def getFrame_number(f_path):
     return Frame_number
 
 
-def transNetV2_run(v_path, image_save, th):
-    import sys
-    import argparse
+@lru_cache(maxsize=None)
+def get_model():
+    # 权重加载很慢，每个进程只构建一次（API 进程和批处理 worker 都常驻）
+    return TransNetV2()
 
-    # 模型跑完了生成一个分镜帧号的txt
-    model = TransNetV2()
 
-    file = v_path
-    if os.path.exists(file + ".predictions.txt") or os.path.exists(file + ".scenes.txt"):
-        print(f"[TransNetV2] {file}.predictions.txt or {file}.scenes.txt already exists. "
-              f"Skipping video {file}.", file=sys.stderr)
+def detect_cuts(v_path, with_motion=False):
+    # 只跑 TransNetV2，返回每个镜头（最后一个除外）的末帧号；关键帧提取单独做，
+    # 这样分镜结果可以先落盘（断点续跑），之后的阶段失败也不用重跑模型
+    # with_motion=True 时顺便用已解码的 48x27 帧算逐帧运动量，返回 (number, motion)
+    with span("transnetv2_load"):
+        model = get_model()
 
     video_frames, single_frame_predictions, all_frame_predictions = \
-        model.predict_video(file)
-
-    predictions = np.stack(
-        [single_frame_predictions, all_frame_predictions], 1)
-
+        model.predict_video(v_path)
     scenes = model.predictions_to_scenes(single_frame_predictions)
 
-    np.savetxt("video.txt", scenes, fmt="%d")
+    number = [int(end) for _, end in scenes]
+    number.pop()
+    if with_motion:
+        with span("frame_motion") as sp:
+            sp.items = len(video_frames)
+            return number, frame_motion(video_frames)
+    return number
 
-    pil_image = model.visualize_predictions(
-        video_frames, predictions=(single_frame_predictions, all_frame_predictions))
-    # pil_image.save(file + ".vis.png")
 
-    number = []
-    number = getFrame_number("video.txt")
-    number.pop()
+def transNetV2_run(v_path, image_save, th, writer=None):
+    number = detect_cuts(v_path)
 
     frame_save = os.path.join(image_save, "frame")
+    # 关键帧编码交给 writer 的线程池；未指定时保持原来的全分辨率 PNG
+    if writer is None:
+        writer = KeyframeWriter(frame_save, fmt="png", max_dim=None, thumb_dim=None)
     # 删除旧的分镜
-    if not (os.path.exists(image_save)):
-        os.makedirs(image_save, exist_ok=True)
-    if not (os.path.exists(frame_save)):
-        os.makedirs(frame_save, exist_ok=True)
-    else:
-        imgfiles = os.listdir(frame_save)
-        for f in imgfiles:
-            os.remove(os.path.join(frame_save, f))
-    cap = cv2.VideoCapture(v_path)
-    # print(cap)
-    frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-    # print(frame_count)
-    frame_len = len(str((int)(frame_count)))
-    shot_len = []
-    start = 0
-    # 第一帧的图片
-    i = 0
-    _, img1 = cap.read()
-    frameid = ""
-    for j in range(frame_len - len(str(i))):
-        frameid = frameid + "0"
-    cv2.imwrite(frame_save + "/frame" + frameid + str(i) + ".png", img1)
-
-    # 后续的分镜图片
-    _, img1 = cap.read()
-    # for i in range(1, int(frame_count - 1)):
-    #     _, img2 = cap.read()
-    #     if (i in number):
-    #         j = ('%0{}d'.format(frame_len))% i
-    #         cv2.imwrite(frame_save+"/frame"+str(j)+".png", img2)
-    #         shot_len.append([start, i, i - start])
-    #         start = i
-    #     img1 = img2
-    for i in number:
-        i = i + 1
-        cap.set(cv2.CAP_PROP_POS_FRAMES, i)
-        _, img2 = cap.read()
-        j = ('%0{}d'.format(frame_len)) % i
-        cv2.imwrite(frame_save + "/frame" + str(j) + ".png", img2)
-        shot_len.append([start, i, i - start])
-        start = i
-        img1 = img2
+    writer.clear()
+    with span("keyframes") as sp:
+        shot_len = extract_keyframes(v_path, number, writer)
+        sp.items = len(shot_len) + 1
     print("TransNetV2 completed")
     return shot_len
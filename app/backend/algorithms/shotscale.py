@@ -3,11 +3,22 @@ import csv
 import cv2
 import time
 import math
+import threading
 import numpy as np
-from matplotlib import pyplot as plt
-from collections import Counter
+from functools import lru_cache
 
 from app.backend.algorithms.shotscaleconfig import *
+from app.backend.charts import render_to_file
+
+
+@lru_cache(maxsize=None)
+def get_shotscale(keypoint_num=25):
+    # OpenPose 网络每个进程只读一次；cv2.dnn.Net 的 setInput/forward 有状态，
+    # 共享实例时用 predict_lock 串行化
+    return shotscale(keypoint_num)
+
+
+predict_lock = threading.Lock()
 
 
 class shotscale(object):
@@ -324,24 +335,6 @@ class shotscale(object):
             shotscale_csv.close()
 
     def shotscale_plot(self, detectInfo, image_save):
-
-        # 饼图
+        # 饼图（面向对象的 Agg 绘图，不使用 pyplot 全局状态）
         categories = [item[1] for item in detectInfo]
-        category_counts = Counter(categories)
-        sizes = [(count / len(categories)) *
-                 100 for count in category_counts.values()]
-        labels = list(category_counts.keys())
-
-        inner_radius = 0.5
-        width = 0.3
-        plt.clf()
-        plt.style.use('dark_background')
-        plt.pie(sizes, labels=labels, autopct='%0.1f%%', shadow=True, pctdistance=0.5,
-                wedgeprops=dict(width=width, edgecolor='w'))
-        centre_circle = plt.Circle((0, 0), inner_radius, fc='black')
-        fig = plt.gcf()
-        fig.gca().add_artist(centre_circle)
-        plt.title('Shot Scale')
-        plt.axis('equal')
-        plt.savefig(image_save + '/shotscale.png')
-        # plt.show()
+        render_to_file("shotscale", {"labels": categories}, image_save + '/shotscale.png')
@@ -1,66 +1,147 @@
 import os
 import re
+import time
+from collections import OrderedDict
+from functools import lru_cache
 
 import easyocr
-import cv2
 import csv
+import numpy as np
+from app.backend.algorithms.framereader import iter_sampled, video_size
+from app.backend.cancellation import cancellable
+from app.backend.algorithms.imagehash import ahash, ahash_batch, hamming
+from app.backend.algorithms.subtitleband import default_subtitle_roi, locate_subtitle_band
 from app.backend.algorithms.wordcloud2frame import WordCloud2Frame
 
 
+@lru_cache(maxsize=None)
+def get_reader(langs=('ch_sim', 'en')):
+    # easyocr.Reader 加载检测/识别模型很慢，每个进程只构建一次
+    return easyocr.Reader(list(langs))
+
+
+class OcrCache:
+    # 以字幕区域的 32x8 aHash 为键的 LRU 缓存，重复出现的字幕不再识别
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def get(self, key):
+        if key not in self._items:
+            return None
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+
 class SubtitleProcessor:
-    def __init__(self):
-        self.reader = easyocr.Reader(['ch_sim', 'en'])
+    def __init__(self, ocr_batch=16, cache_size=512):
+        self.reader = get_reader()
+        self.ocr_batch = ocr_batch
+        self.cache = OcrCache(cache_size)
+        self.stats = {}
+
+    def getsubtitleEasyOcr(self, v_path, save_path, subtitleValue, backend="opencv", batch_size=64,
+                           on_subtitles=None, plot=True, roi=None):
+        w, h, _ = video_size(v_path)
+        # 字幕检测区域：默认下五分之一、中间五分之四（参考帧与采样帧使用同一区域）；
+        # roi="auto" 时先抽样定位字幕条带，只解码/识别该区域
+        roi_info = {"source": "default"}
+        if roi == "auto":
+            roi, roi_info = locate_subtitle_band(v_path)
+        elif roi is not None:
+            roi_info = {"source": "given"}
+        if roi is None or roi[1] <= roi[0] or roi[3] <= roi[2]:
+            roi = default_subtitle_roi(h, w)
 
-    def getsubtitleEasyOcr(self, v_path, save_path, subtitleValue):
-        path = v_path
-        cap = cv2.VideoCapture(path)
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         subtitleList = []
         subtitleStr = ""
-        i = 0
-        _, frame = cap.read(i)
-        h, w = frame.shape[0:2]  # 图片尺寸，截取下三分之一和中间五分之四作为字幕检测区域
-        start_h = (h // 3)*2
-        end_h = h
-        start_w = w // 20
-        end_w = (w // 20) * 19
-        img1 = frame[start_h:end_h, start_w:end_w, :]
-        i = i+1
+        ref_hash = None
         th = 0.2
-        while i < frame_count:
-            if img1 is None:
-                break
-            cap.set(cv2.CAP_PROP_POS_FRAMES, i)
-            _, frame = cap.read(i)
-            h, w = frame.shape[0:2]  # 图片尺寸，截取下五分之一和中间五分之四作为字幕检测区域
-            start_h = (h // 5)*4
-            end_h = h
-            start_w = w // 10
-            end_w = (w // 10) * 9
-            img2 = frame[start_h:end_h, start_w:end_w]
-            subtitle_event = self.subtitleDetect(img1, img2, th)
-            if subtitle_event:
-                wordslist = self.reader.readtext(img2)
-                # print("wordlist",wordslist)
-                # subtitleStr=subtitleStr+
-                for w in wordslist:
-                    # print('w',w,w[1])
-                    if w[1] is not None:
-                        print("w1", w[1])
-                        if (not subtitleList or w[1]+'\n' != subtitleList[-1][1]) and (not self.contains_english(w[1])):
-                            subtitleList.append([i, w[1]])
-                            subtitleStr = subtitleStr+w[1]+'\n'
-            else:
-                img1 = img2
-            i = i + subtitleValue
-            # 12-120，默认48帧
-        cap.release()
-        wc2f = WordCloud2Frame()
-        tf = wc2f.wordfrequencyStr(subtitleStr)
-        wc2f.plotwordcloud(tf, save_path, "subtitle")
+        pending = []
+        self.stats = {"samples": 0, "changes": 0, "ocrImages": 0, "ocrBatches": 0,
+                      "cacheHits": 0, "ocrSeconds": 0.0, "roi": list(roi), "roiInfo": roi_info,
+                      "roiAreaRatio": round((roi[1] - roi[0]) * (roi[3] - roi[2]) / max(1, w * h), 4)}
+        start = time.perf_counter()
+        # 顺序解码：跳过的帧只 grab，不做 seek（12-120，默认48帧）
+        # 每个采样帧之前检查取消
+        frames = cancellable(iter_sampled(v_path, subtitleValue, box=roi, backend=backend))
+        for batch in self.batched(frames, batch_size):
+            self.stats["samples"] += len(batch)
+            hashes = ahash_batch([img for _, img in batch])
+            for (i, img2), hash2 in zip(batch, hashes):
+                if ref_hash is None:
+                    ref_hash = hash2
+                    continue
+                if self.cmpHash(ref_hash, hash2) <= th:
+                    ref_hash = hash2
+                    continue
+                self.stats["changes"] += 1
+                pending.append((i, img2))
+                if len(pending) >= self.ocr_batch:
+                    subtitleStr = self.collect(self.recognize(pending), subtitleList, subtitleStr, on_subtitles)
+                    pending = []
+        if pending:
+            subtitleStr = self.collect(self.recognize(pending), subtitleList, subtitleStr, on_subtitles)
+        self.report(time.perf_counter() - start, backend)
+
+        if plot:
+            wc2f = WordCloud2Frame()
+            tf = wc2f.wordfrequencyStr(subtitleStr)
+            wc2f.plotwordcloud(tf, save_path, "subtitle")
 
         return subtitleStr, subtitleList
 
+    def recognize(self, crops):
+        # 先查缓存，批内相同的字幕只识别一次，其余的一次性送入 EasyOCR
+        keys = [ahash(img, (32, 8)) for _, img in crops]
+        results = [self.cache.get(k) for k in keys]
+        todo = {}
+        for idx, (key, res) in enumerate(zip(keys, results)):
+            if res is None:
+                todo.setdefault(key, crops[idx][1])
+        self.stats["cacheHits"] += len(crops) - len(todo)
+        if todo:
+            start = time.perf_counter()
+            images = list(todo.values())
+            if len(images) == 1:
+                texts = [self.reader.readtext(images[0])]
+            else:
+                texts = self.reader.readtext_batched(images)
+            self.stats["ocrSeconds"] += time.perf_counter() - start
+            self.stats["ocrImages"] += len(images)
+            self.stats["ocrBatches"] += 1
+            for key, words in zip(todo, texts):
+                self.cache.put(key, [word[1] for word in words if word[1] is not None])
+        return [(i, self.cache.get(k) if res is None else res) for (i, _), k, res in zip(crops, keys, results)]
+
+    def collect(self, recognized, subtitleList, subtitleStr, on_subtitles=None):
+        # on_subtitles 回调每批新增的字幕，便于调用方增量展示
+        first_new = len(subtitleList)
+        for i, texts in recognized:
+            for text in texts:
+                # 连续重复的字幕只保留一条（列表中的字幕不带换行符）
+                if (not subtitleList or text != subtitleList[-1][1]) and (not self.contains_english(text)):
+                    subtitleList.append([i, text])
+                    subtitleStr = subtitleStr+text+'\n'
+        if on_subtitles is not None and len(subtitleList) > first_new:
+            on_subtitles(subtitleList[first_new:])
+        return subtitleStr
+
+    def report(self, elapsed, backend):
+        st = self.stats
+        lookups = st["cacheHits"] + st["ocrImages"]
+        st["seconds"] = round(elapsed, 3)
+        st["ocrCallsPerSec"] = round(st["ocrImages"] / st["ocrSeconds"], 2) if st["ocrSeconds"] > 0 else 0.0
+        st["cacheHitRate"] = round(st["cacheHits"] / lookups, 3) if lookups else 0.0
+        # 统计只写入 self.stats（API 结果中的 subtitles.stats），不打印到服务器输出
+        st["backend"] = backend
+
     def subtitle2Srt(self, subtitleList, savePath):
         # path为输出路径和文件名，newline=''是为了不出现空行
         csvpath = savePath+"subtitle.csv"
@@ -127,46 +208,26 @@ class SubtitleProcessor:
     #                                                     int(frames / framerate % 60),
     #                                                     int(frames % framerate))
     # 根据阈值判断是否再次提取图片字幕
+    def batched(self, iterable, n):
+        batch = []
+        for item in iterable:
+            batch.append(item)
+            if len(batch) >= n:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    # 根据阈值判断是否再次提取图片字幕：64 位 aHash 的汉明距离占比
     def cmpHash(self, hash1, hash2):
-        n = 0
-        # hash长度不同则返回-1代表传参出错
-        if len(hash1) != len(hash2):
-            return -1
-        # 遍历判断
-        for i in range(len(hash1)):
-            # 不相等则n计数+1，n最终为相似度
-            if hash1[i] != hash2[i]:
-                n = n + 1
-        n = n/len(hash1)
-        return n
+        return int(hamming(np.uint64(hash1), np.uint64(hash2))) / 64
 
     def aHash(self, img):
-        if img is None:
-            print("none")
-        imgsmall = cv2.resize(img, (16, 4))
-        # 转换为灰度图
-        gray = cv2.cvtColor(imgsmall, cv2.COLOR_BGR2GRAY)
-        # s为像素和初值为0，hash_str为hash值初值为''
-        s = 0
-        hash_str = ''
-        # 遍历累加求像素和
-        for i in range(4):
-            for j in range(16):
-                s = s + gray[i, j]
-        # 求平均灰度
-        avg = s / 64
-        # 遍历图像的每个像素，并比较每个像素的灰度值是否大于平均灰度值 avg。如果大于 avg，则将 '1' 添加到 hash_str 中，否则添加 '0'。这样就生成了一个二进制的哈希字符串
-        for i in range(4):
-            for j in range(16):
-                if gray[i, j] > avg:
-                    hash_str = hash_str + '1'
-                else:
-                    hash_str = hash_str + '0'
-        return hash_str
+        # 16x4 灰度缩略图，像素大于平均灰度记为 1，打包为一个 uint64
+        return ahash(img)
 
     def subtitleDetect(self, img1, img2, th):
-        hash1 = self.aHash(img1)
-        hash2 = self.aHash(img2)
+        hash1, hash2 = ahash_batch([img1, img2])
         n = self.cmpHash(hash1, hash2)  # 不同加1，相同为0
         if n > th:
             subtitle_event = True
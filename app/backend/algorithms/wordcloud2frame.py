@@ -1,11 +1,85 @@
-import jieba
+import csv
+import heapq
 import os
 import platform
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
-import csv
-
-# 三个方法
+from collections import Counter
+from functools import lru_cache
+
+STOPWORD_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stopword.txt")
+# 含有这些字符的分词结果不计入词频
+_DROP_CHARS = ("一", ",", ";", " ", "-")
+
+
+@lru_cache(maxsize=None)
+def load_stopwords(path=STOPWORD_PATH):
+    # 停用词表只读一次
+    if not os.path.exists(path):
+        return frozenset()
+    with open(path, encoding="utf-8") as f:
+        return frozenset(line.strip() for line in f if line.strip())
+
+
+@lru_cache(maxsize=None)
+def get_jieba():
+    # jieba 词典只初始化一次（首次分词时约 1 秒）
+    import jieba
+
+    jieba.initialize()
+    return jieba
+
+
+def iter_csv_column(filename, column=1):
+    # 逐行读取 CSV 的某一列，不把整列拼成一个大字符串
+    with open(filename, newline="", encoding="utf-8") as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader, None)
+        for row in reader:
+            if len(row) > column:
+                yield row[column].replace(", ", ",").replace(" ", "")
+
+
+def _chunks(texts, lines_per_chunk):
+    chunk = []
+    for text in texts:
+        chunk.append(text)
+        if len(chunk) >= lines_per_chunk:
+            yield "\n".join(chunk)
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk)
+
+
+def count_words(texts, parallel=0, lines_per_chunk=20000):
+    """Count jieba tokens over an iterable of text rows.
+
+    ``parallel > 1`` turns on jieba's multiprocess mode (POSIX only), which splits
+    each chunk of rows across worker processes."""
+    jieba = get_jieba()
+    stopwords = load_stopwords()
+    counts = Counter()
+    use_parallel = parallel > 1 and os.name == "posix"
+    if use_parallel:
+        jieba.enable_parallel(parallel)
+    try:
+        for chunk in _chunks(texts, lines_per_chunk):
+            counts.update(jieba.cut(chunk, cut_all=False))
+    finally:
+        if use_parallel:
+            jieba.disable_parallel()
+
+    for word in list(counts):
+        if not word.strip() or word in stopwords or any(c in word for c in _DROP_CHARS):
+            del counts[word]
+    return counts
+
+
+def top_words(counts, top_n=None):
+    # 按词频降序；指定 top_n 时用堆选前 N 个，不做全量排序
+    if top_n is None:
+        items = sorted(counts.items(), key=lambda kv: kv[1], reverse=True)
+    else:
+        items = heapq.nlargest(top_n, counts.items(), key=lambda kv: kv[1])
+    return dict(items)
 
 
 class WordCloud2Frame:
@@ -44,106 +118,18 @@ class WordCloud2Frame:
                 return path
         return None
 
-    def wordfrequency(self, filename):
-        # data = np.loadtxt(open(csvfile, "rb"),  skiprows=1, usecols=[1, 1])
-        print(filename)
-        data = []
-        with open(filename) as csvfile:
-            csv_reader = csv.reader(csvfile)  # 使用csv.reader读取csvfile中的文件
-            next(csv_reader)  # 读取第一行每一列的标题
-            for row in csv_reader:  # 将csv 文件中的数据保存到data中
-                data.append(row[1])  # 选择某一列加入到data数组中
-            print(data)
-
-        data1 = []
-        for i in data:
-            data1.append(i.replace(", ", ",").replace(" ", ""))
-        print(data1)
-
-        allstr = ""
-        for d in data1:
-            allstr = allstr+' '+d
-        print(allstr)
-        seg_list = jieba.cut(allstr, cut_all=False)
-        print(seg_list)
-        tf = {}
-        for seg in seg_list:
-            if seg in tf:
-                tf[seg] += 1
-            else:
-                tf[seg] = 1
-        ci = list(tf.keys())
-        # with open('stopword.txt', 'r') as ft:
-        #     stopword = ft.read()
-
-        for seg in ci:
-            # or seg in stopword
-            if tf[seg] < 1 or len(seg) < 0 or "一" in seg or "," in seg or ";" in seg or " " in seg:
-                tf.pop(seg)
-
-        ci, num, data = list(tf.keys()), list(tf.values()), []
-        for i in range(len(tf)):
-            data.append((num[i], ci[i]))  # 逐个将键值对存入data中
-        data.sort()  # 升序排列
-        data.reverse()  # 逆序，得到所需的降序排列
-
-        tf_sorted = {}
-        print(len(data), data[0], data[0][0], data[0][1])
-
-        for i in range(len(data)):
-            tf_sorted[data[i][1]] = data[i][0]
-        print('tfsorted', tf_sorted)
-        return tf_sorted
-
-    def wordfrequencyStr(self, datastr):
-        datastr = datastr.replace("\n", "")
-        seg_list = jieba.cut(datastr, cut_all=False)
-        tf = {}
-        for seg in seg_list:
-            if seg in tf:
-                tf[seg] += 1
-            else:
-                tf[seg] = 1
-        ci = list(tf.keys())
-        # with open('stopword.txt', 'r') as ft:
-        #     stopword = ft.read()
-
-        for seg in ci:
-            # or seg in stopword
-            if tf[seg] < 1 or len(seg) < 0 or "一" in seg or " " in seg or ";" in seg or "-" in seg:
-                tf.pop(seg)
-
-        print(tf)
-
-        ci, num, data = list(tf.keys()), list(tf.values()), []
-        for i in range(len(tf)):
-            data.append((num[i], ci[i]))  # 逐个将键值对存入data中
-        data.sort()  # 升序排列
-        data.reverse()  # 逆序，得到所需的降序排列
-
-        tf_sorted = {}
-        # print(len(data), data[0], data[0][0], data[0][1])
-
-        for i in range(len(data)):
-            tf_sorted[data[i][1]] = data[i][0]
-        print(tf_sorted)
-        return tf_sorted
+    def wordfrequency(self, filename, top_n=None, parallel=0):
+        counts = count_words(iter_csv_column(filename), parallel=parallel)
+        return top_words(counts, top_n)
+
+    def wordfrequencyStr(self, datastr, top_n=None, parallel=0):
+        counts = count_words(datastr.splitlines(), parallel=parallel)
+        return top_words(counts, top_n)
 
     def plotwordcloud(self, tf_sorted, save_path, save_type):
-        print('save_path,save_type', save_path, save_type)
-        font = self.resolve_font_path()
-        kwargs = {"width": 800, "height": 600, "background_color": "white"}
-        if font:
-            kwargs["font_path"] = font
-        wc = WordCloud(**kwargs).generate_from_frequencies(tf_sorted)
-        plt.clf()
-        plt.axes(facecolor='black')
-        # plt.style.use("dark_background")
-        plt.imshow(wc)
-        plt.axis('off')
-        # plt.show()
-        plt.savefig(save_path+save_type+".png", facecolor='white')
-        # wc.to_file(save_type+'.png')
+        from app.backend.charts import render_to_file
+
+        render_to_file("wordcloud", {"frequencies": dict(tf_sorted)}, save_path+save_type+".png")
 
 
 if __name__ == '__main__':
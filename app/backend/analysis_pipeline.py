@@ -1,15 +1,40 @@
-import csv
+import bisect
+import contextvars
 import os
 import re
+import threading
 from collections import Counter
-from typing import Any
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
 
 import cv2
 import numpy as np
 
-from app.backend.algorithms.objectDetection import ObjectDetection
-from app.backend.algorithms.shotcutTransNetV2 import transNetV2_run
-from app.backend.algorithms.shotscale import shotscale
+from app.backend.algorithms.keyframes import FRAME_EXTENSIONS, KeyframeWriter, extract_keyframes
+from app.backend.algorithms.palette import extract_palettes, rgb_to_hex, weighted_kmeans
+from app.backend.artifacts import artifact_url
+from app.backend.cancellation import CancelToken, Cancelled, cancellable, cancellation, current_token
+from app.backend.checkpoints import Checkpoints, video_fingerprint
+from app.backend.embedding_cache import EmbeddingCache
+from app.backend.instrumentation import Recorder, recording, span
+from app.backend.result_store import ResultStore
+from app.backend.scenes import SceneSegmenter, shot_features
+from app.backend.shot_metrics import image_sharpness, shot_motion, weighted_motion
+from app.backend.stages import NoCheckpoint, StageGraph
+
+# TensorFlow (TransNetV2), torch (ObjectDetection), OpenPose/matplotlib (shotscale) and
+# matplotlib (resultsave) are imported inside the stages that use them so the API
+# process starts, and answers /api/health, without loading any model framework.
+
+
+# Names accepted by analyze_video(invalidate=...); invalidating a stage also reruns its dependents.
+STAGE_NAMES = ("shot_detection", "keyframes", "shots", "object_detection", "shot_scale", "palette", "scene_grouping")
+
+# mode="preview" trades accuracy for latency: see _analyze_preview.
+MODES = ("full", "preview")
+
+# Background stages (subtitle OCR) run here so they overlap the main analysis.
+_BACKGROUND = ThreadPoolExecutor(max_workers=2, thread_name_prefix="analysis-bg")
 
 
 def _safe_stem(name: str) -> str:
@@ -32,18 +57,6 @@ def _avg(values: list[float]) -> float:
     return float(sum(values) / len(values)) if values else 0.0
 
 
-def _std(values: list[float]) -> float:
-    if len(values) < 2:
-        return 0.0
-    m = _avg(values)
-    return float((sum((v - m) ** 2 for v in values) / len(values)) ** 0.5)
-
-
-def _rgb_distance(a: list[float], b: list[float]) -> float:
-    da = np.array(a, dtype=float) - np.array(b, dtype=float)
-    return float(np.sqrt(np.dot(da, da)))
-
-
 def _rgb_to_hue(rgb: list[float]) -> float:
     r, g, b = [max(0.0, min(255.0, x)) / 255.0 for x in rgb]
     mx = max(r, g, b)
@@ -61,12 +74,14 @@ def _rgb_to_hue(rgb: list[float]) -> float:
     return deg if deg >= 0 else deg + 360.0
 
 
-def _image_avg_rgb(path: str) -> list[float]:
+def _keyframe_measures(path: str) -> dict[str, Any]:
+    # Mean colour, focus and texture of a keyframe, from a single read.
     img = cv2.imread(path)
     if img is None:
-        return [0.0, 0.0, 0.0]
+        return {"avgRgb": [0.0, 0.0, 0.0], "focus": 0.0, "texture": 0.0}
     b, g, r, _ = cv2.mean(img)
-    return [float(r), float(g), float(b)]
+    focus, texture = image_sharpness(img)
+    return {"avgRgb": [float(r), float(g), float(b)], "focus": focus, "texture": texture}
 
 
 def _frame_id_from_name(filename: str) -> int:
@@ -121,6 +136,76 @@ def _infer_props_fallback(rgb: list[float], motion_proxy: float, focus_proxy: fl
     return out
 
 
+def _palette_entries(colors: np.ndarray, shares: np.ndarray) -> list[dict[str, Any]]:
+    return [
+        {"rgb": [int(x) for x in rgb], "hex": rgb_to_hex(rgb), "share": round(float(share), 4)}
+        for rgb, share in zip(colors, shares)
+    ]
+
+
+def _scene_palette(scene_shots: list[dict[str, Any]], size: int) -> list[dict[str, Any]]:
+    colors: list[list[int]] = []
+    weights: list[float] = []
+    for shot in scene_shots:
+        for entry in shot.get("palette", []):
+            colors.append(entry["rgb"])
+            weights.append(entry["share"] * max(shot["durationSec"], 1e-3))
+    if not colors:
+        return []
+    centers, mass = weighted_kmeans(np.array(colors, dtype=float), np.array(weights), size)
+    order = np.argsort(-mass, kind="stable")
+    rgb = np.clip(np.rint(centers[order]), 0, 255).astype(np.uint8)
+    return _palette_entries(rgb, mass[order] / mass.sum())
+
+
+def attach_subtitles(result: dict[str, Any], entries: list[dict[str, Any]]) -> None:
+    shots = result["shots"]
+    scenes = result["scenes"]
+    shot_starts = [s["startSec"] for s in shots]
+    scene_starts = [s["startSec"] for s in scenes]
+    block = result.setdefault("subtitles", {})
+    block.setdefault("entries", []).extend(entries)
+    for entry in entries:
+        sec = entry["sec"]
+        if shots:
+            i = max(0, bisect.bisect_right(shot_starts, sec) - 1)
+            entry["shotId"] = shots[i]["shotId"]
+            shots[i].setdefault("subtitles", []).append(entry["text"])
+        if scenes:
+            j = max(0, bisect.bisect_right(scene_starts, sec) - 1)
+            entry["sceneId"] = scenes[j]["sceneId"]
+            scenes[j].setdefault("subtitles", []).append(entry["text"])
+
+
+def _start_subtitle_stage(
+    video_path: str,
+    image_save: str,
+    fps: float,
+    interval: int,
+    on_entries: Callable[[list[dict[str, Any]]], None],
+    token: CancelToken,
+) -> Future:
+    def run() -> dict[str, Any]:
+        from app.backend.algorithms.subtitleEasyOcr import SubtitleProcessor
+
+        processor = SubtitleProcessor()
+
+        def emit(rows: list[list[Any]]) -> None:
+            on_entries([{"frame": int(i), "sec": i / fps, "text": text} for i, text in rows])
+
+        with cancellation(token), span("subtitle_ocr") as sp:
+            _, subtitle_list = processor.getsubtitleEasyOcr(
+                video_path, image_save, interval, on_subtitles=emit, plot=False, roi="auto"
+            )
+            processor.subtitle2Srt(subtitle_list, image_save + os.sep)
+            sp.items = len(subtitle_list)
+        return {"status": "done", "count": len(subtitle_list), "stats": processor.stats}
+
+    # Run in a copy of the caller's context (instrumentation) under the stage's own
+    # token, which the analysis cancels when it fails or is cancelled itself.
+    return _BACKGROUND.submit(contextvars.copy_context().run, run)
+
+
 def _read_metadata(video_path: str) -> dict[str, Any]:
     cap = cv2.VideoCapture(video_path)
     fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0)
@@ -142,108 +227,24 @@ def _read_metadata(video_path: str) -> dict[str, Any]:
     }
 
 
-def _group_scenes(shots: list[dict[str, Any]], sensitivity: int) -> list[dict[str, Any]]:
-    if not shots:
-        return []
-
-    boundaries = [0]
-    cue_scores = []
-    for i in range(1, len(shots)):
-        prev = shots[i - 1]
-        cur = shots[i]
-        drift = _rgb_distance(prev["avgRgb"], cur["avgRgb"])
-        rhythm = abs(prev["durationSec"] - cur["durationSec"]) * 7.0
-        cue_scores.append(drift + rhythm)
-
-    base = _avg(cue_scores) + _std(cue_scores) * max(0.45, 1.35 - sensitivity * 0.08)
-
-    for i in range(1, len(shots)):
-        prev = shots[i - 1]
-        cur = shots[i]
-        drift = _rgb_distance(prev["avgRgb"], cur["avgRgb"])
-        rhythm = abs(prev["durationSec"] - cur["durationSec"]) * 7.0
-        cue = drift + rhythm
-        shots_since = i - boundaries[-1]
-        if (cue >= base and shots_since >= 2) or shots_since >= 8:
-            boundaries.append(i)
-
-    boundaries.append(len(shots))
-
-    scenes: list[dict[str, Any]] = []
-    for i in range(len(boundaries) - 1):
-        s = boundaries[i]
-        e = boundaries[i + 1]
-        scene_shots = shots[s:e]
-        if not scene_shots:
-            continue
-        scenes.append(
-            {
-                "sceneId": i + 1,
-                "shotStartIndex": s,
-                "shotEndIndex": e - 1,
-                "startSec": float(scene_shots[0]["startSec"]),
-                "endSec": float(scene_shots[-1]["endSec"]),
-            }
-        )
-    return scenes
-
-
-def analyze_video(
-    *,
-    video_path: str,
-    original_filename: str,
-    scene_sensitivity: int = 6,
-    shot_threshold: float = 0.35,
-    include_object_detection: bool = True,
-    include_shot_scale: bool = True,
-) -> dict[str, Any]:
-    scene_sensitivity = max(1, min(10, int(scene_sensitivity)))
-    shot_threshold = max(0.05, min(0.95, float(shot_threshold)))
-
-    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    stem = _safe_stem(original_filename)
-    image_save = os.path.join(project_root, "img", stem)
-    os.makedirs(image_save, exist_ok=True)
-
-    meta_raw = _read_metadata(video_path)
-
-    shot_len = transNetV2_run(video_path, image_save, shot_threshold)
-
-    frame_dir = os.path.join(image_save, "frame")
-    frame_files = sorted(
-        [f for f in os.listdir(frame_dir) if f.lower().endswith((".png", ".jpg", ".jpeg"))]
-    )
-    if not frame_files:
-        raise RuntimeError("No shot representative frames were generated.")
-
-    fps = float(meta_raw["fps"] or 24.0)
-
-    scale_runner = None
-    if include_shot_scale:
-        try:
-            scale_runner = shotscale(25)
-        except Exception:
-            scale_runner = None
-
+def _build_shots(
+    shot_len: list[list[int]],
+    frame_files: list[str],
+    frame_dir: str,
+    fps: float,
+    meta_raw: dict[str, Any],
+    stem: str,
+    thumb_dir: str | None,
+    motion: np.ndarray | None = None,
+) -> list[dict[str, Any]]:
     shots: list[dict[str, Any]] = []
+    motions = shot_motion(motion, shot_len)
     for i, item in enumerate(shot_len):
         start_f, end_f, length_f = [int(x) for x in item]
         rep_idx = min(i, len(frame_files) - 1)
         rep_name = frame_files[rep_idx]
         rep_path = os.path.join(frame_dir, rep_name)
 
-        avg_rgb = _image_avg_rgb(rep_path)
-
-        raw_scale = "Unknown"
-        normalized_scale = "Unknown"
-        if scale_runner is not None:
-            try:
-                _, raw_scale, _ = scale_runner.predict(rep_path)
-                normalized_scale = _classify_scale_label(raw_scale)
-            except Exception:
-                raw_scale = "Unknown"
-                normalized_scale = "Unknown"
-
         shots.append(
             {
                 "shotId": i + 1,
@@ -255,11 +256,10 @@ def analyze_video(
                 "durationSec": length_f / fps,
                 "frameFile": rep_name,
                 "frameId": _frame_id_from_name(rep_name),
-                "avgRgb": avg_rgb,
-                "shotScale": normalized_scale,
-                "shotScaleRaw": raw_scale,
-                "focus": 0.0,
-                "texture": 0.0,
+                **_keyframe_measures(rep_path),
+                "motion": motions[i],
+                "shotScale": "Unknown",
+                "shotScaleRaw": "Unknown",
             }
         )
 
@@ -275,32 +275,50 @@ def analyze_video(
                 "durationSec": float(meta_raw["durationSec"]),
                 "frameFile": frame_files[0],
                 "frameId": _frame_id_from_name(frame_files[0]),
-                "avgRgb": _image_avg_rgb(os.path.join(frame_dir, frame_files[0])),
+                **_keyframe_measures(os.path.join(frame_dir, frame_files[0])),
+                "motion": shot_motion(motion, [[0, int(meta_raw["frameCount"]), 0]])[0],
                 "shotScale": "Unknown",
                 "shotScaleRaw": "Unknown",
-                "focus": 0.0,
-                "texture": 0.0,
             }
         )
 
-    scenes_raw = _group_scenes(shots, scene_sensitivity)
+    # Keyframes and thumbnails are served over HTTP by /api/artifacts.
+    for shot in shots:
+        shot["frameUrl"] = artifact_url(stem, f"frame/{shot['frameFile']}")
+        if not thumb_dir:
+            continue
+        if os.path.exists(os.path.join(thumb_dir, shot["frameFile"])):
+            shot["thumbUrl"] = artifact_url(stem, f"{os.path.basename(thumb_dir)}/{shot['frameFile']}")
+    return shots
+
 
-    object_by_frame: dict[int, str] = {}
-    if include_object_detection:
+def _predict_scales(paths: list[str]) -> tuple[list[str], int]:
+    # Returns the raw labels and how many frames fell back to "Unknown" on an error.
+    try:
+        from app.backend.algorithms.shotscale import get_shotscale, predict_lock
+
+        scale_runner = get_shotscale(25)
+    except Exception:
+        return ["Unknown"] * len(paths), len(paths)
+
+    labels = []
+    failures = 0
+    for path in cancellable(paths):
         try:
-            ObjectDetection(image_save).object_detection()
-            obj_csv = os.path.join(image_save, "objects.csv")
-            if os.path.exists(obj_csv):
-                with open(obj_csv, newline="", encoding="utf-8") as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        frame_id = int(row.get("FrameId", "0") or 0)
-                        label = (row.get("Top1-Objects") or "").strip()
-                        if label:
-                            object_by_frame[frame_id] = label
+            with predict_lock:
+                _, raw_scale, _ = scale_runner.predict(path)
         except Exception:
-            object_by_frame = {}
+            raw_scale = "Unknown"
+            failures += 1
+        labels.append(raw_scale)
+    return labels, failures
+
 
+def _build_scenes(
+    shots: list[dict[str, Any]],
+    scenes_raw: list[dict[str, Any]],
+    object_by_frame: dict[int, str],
+) -> list[dict[str, Any]]:
     scenes: list[dict[str, Any]] = []
     for scene in scenes_raw:
         scene_shots = shots[scene["shotStartIndex"] : scene["shotEndIndex"] + 1]
@@ -319,6 +337,9 @@ def analyze_video(
             _avg([s["avgRgb"][2] for s in scene_shots]),
         ]
         dominant_hue = _rgb_to_hue(dominant_rgb)
+        motion_proxy = weighted_motion(
+            [s.get("motion", 0.0) for s in scene_shots], [s["durationSec"] for s in scene_shots]
+        )
 
         labels = [object_by_frame.get(s["frameId"], "") for s in scene_shots]
         labels = [x for x in labels if x]
@@ -335,7 +356,7 @@ def analyze_video(
         else:
             props = _infer_props_fallback(
                 dominant_rgb,
-                motion_proxy=0.0,
+                motion_proxy=motion_proxy,
                 focus_proxy=0.62 * (close_pct / 100.0) + 0.5 * (medium_pct / 100.0),
             )
 
@@ -358,11 +379,14 @@ def analyze_video(
                 "dominantHue": dominant_hue,
                 "props": props,
                 "shots": scene_shots,
-                "motionProxy": 0.0,
+                "motionProxy": motion_proxy,
             }
         )
+    return scenes
 
-    global_metrics = {
+
+def _global_metrics(shots: list[dict[str, Any]], scenes: list[dict[str, Any]]) -> dict[str, Any]:
+    return {
         "shotCount": len(shots),
         "sceneCount": len(scenes),
         "averageShotLengthSec": _avg([s["durationSec"] for s in shots]),
@@ -370,24 +394,535 @@ def analyze_video(
         "averageShotsPerScene": (len(shots) / len(scenes)) if scenes else 0.0,
     }
 
+
+def _write_tables(
+    store: ResultStore,
+    shots: list[dict[str, Any]],
+    palette_rows: list[tuple[str, np.ndarray]],
+    framelist: list[list[str]],
+    frame_keys: dict[str, str] | None = None,
+) -> list[str]:
+    # Column names of the legacy CSVs are kept so the on-demand exports match them.
+    store.write_table(
+        "shots",
+        {
+            "shotId": np.array([s["shotId"] for s in shots], dtype=np.int32),
+            "startFrame": np.array([s["startFrame"] for s in shots], dtype=np.int64),
+            "endFrame": np.array([s["endFrame"] for s in shots], dtype=np.int64),
+            "lengthFrames": np.array([s["lengthFrames"] for s in shots], dtype=np.int64),
+            "startSec": np.array([s["startSec"] for s in shots], dtype=np.float64),
+            "endSec": np.array([s["endSec"] for s in shots], dtype=np.float64),
+            "durationSec": np.array([s["durationSec"] for s in shots], dtype=np.float64),
+            "frameId": np.array([s["frameId"] for s in shots], dtype=np.int64),
+            "avgRgb": np.array([s["avgRgb"] for s in shots], dtype=np.float32).reshape(-1, 3),
+            "motion": np.array([s["motion"] for s in shots], dtype=np.float32),
+            "focus": np.array([s["focus"] for s in shots], dtype=np.float32),
+            "texture": np.array([s["texture"] for s in shots], dtype=np.float32),
+            "shotScale": [s["shotScale"] for s in shots],
+            "shotScaleRaw": [s["shotScaleRaw"] for s in shots],
+        },
+    )
+    tables = ["shots"]
+    if palette_rows:
+        store.write_table(
+            "colors",
+            {
+                "FrameId": [frame_id for frame_id, _ in palette_rows],
+                "Color": np.stack([flat for _, flat in palette_rows]).astype(np.uint8),
+            },
+        )
+        tables.append("colors")
+    if framelist:
+        store.write_table(
+            "objects",
+            {"FrameId": [row[0] for row in framelist], "Top1-Objects": [row[1] for row in framelist]},
+        )
+        tables.append("objects")
+    if frame_keys and all(s["frameFile"] in frame_keys for s in shots):
+        # Keys into the embedding cache, for similar-shot search.
+        store.write_table(
+            "frame_keys",
+            {
+                "shotId": np.array([s["shotId"] for s in shots], dtype=np.int32),
+                "frameKey": [frame_keys[s["frameFile"]] for s in shots],
+            },
+        )
+        tables.append("frame_keys")
+    return tables
+
+
+def check_scene_cues(
+    scene_cues: dict[str, float] | None,
+    include_palette: bool,
+    include_object_detection: bool,
+    include_shot_scale: bool,
+    mode: str,
+    sensitivity: int = 6,
+    window: int = 1,
+) -> SceneSegmenter:
+    # Shot scale, palettes, keyframe embeddings (object detection) and motion
+    # only exist in a full analysis that computes them; otherwise the cue would
+    # silently be constant (every shot "Unknown", motion 0).
+    segmenter = SceneSegmenter(sensitivity, cues=scene_cues, window=window)
+    available = {"rgb", "duration", "texture"}
+    if mode == "full":
+        available.add("motion")
+        if include_shot_scale:
+            available.add("scale")
+        if include_palette:
+            available.add("palette")
+        if include_object_detection:
+            available.add("embedding")
+    missing = sorted(segmenter.blocks - available)
+    if missing:
+        raise ValueError(f"Scene cues need features this analysis does not compute: {missing}")
+    return segmenter
+
+
+def _analyze_preview(
+    *,
+    video_path: str,
+    original_filename: str,
+    segmenter: SceneSegmenter,
+    cut_threshold: float,
+    sample: str,
+    sample_fps: float,
+    keyframe_format: str,
+    keyframe_quality: int,
+) -> dict[str, Any]:
+    # Shots come from histogram cuts over a decimated stream (see preview.py);
+    # shot scale, object detection, palettes, OCR and the result store are
+    # skipped. Keyframes go to img/<stem>/preview so that a full analysis of the
+    # same video, the refinement pass included, leaves them alone. Focus and
+    # texture come from the 256 px samples; motion needs every frame and is 0.
+    from app.backend.preview import detect_preview_shots, preview_size
+
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    stem = _safe_stem(original_filename)
+    image_save = os.path.join(project_root, "img", stem)
+    frame_dir = os.path.join(image_save, "preview", "frame")
+
+    recorder = Recorder()
+    with recording(recorder):
+        with span("metadata"):
+            meta_raw = _read_metadata(video_path)
+        fps = float(meta_raw["fps"] or 24.0)
+        with span("preview_sampling") as sp:
+            size = preview_size(int(meta_raw["width"]), int(meta_raw["height"]))
+            found, times = detect_preview_shots(
+                video_path, size, sample=sample, sample_fps=sample_fps, threshold=cut_threshold
+            )
+            sp.items = len(times)
+        if not found:
+            raise RuntimeError("No frames could be sampled from the video.")
+
+        frame_total = max(int(meta_raw["frameCount"]), int(round(times[-1] * fps)) + 1)
+        starts = [0] + [int(round(times[item["sample"]] * fps)) for item in found[1:]]
+        ends = starts[1:] + [frame_total]
+        digits = len(str(frame_total))
+        shots: list[dict[str, Any]] = []
+        with span("keyframes") as sp:
+            with KeyframeWriter(frame_dir, fmt=keyframe_format, quality=keyframe_quality, thumb_dim=None) as writer:
+                writer.clear()
+                for i, (item, start_f, end_f) in enumerate(zip(found, starts, ends)):
+                    name = "frame" + str(start_f).zfill(digits)
+                    writer.submit(name, item["image"])
+                    b, g, r = (item["bgrSum"] / item["samples"]).tolist()
+                    focus, texture = image_sharpness(item["image"])
+                    shots.append(
+                        {
+                            "shotId": i + 1,
+                            "startFrame": start_f,
+                            "endFrame": end_f,
+                            "lengthFrames": end_f - start_f,
+                            "startSec": start_f / fps,
+                            "endSec": end_f / fps,
+                            "durationSec": (end_f - start_f) / fps,
+                            "frameFile": writer.filename(name),
+                            "frameId": start_f,
+                            "frameUrl": artifact_url(stem, f"preview/frame/{writer.filename(name)}"),
+                            "avgRgb": [r, g, b],
+                            "focus": focus,
+                            "texture": texture,
+                            "motion": 0.0,
+                            "shotScale": "Unknown",
+                            "shotScaleRaw": "Unknown",
+                        }
+                    )
+            sp.items = len(shots)
+        with span("scene_grouping") as sp:
+            sp.items = len(shots)
+            features = shot_features(shots, blocks=segmenter.blocks)
+            scenes = _build_scenes(shots, segmenter.segment(features, shots), {})
+
+    from app.backend.charts import charts
+
+    chart_key = charts.register("shotlen", {"lengths": [s["lengthFrames"] for s in shots]})
     return {
         "meta": {
-            "id": _safe_stem(original_filename),
+            "id": stem,
             "filename": original_filename,
+            "mode": "preview",
+            "sampling": {
+                "sample": sample,
+                "fps": sample_fps if sample == "fps" else None,
+                "samples": len(times),
+                "threshold": cut_threshold,
+            },
             "durationSec": float(meta_raw["durationSec"]),
             "width": int(meta_raw["width"]),
             "height": int(meta_raw["height"]),
             "frameCountEstimated": int(meta_raw["frameCount"]),
             "fpsEstimated": round(float(meta_raw["fps"]), 3),
+            "timeline": [],
+            "timings": recorder.timings(),
         },
-        "global": global_metrics,
+        "global": _global_metrics(shots, scenes),
         "shots": shots,
         "scenes": scenes,
         "outputs": {
             "imageBase": image_save,
             "frameDir": frame_dir,
-            "shotlenCsv": os.path.join(image_save, "shotlen.csv"),
-            "shotlenPng": os.path.join(image_save, "shotlen.png"),
-            "objectsCsv": os.path.join(image_save, "objects.csv"),
+            "thumbDir": None,
+            "artifactBase": artifact_url(stem, ""),
+            "keyframes": writer.stats,
+            "charts": {"shotlen": f"/api/charts/{chart_key}.png"},
         },
     }
+
+
+def analyze_video(
+    *,
+    video_path: str,
+    original_filename: str,
+    scene_sensitivity: int = 6,
+    shot_threshold: float = 0.35,
+    include_object_detection: bool = True,
+    include_shot_scale: bool = True,
+    include_palette: bool = False,
+    palette_size: int = 5,
+    palette_workers: int | None = None,
+    include_subtitles: bool = False,
+    subtitle_interval: int = 48,
+    keyframe_format: str = "jpg",
+    keyframe_quality: int = 90,
+    keyframe_max_dim: int | None = 1920,
+    stage_slots: dict[str, int] | None = None,
+    checkpoint: bool = True,
+    invalidate: list[str] | tuple[str, ...] = (),
+    scene_cues: dict[str, float] | None = None,
+    scene_window: int = 1,
+    mode: str = "full",
+    preview_sample: str = "keyframes",
+    preview_fps: float = 2.0,
+    on_update: Callable[[str, Any], None] | None = None,
+) -> dict[str, Any]:
+    scene_sensitivity = max(1, min(10, int(scene_sensitivity)))
+    unknown = sorted(set(invalidate) - set(STAGE_NAMES))
+    if unknown:
+        raise ValueError(f"Unknown stages to invalidate: {unknown}")
+    if mode not in MODES:
+        raise ValueError(f"Unknown analysis mode: {mode}")
+    segmenter = check_scene_cues(
+        scene_cues,
+        include_palette,
+        include_object_detection,
+        include_shot_scale,
+        mode,
+        scene_sensitivity,
+        scene_window,
+    )
+    shot_threshold = max(0.05, min(0.95, float(shot_threshold)))
+    if mode == "preview":
+        return _analyze_preview(
+            video_path=video_path,
+            original_filename=original_filename,
+            segmenter=segmenter,
+            cut_threshold=shot_threshold,
+            sample=preview_sample,
+            sample_fps=max(0.1, min(30.0, float(preview_fps))),
+            keyframe_format=keyframe_format,
+            keyframe_quality=keyframe_quality,
+        )
+
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    stem = _safe_stem(original_filename)
+    image_save = os.path.join(project_root, "img", stem)
+    os.makedirs(image_save, exist_ok=True)
+
+    recorder = Recorder()
+    with recording(recorder), span("metadata"):
+        meta_raw = _read_metadata(video_path)
+
+    # Subtitle OCR only needs the video, so it starts first and overlaps every
+    # other stage. With on_update the entries stream out as they are recognized
+    # and analyze_video returns without waiting for OCR.
+    subtitle_future: Future | None = None
+    subtitle_entries: list[dict[str, Any]] = []
+    subtitle_token = CancelToken()
+    if include_subtitles:
+        parent = current_token()
+        if parent is not None:
+            parent.on_cancel(lambda: subtitle_token.cancel(parent.reason or "cancelled"))
+        subtitle_lock = threading.Lock()
+
+        def on_entries(entries: list[dict[str, Any]]) -> None:
+            with subtitle_lock:
+                subtitle_entries.extend(entries)
+            if on_update is not None:
+                on_update("subtitles", entries)
+
+        subtitle_future = _start_subtitle_stage(
+            video_path,
+            image_save,
+            float(meta_raw["fps"] or 24.0),
+            max(1, int(subtitle_interval)),
+            on_entries,
+            subtitle_token,
+        )
+        if on_update is not None:
+            def on_done(fut: Future) -> None:
+                exc = fut.exception()
+                if isinstance(exc, Cancelled):
+                    on_update("subtitles_done", {"status": "cancelled"})
+                elif exc is not None:
+                    on_update("subtitles_done", {"status": "failed", "error": str(exc)})
+                else:
+                    on_update("subtitles_done", fut.result())
+
+            subtitle_future.add_done_callback(on_done)
+
+    frame_dir = os.path.join(image_save, "frame")
+    keyframes = KeyframeWriter(
+        frame_dir,
+        fmt=keyframe_format,
+        quality=keyframe_quality,
+        max_dim=keyframe_max_dim or None,
+    )
+    fps = float(meta_raw["fps"] or 24.0)
+    palette_size = max(1, min(12, int(palette_size)))
+
+    def detect_shots() -> dict[str, Any]:
+        from app.backend.algorithms.shotcutTransNetV2 import detect_cuts
+
+        cut_frames, motion = detect_cuts(video_path, with_motion=True)
+        return {"cut_frames": cut_frames, "frame_motion": motion}
+
+    def write_keyframes(cut_frames: list[int]) -> dict[str, Any]:
+        keyframes.clear()
+        with span("keyframes") as sp:
+            shot_len = extract_keyframes(video_path, cut_frames, keyframes)
+            sp.items = len(shot_len) + 1
+        frame_files = sorted([f for f in os.listdir(frame_dir) if f.lower().endswith(FRAME_EXTENSIONS)])
+        if not frame_files:
+            raise RuntimeError("No shot representative frames were generated.")
+        return {"shot_len": shot_len, "frame_files": frame_files, "keyframe_stats": keyframes.stats}
+
+    def keyframes_present(out: dict[str, Any]) -> bool:
+        return all(os.path.exists(os.path.join(frame_dir, f)) for f in out["frame_files"])
+
+    def build_shots(shot_len: list[list[int]], frame_files: list[str], frame_motion: np.ndarray) -> dict[str, Any]:
+        with span("shot_rows") as sp:
+            shots = _build_shots(
+                shot_len, frame_files, frame_dir, fps, meta_raw, stem, keyframes.thumb_dir, frame_motion
+            )
+            sp.items = len(shots)
+        return {"shots": shots}
+
+    def classify_scales(shots: list[dict[str, Any]]) -> dict[str, Any]:
+        with span("shot_scale") as sp:
+            sp.items = len(shots)
+            labels, failures = _predict_scales([os.path.join(frame_dir, s["frameFile"]) for s in shots])
+        out = {"shot_scales": labels}
+        return NoCheckpoint(out) if failures else out
+
+    def shot_palettes(shots: list[dict[str, Any]]) -> dict[str, Any]:
+        with span("palette") as sp:
+            sp.items = len(shots)
+            paths = [os.path.join(frame_dir, s["frameFile"]) for s in shots]
+            return {"palettes": extract_palettes(paths, palette_size, workers=palette_workers)}
+
+    scene_inputs = ["shots"]
+    if "scale" in segmenter.blocks and include_shot_scale:
+        scene_inputs.append("shot_scales")
+    if "palette" in segmenter.blocks and include_palette:
+        scene_inputs.append("palettes")
+    if "embedding" in segmenter.blocks and include_object_detection:
+        scene_inputs.append("frame_keys")
+
+    def group_scenes(
+        shots: list[dict[str, Any]],
+        shot_scales: list[str] | None = None,
+        palettes: list[tuple[np.ndarray, np.ndarray]] | None = None,
+        frame_keys: dict[str, str] | None = None,
+    ) -> dict[str, Any]:
+        with span("scene_grouping") as sp:
+            sp.items = len(shots)
+            scales = [_classify_scale_label(x) for x in shot_scales] if shot_scales is not None else None
+            active = segmenter
+            embeddings = None
+            if frame_keys is not None:
+                keys = [frame_keys.get(s["frameFile"]) for s in shots]
+                present = [k for k in keys if k]
+                embeddings = EmbeddingCache().embeddings(present) if len(present) == len(keys) else None
+                if embeddings is None:
+                    # Object detection failed: group without the embedding cue.
+                    cues = {k: w for k, w in segmenter.cues.items() if k != "embedding"} or None
+                    active = SceneSegmenter(segmenter.sensitivity, cues=cues, window=segmenter.window)
+            features = shot_features(
+                shots, blocks=active.blocks, scales=scales, palettes=palettes, embeddings=embeddings
+            )
+            return {"scenes_raw": active.segment(features, shots)}
+
+    def detect_objects(frame_files: list[str]) -> dict[str, Any]:
+        with span("object_detection") as sp:
+            try:
+                from app.backend.algorithms.objectDetection import ObjectDetection
+
+                # Embeddings and top-k labels go to the shared cache, keyed by keyframe content.
+                detector = ObjectDetection(image_save)
+                framelist = detector.object_detection(plot=False, write_csv=False, cache=EmbeddingCache()) or []
+            except Exception:
+                return NoCheckpoint(framelist=[], frame_keys={})
+            sp.items = len(framelist)
+        return {"framelist": framelist, "frame_keys": detector.frame_keys}
+
+    # Shot scale and object detection only need the keyframes, so they run next
+    # to each other (and to palette/scene grouping) as slots allow.
+    # Each stage is checkpointed under img/<stem>/checkpoints, keyed by the video
+    # content, so re-running the same film resumes after the last finished stage.
+    checkpoints = Checkpoints.for_stem(stem, video_fingerprint(video_path)) if checkpoint else None
+    graph = StageGraph(stage_slots, checkpoints=checkpoints)
+    # TransNetV2 cuts at its own 0.5 score; shot_threshold only drives preview
+    # mode, so it is not part of this stage's fingerprint.
+    graph.add("shot_detection", detect_shots, outputs=("cut_frames", "frame_motion"))
+    graph.add(
+        "keyframes",
+        write_keyframes,
+        inputs=("cut_frames",),
+        outputs=("shot_len", "frame_files", "keyframe_stats"),
+        resource="io",
+        params={"format": keyframe_format, "quality": keyframe_quality, "maxDim": keyframe_max_dim},
+        verify=keyframes_present,
+    )
+    graph.add(
+        "shots",
+        build_shots,
+        inputs=("shot_len", "frame_files", "frame_motion"),
+        outputs=("shots",),
+        resource="io",
+    )
+    if include_object_detection:
+        graph.add(
+            "object_detection", detect_objects, inputs=("frame_files",), outputs=("framelist", "frame_keys")
+        )
+    if include_shot_scale:
+        graph.add("shot_scale", classify_scales, inputs=("shots",), outputs=("shot_scales",))
+    if include_palette:
+        graph.add("palette", shot_palettes, inputs=("shots",), outputs=("palettes",), params={"size": palette_size})
+    graph.add(
+        "scene_grouping",
+        group_scenes,
+        inputs=tuple(scene_inputs),
+        outputs=("scenes_raw",),
+        params={"sensitivity": scene_sensitivity, "cues": segmenter.cues, "window": segmenter.window},
+    )
+    try:
+        with recording(recorder):
+            ctx = graph.run(invalidate=tuple(name for name in invalidate if name in graph.stages))
+
+        shots = ctx["shots"]
+        scenes_raw = ctx["scenes_raw"]
+        for shot, raw_scale in zip(shots, ctx.get("shot_scales", [])):
+            shot["shotScaleRaw"] = raw_scale
+            shot["shotScale"] = _classify_scale_label(raw_scale)
+
+        palette_rows: list[tuple[str, np.ndarray]] = []
+        for shot, (colors, shares) in zip(shots, ctx.get("palettes", [])):
+            shot["palette"] = _palette_entries(colors, shares)
+            padded = [list(c) for c in colors] or [[0, 0, 0]]
+            padded += [padded[0]] * (palette_size - len(padded))
+            palette_rows.append((os.path.splitext(shot["frameFile"])[0][5:], np.array(padded).reshape(-1)))
+
+        framelist: list[list[str]] = ctx.get("framelist", [])
+        object_by_frame: dict[int, str] = {}
+        for frame_id, label in framelist:
+            if label.strip():
+                object_by_frame[int(frame_id or 0)] = label.strip()
+
+        scenes = _build_scenes(shots, scenes_raw, object_by_frame)
+        if include_palette:
+            for scene in scenes:
+                scene["palette"] = _scene_palette(scene["shots"], palette_size)
+        global_metrics = _global_metrics(shots, scenes)
+
+        # Charts are only registered here; the PNGs render on first request.
+        from app.backend.charts import charts
+
+        chart_keys = {"shotlen": charts.register("shotlen", {"lengths": [s["lengthFrames"] for s in shots]})}
+        if include_shot_scale:
+            chart_keys["shotscale"] = charts.register("shotscale", {"labels": [s["shotScaleRaw"] for s in shots]})
+        if include_palette:
+            chart_keys["colors3d"] = charts.register(
+                "colors3d", {"colors": [[p["rgb"] for p in s.get("palette", [])] for s in shots]}
+            )
+        if object_by_frame:
+            chart_keys["objects"] = charts.register(
+                "wordcloud", {"frequencies": dict(Counter(object_by_frame.values()).most_common())}
+            )
+
+        # Tabular results go to the columnar store; CSVs are exported on request.
+        with recording(recorder), span("result_store") as sp:
+            tables = _write_tables(
+                ResultStore.for_stem(stem), shots, palette_rows, framelist, ctx.get("frame_keys")
+            )
+            sp.items = len(shots)
+        table_url = f"/api/results/{stem}/tables/{{}}.csv"
+
+        result = {
+            "meta": {
+                "id": _safe_stem(original_filename),
+                "filename": original_filename,
+                "mode": "full",
+                "durationSec": float(meta_raw["durationSec"]),
+                "width": int(meta_raw["width"]),
+                "height": int(meta_raw["height"]),
+                "frameCountEstimated": int(meta_raw["frameCount"]),
+                "fpsEstimated": round(float(meta_raw["fps"]), 3),
+                "timeline": graph.timeline,
+                "timings": recorder.timings(),
+            },
+            "global": global_metrics,
+            "shots": shots,
+            "scenes": scenes,
+            "outputs": {
+                "imageBase": image_save,
+                "frameDir": frame_dir,
+                "thumbDir": keyframes.thumb_dir,
+                "artifactBase": artifact_url(stem, ""),
+                "keyframes": ctx["keyframe_stats"],
+                "shotlenPng": f"/api/charts/{chart_keys['shotlen']}.png",
+                "store": os.path.join(image_save, "store"),
+                "shotsCsv": table_url.format("shots"),
+                "objectsCsv": table_url.format("objects") if "objects" in tables else None,
+                "colorsCsv": table_url.format("colors") if "colors" in tables else None,
+                "subtitleCsv": os.path.join(image_save, "subtitle.csv") if include_subtitles else None,
+                "charts": {name: f"/api/charts/{key}.png" for name, key in chart_keys.items()},
+            },
+        }
+
+        if subtitle_future is not None:
+            if on_update is None:
+                try:
+                    info = subtitle_future.result()
+                except Exception as exc:
+                    info = {"status": "failed", "error": str(exc)}
+                attach_subtitles(result, subtitle_entries)
+                result["subtitles"].update(info)
+            else:
+                result["subtitles"] = {"status": "running", "entries": []}
+        return result
+    except BaseException:
+        # OCR would otherwise keep decoding the (possibly deleted) upload after the request failed.
+        subtitle_token.cancel("analysis failed")
+        raise
@@ -0,0 +1,81 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+from app.backend.result_store import IMG_ROOT
+
+# HTTP serving of analysis artifacts (keyframes, thumbnails, charts).
+#
+# ETags are strong: a SHA-1 of the file content, cached per (path, mtime, size)
+# so a file is hashed once. Conditional GETs are answered with 304 before the
+# file is opened; everything else goes through Starlette's FileResponse, which
+# handles Range/If-Range (206) and uses the ASGI pathsend extension for
+# zero-copy sends when the server offers it.
+
+# Keyframes are rewritten when a video is analysed again: revalidate every time.
+REVALIDATE = "no-cache"
+# Charts are addressed by the hash of their data and never change.
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_ETAGS: "OrderedDict[tuple[str, int, int], str]" = OrderedDict()
+_ETAGS_MAX = 4096
+_ETAGS_LOCK = threading.Lock()
+
+
+def file_etag(path: str, st: os.stat_result | None = None) -> str:
+    st = st or os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    with _ETAGS_LOCK:
+        etag = _ETAGS.get(key)
+        if etag is not None:
+            _ETAGS.move_to_end(key)
+            return etag
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    etag = f'"{h.hexdigest()}"'
+    with _ETAGS_LOCK:
+        _ETAGS[key] = etag
+        while len(_ETAGS) > _ETAGS_MAX:
+            _ETAGS.popitem(last=False)
+    return etag
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison: W/"x" matches "x".
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or any(t.removeprefix("W/") == etag for t in tags)
+
+
+def resolve_artifact(stem: str, relpath: str) -> str | None:
+    base = os.path.realpath(os.path.join(IMG_ROOT, stem))
+    path = os.path.realpath(os.path.join(base, relpath))
+    if os.path.commonpath([base, path]) != base or not os.path.isfile(path):
+        return None
+    return path
+
+
+def artifact_url(stem: str, relpath: str) -> str:
+    return f"/api/artifacts/{stem}/{relpath}"
+
+
+def artifact_response(
+    request: Request,
+    path: str,
+    *,
+    etag: str | None = None,
+    cache_control: str = REVALIDATE,
+    media_type: str | None = None,
+) -> Response:
+    st = os.stat(path)
+    etag = etag or file_etag(path, st)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=st)
@@ -0,0 +1,335 @@
+import argparse
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Any, Callable
+
+from app.backend.algorithms.keyframes import FORMATS as KEYFRAME_FORMATS
+from app.backend.result_store import IMG_ROOT, ResultStore
+
+# Offline batch analysis for archives:
+#
+#   python -m app.backend.batch /archive/films --workers 2 --report batch.json
+#   python -m app.backend.batch films.txt          # manifest: one path per line
+#
+# Files are hashed first (sha256 of the content); a file whose hash already has
+# a result in the store is skipped, as is a second copy inside the same batch.
+# The rest run through analyze_video on a process pool. Each worker process
+# loads the models once (lru_cached getters in the algorithm modules) and keeps
+# them resident for every file it gets. Results land in
+# img/<stem>_<hash10>/store: the tables written by the pipeline plus the full
+# result ("result.json") and its provenance ("source.json"), which is written
+# last and marks the result complete. Afterwards the new films are appended to
+# the similar-shot search indexes (--no-search-index skips that).
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".mkv", ".avi", ".m4v", ".webm", ".mpg", ".mpeg", ".ts")
+_HASH_CHUNK = 4 * 2**20
+
+# Model getters each worker warms up before taking files: (name, module, function).
+_MODELS = {
+    "transnet": ("app.backend.algorithms.shotcutTransNetV2", "get_model"),
+    "shotscale": ("app.backend.algorithms.shotscale", "get_shotscale"),
+    "objects": ("app.backend.algorithms.objectDetection", "get_vgg19"),
+}
+_THREAD_ENV = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "TF_NUM_INTRAOP_THREADS")
+
+_worker_state: dict[str, Any] = {}
+
+
+def collect_videos(inputs: list[str], recursive: bool = True) -> list[str]:
+    # Directories are scanned for video files; anything else that is not a video is a manifest.
+    found: list[str] = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                found.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(VIDEO_EXTENSIONS))
+                if not recursive:
+                    break
+        elif item.lower().endswith(VIDEO_EXTENSIONS):
+            found.append(item)
+        else:
+            base = os.path.dirname(os.path.abspath(item))
+            with open(item, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        found.append(line if os.path.isabs(line) else os.path.join(base, line))
+    seen: set[str] = set()
+    videos = []
+    for path in found:
+        real = os.path.realpath(path)
+        if real not in seen:
+            seen.add(real)
+            videos.append(real)
+    return videos
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def known_results(img_root: str = IMG_ROOT) -> dict[str, str]:
+    # sha256 -> stem of every completed batch result.
+    known: dict[str, str] = {}
+    if not os.path.isdir(img_root):
+        return known
+    for stem in sorted(os.listdir(img_root)):
+        try:
+            store = ResultStore.for_stem(stem)
+            if store.has_document("source"):
+                known[store.read_document("source")["sha256"]] = stem
+        except (ValueError, OSError, KeyError, json.JSONDecodeError):
+            continue
+    return known
+
+
+def batch_stem(path: str, sha256: str) -> str:
+    from app.backend.analysis_pipeline import _safe_stem
+
+    # The hash suffix keeps films with the same file name in different folders apart.
+    return f"{_safe_stem(os.path.basename(path))}_{sha256[:10]}"
+
+
+def _init_worker(models: tuple[str, ...]) -> None:
+    loads: dict[str, Any] = {}
+    for name in models:
+        module, getter = _MODELS[name]
+        start = time.perf_counter()
+        try:
+            getattr(importlib.import_module(module), getter)()
+            loads[name] = round(time.perf_counter() - start, 3)
+        except Exception as exc:  # the pipeline falls back per stage
+            loads[name] = f"unavailable: {type(exc).__name__}: {exc}"[:200]
+    _worker_state["modelLoadSec"] = loads
+    _worker_state["files"] = 0
+
+
+def analyze_file(task: dict[str, Any]) -> dict[str, Any]:
+    from app.backend.analysis_pipeline import analyze_video
+    from app.backend.payload import encode
+
+    path, sha256, stem = task["path"], task["sha256"], task["stem"]
+    out: dict[str, Any] = {"path": path, "sha256": sha256, "stem": stem, "pid": os.getpid()}
+    if not _worker_state.get("files"):
+        out["modelLoadSec"] = _worker_state.get("modelLoadSec", {})
+    _worker_state["files"] = _worker_state.get("files", 0) + 1
+    start = time.perf_counter()
+    try:
+        result = analyze_video(
+            video_path=path, original_filename=stem + os.path.splitext(path)[1], **task["options"]
+        )
+        result["meta"]["filename"] = os.path.basename(path)
+        seconds = time.perf_counter() - start
+        store = ResultStore.for_stem(stem)
+        store.write_document("result", encode(result)[0])
+        source = {
+            "sha256": sha256,
+            "path": path,
+            "bytes": os.path.getsize(path),
+            "analyzedAt": time.time(),
+            "seconds": round(seconds, 3),
+            "options": task["options"],
+        }
+        store.write_document("source", json.dumps(source).encode("utf-8"))
+    except Exception as exc:
+        out.update(
+            status="failed",
+            seconds=round(time.perf_counter() - start, 3),
+            error=f"{type(exc).__name__}: {exc}",
+            traceback=traceback.format_exc(limit=5),
+        )
+        return out
+    out.update(
+        status="done",
+        seconds=round(seconds, 3),
+        durationSec=float(result["meta"]["durationSec"]),
+        frames=int(result["meta"]["frameCountEstimated"]),
+        shots=len(result["shots"]),
+    )
+    return out
+
+
+def run_batch(
+    videos: list[str],
+    *,
+    workers: int = 1,
+    options: dict[str, Any] | None = None,
+    force: bool = False,
+    threads_per_worker: int | None = None,
+    on_progress: Callable[[dict[str, Any], int, int], None] | None = None,
+) -> dict[str, Any]:
+    options = dict(options or {})
+    wall_start = time.perf_counter()
+
+    # Hashing is I/O bound and hashlib releases the GIL, so threads are enough.
+    with ThreadPoolExecutor(max_workers=4, thread_name_prefix="batch-hash") as hash_pool:
+        hashes = list(hash_pool.map(file_sha256, videos))
+    hash_sec = time.perf_counter() - wall_start
+
+    known = {} if force else known_results()
+    results: list[dict[str, Any]] = []
+    tasks: list[dict[str, Any]] = []
+    first_path: dict[str, str] = {}
+    for path, sha256 in zip(videos, hashes):
+        if sha256 in known:
+            results.append({"path": path, "sha256": sha256, "stem": known[sha256], "status": "skipped", "reason": "already analyzed"})
+        elif sha256 in first_path:
+            results.append({"path": path, "sha256": sha256, "status": "skipped", "reason": f"duplicate of {first_path[sha256]}"})
+        else:
+            first_path[sha256] = path
+            tasks.append({"path": path, "sha256": sha256, "stem": batch_stem(path, sha256), "options": options})
+
+    total = len(videos)
+    if on_progress is not None:
+        for n, r in enumerate(results, 1):
+            on_progress(r, n, total)
+
+    def finished(r: dict[str, Any]) -> None:
+        results.append(r)
+        if on_progress is not None:
+            on_progress(r, len(results), total)
+
+    models = ["transnet"]
+    if options.get("include_shot_scale", True):
+        models.append("shotscale")
+    if options.get("include_object_detection", True):
+        models.append("objects")
+
+    if tasks and workers <= 0:
+        # In-process, mainly for debugging; models stay cached in this process.
+        _init_worker(tuple(models))
+        for task in tasks:
+            finished(analyze_file(task))
+    elif tasks:
+        if threads_per_worker:
+            # Inherited by the spawned workers before numpy/torch/TF read them.
+            for var in _THREAD_ENV:
+                os.environ.setdefault(var, str(threads_per_worker))
+        # spawn: TF and torch do not survive fork() with their thread pools started.
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(tasks)), mp_context=ctx, initializer=_init_worker, initargs=(tuple(models),)
+        ) as pool:
+            futures = {pool.submit(analyze_file, task): task for task in tasks}
+            for fut in as_completed(futures):
+                try:
+                    finished(fut.result())
+                except Exception as exc:  # a worker died (e.g. out of memory)
+                    task = futures[fut]
+                    finished({**{k: task[k] for k in ("path", "sha256", "stem")}, "status": "failed", "error": f"{type(exc).__name__}: {exc}"})
+
+    wall = time.perf_counter() - wall_start
+    done = [r for r in results if r["status"] == "done"]
+    video_sec = sum(r["durationSec"] for r in done)
+    frames = sum(r["frames"] for r in done)
+    return {
+        "files": total,
+        "analyzed": len(done),
+        "skipped": sum(1 for r in results if r["status"] == "skipped"),
+        "failed": sum(1 for r in results if r["status"] == "failed"),
+        "workers": workers,
+        "wallSec": round(wall, 3),
+        "hashSec": round(hash_sec, 3),
+        "videoSec": round(video_sec, 3),
+        "realtimeFactor": round(video_sec / wall, 3) if wall else 0.0,
+        "filesPerHour": round(len(done) * 3600 / wall, 2) if wall else 0.0,
+        "framesPerSec": round(frames / wall, 2) if wall else 0.0,
+        "results": results,
+    }
+
+
+def update_search_indexes() -> dict[str, Any]:
+    # Appends the new films to the similar-shot indexes, so the server does not have to.
+    from app.backend.search import SPACES, update_index
+
+    out: dict[str, Any] = {}
+    for space in SPACES:
+        start = time.perf_counter()
+        try:
+            index = update_index(space)
+        except ValueError as exc:  # no film has vectors in this space
+            out[space] = {"error": str(exc)}
+            continue
+        out[space] = {"rows": index.rows, "films": len(index.films), "seconds": round(time.perf_counter() - start, 3)}
+    return out
+
+
+def _print_progress(r: dict[str, Any], n: int, total: int) -> None:
+    name = os.path.basename(r["path"])
+    if r["status"] == "done":
+        speed = r["durationSec"] / r["seconds"] if r["seconds"] else 0.0
+        detail = f"{r['seconds']:.1f}s, {r['shots']} shots, {speed:.2f}x realtime -> {r['stem']}"
+    elif r["status"] == "skipped":
+        detail = r["reason"]
+    else:
+        detail = r["error"]
+    print(f"[{n}/{total}] {r['status']:7} {name}: {detail}", file=sys.stderr, flush=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Analyze directories or manifests of videos in parallel.")
+    parser.add_argument("inputs", nargs="+", help="video files, directories, or manifest files (one path per line)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 4), help="0 runs in-process")
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="cap BLAS/OpenMP/TF threads per worker")
+    parser.add_argument("--no-recursive", action="store_true")
+    parser.add_argument("--force", action="store_true", help="re-analyze files that already have a result")
+    parser.add_argument("--dry-run", action="store_true", help="list the files and exit")
+    parser.add_argument("--report", default=None, help="write the JSON summary here")
+    parser.add_argument("--scene-sensitivity", type=int, default=6)
+    parser.add_argument("--shot-threshold", type=float, default=0.35)
+    parser.add_argument("--no-object-detection", action="store_true")
+    parser.add_argument("--no-shot-scale", action="store_true")
+    parser.add_argument("--palette", action="store_true")
+    parser.add_argument("--subtitles", action="store_true")
+    parser.add_argument("--keyframe-format", default="jpg", choices=sorted(KEYFRAME_FORMATS))
+    parser.add_argument("--keyframe-quality", type=int, default=90)
+    parser.add_argument("--invalidate", default="", help="comma list of stages to recompute (with --force)")
+    parser.add_argument("--no-search-index", action="store_true", help="do not update the similar-shot indexes")
+    args = parser.parse_args()
+
+    videos = collect_videos(args.inputs, recursive=not args.no_recursive)
+    if args.dry_run:
+        print("\n".join(videos))
+        return
+    options = {
+        "scene_sensitivity": args.scene_sensitivity,
+        "shot_threshold": args.shot_threshold,
+        "include_object_detection": not args.no_object_detection,
+        "include_shot_scale": not args.no_shot_scale,
+        "include_palette": args.palette,
+        "include_subtitles": args.subtitles,
+        "keyframe_format": args.keyframe_format,
+        "keyframe_quality": args.keyframe_quality,
+        "invalidate": [n.strip() for n in args.invalidate.split(",") if n.strip()],
+    }
+    summary = run_batch(
+        videos,
+        workers=args.workers,
+        options=options,
+        force=args.force,
+        threads_per_worker=args.threads_per_worker,
+        on_progress=_print_progress,
+    )
+    if summary["analyzed"] and not args.no_search_index:
+        summary["searchIndex"] = update_search_indexes()
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    print(json.dumps({k: v for k, v in summary.items() if k != "results"}, indent=2))
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
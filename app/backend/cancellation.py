@@ -0,0 +1,102 @@
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, TypeVar
+
+# Cooperative cancellation for analyses.
+#
+#   token = CancelToken()
+#   with cancellation(token):
+#       analyze_video(...)        # another thread: token.cancel("client disconnected")
+#
+# The token travels in a context variable (like the instrumentation Recorder),
+# so legacy algorithm modules only call check_cancelled() / cancellable() in
+# their loops: between TransNetV2 windows, keyframes, pose/object frames, OCR
+# samples and palette chunks. Cancelled derives from BaseException, like
+# asyncio.CancelledError, so the pipeline's "except Exception" fallbacks do not
+# swallow it. Callbacks registered with on_cancel (killing an ffmpeg decoder,
+# for example) run as soon as cancel() is called.
+
+T = TypeVar("T")
+
+
+class Cancelled(BaseException):
+    pass
+
+
+class CancelToken:
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: list[Callable[[], None]] = []
+        self.reason: str | None = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception:
+                pass
+
+    def on_cancel(self, fn: Callable[[], None]) -> Callable[[], None]:
+        # Returns a function that unregisters the callback.
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+
+                def remove() -> None:
+                    with self._lock:
+                        if fn in self._callbacks:
+                            self._callbacks.remove(fn)
+
+                return remove
+        fn()
+        return lambda: None
+
+    def check(self) -> None:
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._event.wait(timeout)
+
+
+_current: contextvars.ContextVar[CancelToken | None] = contextvars.ContextVar("cinemetrics_cancel", default=None)
+
+
+@contextmanager
+def cancellation(token: CancelToken) -> Iterator[CancelToken]:
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def current_token() -> CancelToken | None:
+    return _current.get()
+
+
+def check_cancelled() -> None:
+    token = _current.get()
+    if token is not None:
+        token.check()
+
+
+def cancellable(items: Iterable[T]) -> Iterator[T]:
+    # Checks the current token before every item (decoding the next one included).
+    token = _current.get()
+    for item in items:
+        if token is not None:
+            token.check()
+        yield item
@@ -0,0 +1,203 @@
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+# Chart rendering service.
+#
+# Charts are described by (kind, data) specs. Registering a spec is cheap (hash +
+# small JSON sidecar), so analyses return as soon as the numbers are ready; PNGs
+# are rendered by a background worker or lazily on first request, and cached on
+# disk by spec hash. Rendering uses the object-oriented Agg API (Figure +
+# FigureCanvasAgg), never pyplot's global state, so it is thread-safe and cannot
+# leak figures.
+
+_BG = "black"
+_FG = "white"
+
+
+def _figure(figsize: tuple[float, float] = (8, 6)):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize, facecolor=_BG)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _style(ax, title: str) -> None:
+    ax.set_facecolor(_BG)
+    ax.set_title(title, color=_FG)
+    ax.tick_params(colors=_FG)
+    for spine in getattr(ax, "spines", {}).values():
+        spine.set_color(_FG)
+
+
+def _png(fig) -> bytes:
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", facecolor=fig.get_facecolor())
+    return buf.getvalue()
+
+
+def render_shotlen(data: dict[str, Any]) -> bytes:
+    lengths = data["lengths"]
+    fig = _figure()
+    ax = fig.add_subplot()
+    ax.bar(range(len(lengths)), lengths, color="blue")
+    _style(ax, "shot length")
+    return _png(fig)
+
+
+def render_colors3d(data: dict[str, Any]) -> bytes:
+    colors = [c for group in data["colors"] for c in group]
+    fig = _figure()
+    ax = fig.add_subplot(projection="3d")
+    if colors:
+        xs, ys, zs = zip(*colors)
+        ax.scatter(xs, ys, zs, c=[[r / 255, g / 255, b / 255, 1] for r, g, b in colors], edgecolor="black")
+    _style(ax, "color analysis")
+    return _png(fig)
+
+
+def render_shotscale(data: dict[str, Any]) -> bytes:
+    counts = Counter(data["labels"])
+    total = sum(counts.values()) or 1
+    fig = _figure()
+    ax = fig.add_subplot()
+    ax.pie(
+        [100 * c / total for c in counts.values()],
+        labels=list(counts.keys()),
+        autopct="%0.1f%%",
+        shadow=True,
+        pctdistance=0.5,
+        wedgeprops=dict(width=0.3, edgecolor="w"),
+        textprops=dict(color=_FG),
+    )
+    from matplotlib.patches import Circle
+
+    ax.add_artist(Circle((0, 0), 0.5, fc=_BG))
+    ax.axis("equal")
+    _style(ax, "Shot Scale")
+    return _png(fig)
+
+
+def render_palette(data: dict[str, Any]) -> bytes:
+    fig = _figure()
+    ax = fig.add_subplot()
+    ax.pie(
+        x=data["sizes"],
+        colors=data["colors"],
+        wedgeprops=dict(width=0.2, edgecolor="w"),
+        labels=data["colors"],
+        autopct="%1.2f%%",
+        textprops=dict(color=_FG),
+    )
+    _style(ax, data.get("title", ""))
+    return _png(fig)
+
+
+def render_wordcloud(data: dict[str, Any]) -> bytes:
+    from wordcloud import WordCloud
+
+    from app.backend.algorithms.wordcloud2frame import WordCloud2Frame
+
+    kwargs: dict[str, Any] = {"width": 800, "height": 600, "background_color": "white"}
+    font = WordCloud2Frame().resolve_font_path()
+    if font:
+        kwargs["font_path"] = font
+    frequencies = data["frequencies"] or {" ": 1}
+    image = WordCloud(**kwargs).generate_from_frequencies(frequencies).to_image()
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+RENDERERS: dict[str, Callable[[dict[str, Any]], bytes]] = {
+    "shotlen": render_shotlen,
+    "colors3d": render_colors3d,
+    "shotscale": render_shotscale,
+    "palette": render_palette,
+    "wordcloud": render_wordcloud,
+}
+
+
+def chart_key(kind: str, data: dict[str, Any]) -> str:
+    blob = json.dumps({"kind": kind, "data": data}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def _write_atomic(path: str, payload: bytes) -> None:
+    # pid as well: batch workers are separate processes rendering into the same cache.
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+
+def render_to_file(kind: str, data: dict[str, Any], path: str) -> str:
+    _write_atomic(path, RENDERERS[kind](data))
+    return path
+
+
+class ChartService:
+    def __init__(self, cache_dir: str, workers: int = 1) -> None:
+        self.cache_dir = cache_dir
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="charts")
+        self._inflight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def png_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def _spec_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def register(self, kind: str, data: dict[str, Any], prefetch: bool = False) -> str:
+        if kind not in RENDERERS:
+            raise ValueError(f"Unknown chart kind: {kind}")
+        key = chart_key(kind, data)
+        spec_path = self._spec_path(key)
+        if not os.path.exists(spec_path):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            _write_atomic(spec_path, json.dumps({"kind": kind, "data": data}).encode("utf-8"))
+        if prefetch:
+            self.submit(key)
+        return key
+
+    def _render(self, key: str) -> str:
+        path = self.png_path(key)
+        if not os.path.exists(path):
+            with open(self._spec_path(key), encoding="utf-8") as f:
+                spec = json.load(f)
+            _write_atomic(path, RENDERERS[spec["kind"]](spec["data"]))
+        return path
+
+    def submit(self, key: str) -> Future:
+        with self._lock:
+            fut = self._inflight.get(key)
+            if fut is None:
+                fut = self._executor.submit(self._render, key)
+                self._inflight[key] = fut
+                fut.add_done_callback(lambda _: self._drop(key))
+            return fut
+
+    def _drop(self, key: str) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def get(self, key: str, timeout: float | None = 60.0) -> str:
+        path = self.png_path(key)
+        if os.path.exists(path):
+            return path
+        if not os.path.exists(self._spec_path(key)):
+            raise KeyError(key)
+        rendered: str = self.submit(key).result(timeout=timeout)
+        return rendered
+
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+charts = ChartService(os.path.join(_PROJECT_ROOT, "img", "_charts"))
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Any
+
+import numpy as np
+
+from app.backend.result_store import IMG_ROOT, _check_name
+
+# Per-stage checkpoints for resumable analyses.
+#
+#   img/<stem>/checkpoints/<stage>.json
+#
+# When a stage of the StageGraph finishes, its outputs are written here
+# atomically (temp file + os.replace) together with a fingerprint and a digest of
+# the outputs. The fingerprint covers the video content, the stage's parameters
+# and the digests of the upstream outputs it consumed, so a checkpoint made from
+# an older upstream result (say, a previous cut list) never matches again, even
+# when the upstream checkpoint itself is current. A later run over the same video
+# restores a stage instead of running it when the fingerprint matches and every
+# stage it depends on was restored too. Anything recomputed upstream (or
+# invalidated on request) makes all of its dependents run again. Outputs are
+# stored as JSON; numpy arrays are tagged so they come back as arrays (no pickles).
+
+_SAMPLE = 2**20
+
+
+def video_fingerprint(path: str) -> str:
+    # Size plus three 1 MiB samples: cheap on multi-GB films, and stable across
+    # re-uploads of the same file (temp paths and mtimes differ every time).
+    size = os.path.getsize(path)
+    h = hashlib.sha1(str(size).encode())
+    with open(path, "rb") as f:
+        for offset in sorted({0, max(0, size // 2 - _SAMPLE // 2), max(0, size - _SAMPLE)}):
+            f.seek(offset)
+            h.update(f.read(_SAMPLE))
+    return h.hexdigest()
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return {"__ndarray__": value.tolist(), "dtype": value.dtype.str}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "__ndarray__" in value:
+            return np.asarray(value["__ndarray__"], dtype=np.dtype(value["dtype"]))
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+class Checkpoints:
+    def __init__(self, root: str, key: str) -> None:
+        self.root = root
+        self.key = key
+
+    @classmethod
+    def for_stem(cls, stem: str, key: str) -> "Checkpoints":
+        return cls(os.path.join(IMG_ROOT, _check_name(stem), "checkpoints"), key)
+
+    def _path(self, stage: str) -> str:
+        return os.path.join(self.root, f"{_check_name(stage)}.json")
+
+    def fingerprint(self, stage: str, params: dict[str, Any], upstream: tuple[str, ...] = ()) -> str:
+        # upstream: digests of the outputs this stage reads, in a stable order.
+        blob = json.dumps([self.key, stage, params, list(upstream)], sort_keys=True, default=str)
+        return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+    def load(self, stage: str, fingerprint: str) -> tuple[dict[str, Any], str] | None:
+        # (outputs, digest) of a matching checkpoint.
+        try:
+            with open(self._path(stage), encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("fingerprint") != fingerprint or not data.get("digest"):
+            return None
+        return _decode(data["outputs"]), str(data["digest"])
+
+    def save(self, stage: str, fingerprint: str, outputs: dict[str, Any], seconds: float = 0.0) -> str:
+        # Returns the digest of the outputs; downstream fingerprints include it.
+        path = self._path(stage)
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}"
+        body = json.dumps(_encode(outputs), sort_keys=True)
+        digest = hashlib.sha1(body.encode("utf-8")).hexdigest()
+        header = json.dumps(
+            {
+                "stage": stage,
+                "fingerprint": fingerprint,
+                "digest": digest,
+                "savedAt": time.time(),
+                "seconds": round(seconds, 4),
+            }
+        )
+        # The outputs are serialized once, for both the digest and the file.
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(header[:-1] + ', "outputs": ' + body + "}")
+        os.replace(tmp, path)
+        return digest
+
+    def discard(self, stage: str) -> None:
+        try:
+            os.remove(self._path(stage))
+        except FileNotFoundError:
+            pass
+
+    def stages(self) -> list[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(n[:-5] for n in os.listdir(self.root) if n.endswith(".json"))
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import re
+import uuid
+from typing import Any, Iterable
+
+import numpy as np
+
+from app.backend.result_store import IMG_ROOT, _check_name
+
+# Persistent cache of keyframe embeddings.
+#
+#   img/_embeddings/<model>/<ab>/<sha1>.npz
+#
+# ObjectDetection used to keep only the top-1 ImageNet label of each keyframe.
+# It now also takes the backbone's penultimate activations (VGG19: the 4096-d
+# output of the second fully connected layer) and the top-k labels, and stores
+# them here under the SHA-1 of the keyframe file. The same film analysed again,
+# another job over the same upload, or a later consumer (scene grouping,
+# deduplication, similarity search) reads the vectors back instead of running
+# the network. Entries are float16 .npz files without pickles, written atomically
+# and sharded by the first two hex digits of the key.
+
+CACHE_ROOT = os.path.join(IMG_ROOT, "_embeddings")
+_KEY = re.compile(r"^[0-9a-f]{40}$")
+
+
+def frame_key(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, root: str = CACHE_ROOT, model: str = "vgg19") -> None:
+        self.model = _check_name(model)
+        self.root = os.path.join(root, self.model)
+
+    def _path(self, key: str) -> str:
+        if not _KEY.match(key):
+            raise ValueError(f"Invalid embedding key: {key!r}")
+        return os.path.join(self.root, key[:2], f"{key}.npz")
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        try:
+            with np.load(self._path(key), allow_pickle=False) as data:
+                return {
+                    "embedding": data["embedding"].astype(np.float32),
+                    "labels": [str(x) for x in data["labels"]],
+                    "scores": [float(x) for x in data["scores"]],
+                }
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, dict[str, Any]]:
+        # Hits only; callers compute the missing keys.
+        found = {}
+        for key in keys:
+            entry = self.get(key)
+            if entry is not None:
+                found[key] = entry
+        return found
+
+    def put(self, key: str, embedding: np.ndarray, labels: list[str], scores: list[float]) -> str:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.npz"
+        np.savez(
+            tmp,
+            embedding=np.asarray(embedding, dtype=np.float16).reshape(-1),
+            labels=np.array(labels, dtype=str),
+            scores=np.asarray(scores, dtype=np.float32),
+        )
+        os.replace(tmp, path)
+        return path
+
+    def embeddings(self, keys: list[str]) -> np.ndarray | None:
+        # (len(keys), d) float32 matrix, or None unless every key is cached.
+        rows = []
+        for key in keys:
+            entry = self.get(key)
+            if entry is None:
+                return None
+            rows.append(entry["embedding"])
+        return np.stack(rows) if rows else None
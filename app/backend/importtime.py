@@ -0,0 +1,107 @@
+import argparse
+import json
+import re
+import subprocess
+import sys
+import time
+from typing import Any, TypedDict
+
+# Cold-start import report for the API process.
+#
+#   python -m app.backend.importtime                      # top imports of app.backend.main
+#   python -m app.backend.importtime --budget 1.5         # exit 1 when over budget
+#   python -m app.backend.importtime --json importtime.json
+#
+# Runs `python -X importtime -c "import <module>"` in a fresh interpreter, so the
+# numbers are what uvicorn pays before it can answer /api/health.
+
+DEFAULT_MODULE = "app.backend.main"
+# Frameworks that must only be loaded by the stage that needs them.
+HEAVY_MODULES = ("tensorflow", "torch", "torchvision", "matplotlib", "wordcloud", "jieba", "easyocr", "scipy")
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+class ImportEntry(TypedDict):
+    module: str
+    selfUs: int
+    cumulativeUs: int
+    depth: int
+
+
+def measure(module: str = DEFAULT_MODULE) -> dict[str, Any]:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        tail = "\n".join(proc.stderr.strip().splitlines()[-5:])
+        raise RuntimeError(f"Importing {module} failed:\n{tail}")
+
+    entries: list[ImportEntry] = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            self_us, cumulative_us, indent, name = m.groups()
+            entries.append(
+                {
+                    "module": name,
+                    "selfUs": int(self_us),
+                    "cumulativeUs": int(cumulative_us),
+                    "depth": len(indent) // 2,
+                }
+            )
+    target = next((e for e in entries if e["module"] == module), None)
+    loaded = {e["module"] for e in entries}
+    return {
+        "module": module,
+        "importSec": (target["cumulativeUs"] / 1e6) if target else 0.0,
+        "interpreterWallSec": wall,
+        "moduleCount": len(entries),
+        "heavyLoaded": sorted(m for m in HEAVY_MODULES if m in loaded),
+        "entries": entries,
+    }
+
+
+def check_startup(budget_sec: float, module: str = DEFAULT_MODULE) -> tuple[bool, dict[str, Any]]:
+    report = measure(module)
+    ok = report["importSec"] <= budget_sec and not report["heavyLoaded"]
+    return ok, report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report import time of the API process.")
+    parser.add_argument("--module", default=DEFAULT_MODULE)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--budget", type=float, default=None, help="fail if import takes longer (seconds)")
+    parser.add_argument("--json", dest="json_path", default=None, help="write the full report here")
+    args = parser.parse_args()
+
+    report = measure(args.module)
+    top = sorted(report["entries"], key=lambda e: e["cumulativeUs"], reverse=True)[: args.top]
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for e in top:
+        print(f"{e['cumulativeUs'] / 1000:14.1f} {e['selfUs'] / 1000:9.1f}  {'  ' * e['depth']}{e['module']}")
+    print(
+        f"\nimport {report['module']}: {report['importSec']:.3f}s "
+        f"({report['moduleCount']} modules, interpreter wall {report['interpreterWallSec']:.3f}s)"
+    )
+    if report["heavyLoaded"]:
+        print(f"heavy modules loaded at import: {', '.join(report['heavyLoaded'])}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.budget is not None:
+        if report["importSec"] > args.budget or report["heavyLoaded"]:
+            print(f"FAIL: startup budget {args.budget:.3f}s exceeded or heavy modules loaded")
+            sys.exit(1)
+        print(f"OK: within startup budget {args.budget:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import contextvars
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+# Lightweight spans for the analysis pipeline.
+#
+#   with span("object_detection") as sp:
+#       ...
+#       sp.items = len(frames)
+#
+# A span records wall time, CPU time of the calling thread (model frameworks'
+# own worker threads are not included), the process peak RSS at exit and how
+# much that high-water mark grew inside the span, plus an item count. Spans go
+# to the Recorder of the current analysis (a context variable, so legacy
+# algorithm modules need no extra parameters) and are always aggregated into
+# the process-wide METRICS, exported in Prometheus text format by /api/metrics.
+
+# ru_maxrss is KiB on Linux, bytes on macOS.
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def peak_rss_bytes() -> int:
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT
+
+
+class Span:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.items = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_rss = 0
+        self.rss_growth = 0
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._timings: dict[str, dict[str, Any]] = {}
+
+    def add(self, sp: Span) -> None:
+        with self._lock:
+            t = self._timings.setdefault(
+                sp.name,
+                {"count": 0, "wallSec": 0.0, "cpuSec": 0.0, "items": 0, "peakRssMb": 0.0, "rssGrowthMb": 0.0},
+            )
+            t["count"] += 1
+            t["wallSec"] = round(t["wallSec"] + sp.wall, 4)
+            t["cpuSec"] = round(t["cpuSec"] + sp.cpu, 4)
+            t["items"] += sp.items
+            t["peakRssMb"] = max(t["peakRssMb"], round(sp.peak_rss / 2**20, 1))
+            t["rssGrowthMb"] = round(t["rssGrowthMb"] + sp.rss_growth / 2**20, 1)
+
+    def timings(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return {name: dict(t) for name, t in self._timings.items()}
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stages: dict[str, dict[str, float]] = {}
+        self._counters: dict[tuple[str, str], float] = {}
+
+    def observe(self, sp: Span) -> None:
+        with self._lock:
+            m = self._stages.setdefault(sp.name, {"runs": 0, "wall": 0.0, "cpu": 0.0, "items": 0, "last": 0.0})
+            m["runs"] += 1
+            m["wall"] += sp.wall
+            m["cpu"] += sp.cpu
+            m["items"] += sp.items
+            m["last"] = sp.wall
+
+    def inc(self, name: str, label: str = "", value: float = 1.0) -> None:
+        with self._lock:
+            self._counters[(name, label)] = self._counters.get((name, label), 0.0) + value
+
+    def render(self) -> str:
+        with self._lock:
+            stages = {k: dict(v) for k, v in self._stages.items()}
+            counters = dict(self._counters)
+        lines = []
+        series = [
+            ("cinemetrics_stage_runs_total", "counter", "Completed runs per stage.", "runs"),
+            ("cinemetrics_stage_seconds_total", "counter", "Wall time spent per stage.", "wall"),
+            ("cinemetrics_stage_cpu_seconds_total", "counter", "Thread CPU time spent per stage.", "cpu"),
+            ("cinemetrics_stage_items_total", "counter", "Items processed per stage.", "items"),
+            ("cinemetrics_stage_last_seconds", "gauge", "Wall time of the most recent run per stage.", "last"),
+        ]
+        for metric, kind, help_text, key in series:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for stage in sorted(stages):
+                lines.append(f'{metric}{{stage="{stage}"}} {stages[stage][key]:.10g}')
+        names = sorted({name for name, _ in counters})
+        for name in names:
+            lines.append(f"# TYPE {name} counter")
+            for (n, label), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f'{name}{{status="{label}"}} {value:.10g}' if label else f"{name} {value:.10g}")
+        lines.append("# HELP cinemetrics_process_peak_rss_bytes Peak resident set size of the API process.")
+        lines.append("# TYPE cinemetrics_process_peak_rss_bytes gauge")
+        lines.append(f"cinemetrics_process_peak_rss_bytes {peak_rss_bytes()}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+_current: contextvars.ContextVar[Recorder | None] = contextvars.ContextVar("cinemetrics_recorder", default=None)
+
+
+@contextmanager
+def recording(recorder: Recorder) -> Iterator[Recorder]:
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str) -> Iterator[Span]:
+    sp = Span(name)
+    rss_start = peak_rss_bytes()
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield sp
+    finally:
+        sp.wall = time.perf_counter() - wall_start
+        sp.cpu = time.thread_time() - cpu_start
+        sp.peak_rss = peak_rss_bytes()
+        sp.rss_growth = sp.peak_rss - rss_start
+        recorder = _current.get()
+        if recorder is not None:
+            recorder.add(sp)
+        METRICS.observe(sp)
@@ -0,0 +1,207 @@
+import copy
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.backend.analysis_pipeline import attach_subtitles
+from app.backend.cancellation import CancelToken, Cancelled, cancellation
+from app.backend.instrumentation import METRICS
+
+# In-process registry of analysis jobs.
+#
+# A job's main result becomes visible as soon as analyze_video returns; slower
+# background stages (subtitle OCR) keep streaming into it afterwards, which is
+# reported as status "partial" until every pending stage has finished.
+# A preview job with refinement publishes its approximate result first (status
+# "partial", pending stage "refine") and swaps in the full analysis when that
+# finishes; subtitle entries are held back until the final shots exist.
+# Cancelling a job (DELETE /api/jobs/{id}) sets its CancelToken: the analysis
+# and its background stages stop at their next check, usually well within a
+# second, and the job ends as "cancelled".
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="analysis-job")
+
+
+class Job:
+    def __init__(self, job_id: str, filename: str) -> None:
+        self.id = job_id
+        self.filename = filename
+        self.status = "queued"
+        self.error: str | None = None
+        self.result: dict[str, Any] | None = None
+        self.pending: set[str] = set()
+        self.provisional = False
+        self.created = time.time()
+        self.updated = self.created
+        self._lock = threading.Lock()
+        self._buffered: list[list[dict[str, Any]]] = []
+        self._stage_info: dict[str, dict[str, Any]] = {}
+        self._finalizers: list[Callable[[], None]] = []
+        self.token = CancelToken()
+
+    def on_finish(self, fn: Callable[[], None]) -> None:
+        self._finalizers.append(fn)
+
+    def _touch(self) -> None:
+        self.updated = time.time()
+
+    def start(self, pending: set[str]) -> None:
+        with self._lock:
+            if self.status == "cancelled":
+                return
+            self.status = "partial" if self.result is not None else "running"
+            self.pending.update(pending)
+            self._touch()
+
+    def set_preview(self, result: dict[str, Any]) -> None:
+        # Visible right away, replaced by the refined result in set_result.
+        with self._lock:
+            if self.status == "cancelled":
+                return
+            self.result = result
+            self.provisional = True
+            self.pending.add("refine")
+            self.status = "partial"
+            self._touch()
+
+    def set_result(self, result: dict[str, Any]) -> None:
+        with self._lock:
+            if self.status == "cancelled":
+                return
+            self.result = result
+            self.provisional = False
+            self.pending.discard("refine")
+            # Entries that arrived before the shots existed are attached now.
+            for entries in self._buffered:
+                attach_subtitles(result, entries)
+            self._buffered = []
+            for stage, info in self._stage_info.items():
+                result.setdefault(stage, {}).update(info)
+            self.status = "partial" if self.pending else "done"
+            self._touch()
+            finished = not self.pending
+        if finished:
+            self._finish()
+
+    def update(self, event: str, payload: Any) -> None:
+        with self._lock:
+            finished = False
+            if event == "subtitles":
+                if self.result is None or self.provisional:
+                    self._buffered.append(payload)
+                else:
+                    attach_subtitles(self.result, payload)
+            elif event.endswith("_done"):
+                stage = event[: -len("_done")]
+                self.pending.discard(stage)
+                self._stage_info.setdefault(stage, {}).update(payload or {})
+                if self.result is not None and not self.provisional:
+                    self.result.setdefault(stage, {}).update(payload or {})
+                    if not self.pending and self.status == "partial":
+                        self.status = "done"
+                        finished = True
+            self._touch()
+        if finished:
+            self._finish()
+
+    def cancel(self, reason: str = "cancelled by client") -> bool:
+        with self._lock:
+            if self.status in ("done", "failed", "cancelled"):
+                return False
+            # A running analysis ends itself at its next check; queued and partial
+            # jobs have no thread of their own waiting to notice it.
+            finish_now = self.status in ("queued", "partial")
+            if finish_now:
+                self.status = "cancelled"
+                self.error = reason
+                self.pending.clear()
+                self._touch()
+        self.token.cancel(reason)
+        if finish_now:
+            self._finish()
+        return True
+
+    def mark_cancelled(self, reason: str) -> None:
+        with self._lock:
+            self.status = "cancelled"
+            self.error = reason
+            self.pending.clear()
+            self._touch()
+        self._finish()
+
+    def fail(self, message: str) -> None:
+        with self._lock:
+            self.status = "failed"
+            self.error = message
+            self.pending.clear()
+            self._touch()
+        self._finish()
+
+    def _finish(self) -> None:
+        with self._lock:
+            finalizers, self._finalizers = self._finalizers, []
+        for fn in finalizers:
+            try:
+                fn()
+            except Exception:
+                pass
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "jobId": self.id,
+                "filename": self.filename,
+                "status": self.status,
+                "pendingStages": sorted(self.pending),
+                "provisional": self.provisional,
+                "error": self.error,
+                "createdAt": self.created,
+                "updatedAt": self.updated,
+                "result": copy.deepcopy(self.result),
+            }
+
+
+class JobStore:
+    def __init__(self, max_jobs: int = 64) -> None:
+        self.max_jobs = max_jobs
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def create(self, filename: str) -> Job:
+        job = Job(uuid.uuid4().hex[:12], filename)
+        with self._lock:
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs once the registry is full.
+            finished = [j for j in self._jobs.values() if j.status in ("done", "failed", "cancelled")]
+            for old in sorted(finished, key=lambda j: j.updated)[: max(0, len(self._jobs) - self.max_jobs)]:
+                self._jobs.pop(old.id, None)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def submit(self, job: Job, fn: Callable[[Job], dict[str, Any]], pending: set[str]) -> None:
+        def run() -> None:
+            if job.token.cancelled:
+                return
+            job.start(pending)
+            try:
+                with cancellation(job.token):
+                    result = fn(job)
+                job.set_result(result)
+            except Cancelled:
+                METRICS.inc("cinemetrics_analyses_total", "cancelled")
+                job.mark_cancelled(job.token.reason or "cancelled")
+            except Exception as exc:
+                METRICS.inc("cinemetrics_analyses_total", "failed")
+                job.fail(f"Analysis failed: {exc}")
+            else:
+                METRICS.inc("cinemetrics_analyses_total", "done")
+
+        _EXECUTOR.submit(run)
+
+
+jobs = JobStore()
@@ -1,11 +1,29 @@
+import asyncio
 import os
+import re
 import tempfile
 from pathlib import Path
+from typing import Any, Callable
 
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi import Depends, FastAPI, File, Form, HTTPException, Query, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
-from app.backend.analysis_pipeline import analyze_video
+from app.backend.algorithms.keyframes import FORMATS as KEYFRAME_FORMATS
+from app.backend.analysis_pipeline import MODES, STAGE_NAMES, analyze_video, check_scene_cues
+from app.backend.artifacts import IMMUTABLE, artifact_response, resolve_artifact
+from app.backend.cancellation import CancelToken, Cancelled, cancellation
+from app.backend.charts import charts
+from app.backend.instrumentation import METRICS, span
+from app.backend.jobs import Job, jobs
+from app.backend.payload import NotAcceptable, compress, encode, shape_result
+from app.backend.preview import SAMPLE_MODES
+from app.backend.result_store import ResultStore
+from app.backend.scenes import CUES
+from app.backend.search import MODES as SEARCH_MODES
+from app.backend.search import REFRESH_SEC, SPACES, IndexNotReady, similar_shots
 
 app = FastAPI(
     title="Cinemetrics Backend API",
@@ -20,6 +38,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 
 @app.get("/api/health")
@@ -27,6 +46,11 @@ def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/api/metrics")
+def metrics() -> PlainTextResponse:
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/api/contract")
 def contract() -> dict:
     return {
@@ -38,50 +62,433 @@ def contract() -> dict:
                 "shot_threshold": "float 0.05..0.95",
                 "include_object_detection": "bool",
                 "include_shot_scale": "bool",
+                "include_palette": "bool",
+                "palette_size": "int 1..12",
+                "include_subtitles": "bool",
+                "subtitle_interval": "int frames between OCR samples",
+                "keyframe_format": "jpg | webp | png",
+                "keyframe_quality": "int 1..100 (jpg/webp)",
+                "keyframe_max_dim": "int longest keyframe side in px, 0 = full resolution",
+                "checkpoint": "bool, resume from / save per-stage checkpoints",
+                "invalidate": "comma list of stages to recompute: " + ", ".join(STAGE_NAMES),
+                "scene_cues": "comma list of cue:weight, cues: " + ", ".join(CUES) + " (default rgb_drift:1,rhythm:7)",
+                "scene_window": "int shots compared on each side of a scene boundary",
+                "mode": " | ".join(MODES) + " (preview: histogram cuts on sampled frames, no scale/object/OCR stages)",
+                "preview_sample": " | ".join(SAMPLE_MODES),
+                "preview_fps": "float sampled frames per second for preview_sample=fps",
+                "refine": "bool, preview mode: run the full analysis in the background as a job",
             }
         },
         "response_keys": ["meta", "global", "shots", "scenes", "outputs"],
+        "refine": "preview responses with refine=true carry refine.jobId; the job's result is the preview until the full analysis replaces it",
+        "response_query": {
+            "fields": "comma list of keys or dotted paths, e.g. meta,shots.shotId",
+            "shot_refs": "bool, scenes carry shotStartIndex/shotEndIndex instead of shot copies",
+            "shot_offset": "int",
+            "shot_limit": "int",
+            "precision": "int decimals for floats",
+            "accept": "application/json (default) | application/msgpack",
+        },
+        "jobs": {
+            "create": "POST /api/jobs (same form fields as /api/analyze)",
+            "poll": "GET /api/jobs/{job_id}",
+            "cancel": "DELETE /api/jobs/{job_id}",
+            "status": ["queued", "running", "partial", "done", "failed", "cancelled"],
+            "provisional": "bool, the result is a preview still being refined",
+        },
+        "metrics": "GET /api/metrics (Prometheus text format)",
+        "artifacts": "GET /api/artifacts/{stem}/{path} (ETag, If-None-Match, Range)",
+        "tables": {
+            "result": "GET /api/results/{stem} (batch results)",
+            "list": "GET /api/results/{stem}/tables",
+            "export": "GET /api/results/{stem}/tables/{table}.csv",
+        },
+        "search": {
+            "similar": "GET /api/search/similar?stem=&shot_id=",
+            "query": {
+                "k": "int results, default 10",
+                "space": " | ".join(SPACES) + " (embedding needs object detection)",
+                "mode": " | ".join(SEARCH_MODES) + " (auto: exact below 50k shots, else ivfpq)",
+                "nprobe": "int IVF lists scanned, default 8",
+                "exclude_same_film": "bool",
+            },
+        },
     }
 
 
+def _remove_quietly(path: str | None) -> None:
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class PayloadParams:
+    def __init__(
+        self,
+        fields: str | None = Query(None),
+        shot_refs: bool = Query(False),
+        shot_offset: int = Query(0, ge=0),
+        shot_limit: int | None = Query(None, ge=0),
+        precision: int | None = Query(None, ge=0, le=12),
+    ) -> None:
+        self.fields = fields
+        self.shot_refs = shot_refs
+        self.shot_offset = shot_offset
+        self.shot_limit = shot_limit
+        self.precision = precision
+
+    def apply(self, result: dict) -> dict:
+        return shape_result(
+            result,
+            fields=self.fields,
+            shot_refs=self.shot_refs,
+            shot_offset=self.shot_offset,
+            shot_limit=self.shot_limit,
+            precision=self.precision,
+        )
+
+
+class AnalysisForm:
+    # Multipart fields shared by /api/analyze and /api/jobs, parsed and validated once.
+    def __init__(
+        self,
+        scene_sensitivity: int = Form(6),
+        shot_threshold: float = Form(0.35),
+        include_object_detection: bool = Form(True),
+        include_shot_scale: bool = Form(True),
+        include_palette: bool = Form(False),
+        palette_size: int = Form(5),
+        include_subtitles: bool = Form(False),
+        subtitle_interval: int = Form(48),
+        keyframe_format: str = Form("jpg"),
+        keyframe_quality: int = Form(90),
+        keyframe_max_dim: int = Form(1920),
+        checkpoint: bool = Form(True),
+        invalidate: str = Form(""),
+        scene_cues: str = Form(""),
+        scene_window: int = Form(1),
+        mode: str = Form("full"),
+        preview_sample: str = Form("keyframes"),
+        preview_fps: float = Form(2.0),
+        refine: bool = Form(False),
+    ) -> None:
+        _check_mode(mode, preview_sample)
+        _check_keyframes(keyframe_format)
+        self.scene_sensitivity = scene_sensitivity
+        self.shot_threshold = shot_threshold
+        self.include_object_detection = include_object_detection
+        self.include_shot_scale = include_shot_scale
+        self.include_palette = include_palette
+        self.palette_size = palette_size
+        self.include_subtitles = include_subtitles
+        self.subtitle_interval = subtitle_interval
+        self.keyframe_format = keyframe_format
+        self.keyframe_quality = keyframe_quality
+        self.keyframe_max_dim = keyframe_max_dim
+        self.checkpoint = checkpoint
+        self.invalidate = _parse_invalidate(invalidate)
+        self.scene_cues = _parse_scene_cues(scene_cues)
+        self.scene_window = scene_window
+        self.mode = mode
+        self.preview_sample = preview_sample
+        self.preview_fps = preview_fps
+        self.refine = refine
+        _check_scenes(self)
+
+    def analyze(
+        self,
+        video_path: str,
+        filename: str,
+        *,
+        mode: str | None = None,
+        on_update: Callable[[str, Any], None] | None = None,
+    ) -> dict[str, Any]:
+        return analyze_video(
+            video_path=video_path,
+            original_filename=filename,
+            scene_sensitivity=self.scene_sensitivity,
+            shot_threshold=self.shot_threshold,
+            include_object_detection=self.include_object_detection,
+            include_shot_scale=self.include_shot_scale,
+            include_palette=self.include_palette,
+            palette_size=self.palette_size,
+            include_subtitles=self.include_subtitles,
+            subtitle_interval=self.subtitle_interval,
+            keyframe_format=self.keyframe_format,
+            keyframe_quality=self.keyframe_quality,
+            keyframe_max_dim=self.keyframe_max_dim,
+            checkpoint=self.checkpoint,
+            invalidate=self.invalidate,
+            scene_cues=self.scene_cues,
+            scene_window=self.scene_window,
+            mode=mode or self.mode,
+            preview_sample=self.preview_sample,
+            preview_fps=self.preview_fps,
+            on_update=on_update,
+        )
+
+
+def _payload_response(request: Request, payload: dict) -> Response:
+    try:
+        with span("serialization") as sp:
+            body, media_type = encode(payload, request.headers.get("accept"))
+            sp.items = len(body)
+    except NotAcceptable as exc:
+        raise HTTPException(status_code=406, detail=str(exc))
+    body, encoding = compress(body, request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept, Accept-Encoding", "Server-Timing": f"serialize;dur={sp.wall * 1000:.1f}"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=media_type, headers=headers)
+
+
+def _parse_invalidate(text: str) -> list[str]:
+    names = [n.strip() for n in text.split(",") if n.strip()]
+    unknown = sorted(set(names) - set(STAGE_NAMES))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown stages to invalidate: {unknown}")
+    return names
+
+
+def _parse_scene_cues(text: str) -> dict[str, float] | None:
+    if not text.strip():
+        return None
+    cues: dict[str, float] = {}
+    for item in text.split(","):
+        name, _, weight = item.strip().partition(":")
+        if name not in CUES:
+            raise HTTPException(status_code=400, detail=f"Unknown scene cue: {name}")
+        try:
+            cues[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid weight for scene cue {name}: {weight}")
+    return cues
+
+
+def _check_mode(mode: str, preview_sample: str) -> None:
+    if mode not in MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode: {mode}")
+    if preview_sample not in SAMPLE_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown preview_sample: {preview_sample}")
+
+
+def _check_keyframes(keyframe_format: str) -> None:
+    if keyframe_format not in KEYFRAME_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown keyframe_format: {keyframe_format}")
+
+
+def _check_scenes(form: "AnalysisForm") -> None:
+    try:
+        check_scene_cues(
+            form.scene_cues,
+            form.include_palette,
+            form.include_object_detection,
+            form.include_shot_scale,
+            form.mode,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+async def _cancel_on_disconnect(request: Request, token: CancelToken, interval: float = 0.25) -> None:
+    while not token.cancelled:
+        if await request.is_disconnected():
+            token.cancel("client disconnected")
+            return
+        await asyncio.sleep(interval)
+
+
+def _analyze_cancellable(token: CancelToken, form: AnalysisForm, video_path: str, filename: str) -> dict:
+    with cancellation(token):
+        return form.analyze(video_path, filename)
+
+
+def _refine_in_background(temp_path: str, filename: str, preview: dict, form: AnalysisForm) -> Job:
+    # The job owns the upload from here on and removes it when it finishes.
+    job = jobs.create(filename)
+    job.on_finish(lambda: _remove_quietly(temp_path))
+    job.set_preview(preview)
+
+    def run(job: Job) -> dict:
+        return form.analyze(temp_path, job.filename, mode="full", on_update=job.update)
+
+    jobs.submit(job, run, {"subtitles"} if form.include_subtitles else set())
+    return job
+
+
+async def _save_upload(video: UploadFile) -> tuple[str, str]:
+    # Returns (temp path, original filename).
+    if not video.filename:
+        raise HTTPException(status_code=400, detail="Missing video filename.")
+    suffix = Path(video.filename).suffix or ".mp4"
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tf:
+        content = await video.read()
+        tf.write(content)
+        return tf.name, video.filename
+
+
 @app.post("/api/analyze")
 async def analyze(
+    request: Request,
     video: UploadFile = File(...),
-    scene_sensitivity: int = Form(6),
-    shot_threshold: float = Form(0.35),
-    include_object_detection: bool = Form(True),
-    include_shot_scale: bool = Form(True),
+    form: AnalysisForm = Depends(),
+    shaping: PayloadParams = Depends(),
 ):
-    if not video.filename:
-        raise HTTPException(status_code=400, detail="Missing video filename.")
-
-    suffix = Path(video.filename).suffix or ".mp4"
     temp_path = None
+    # The analysis runs on a worker thread while this coroutine watches the
+    # connection; a client that goes away cancels it at the next check.
+    token = CancelToken()
+    watcher = asyncio.create_task(_cancel_on_disconnect(request, token))
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tf:
-            temp_path = tf.name
-            content = await video.read()
-            tf.write(content)
-
-        result = analyze_video(
-            video_path=temp_path,
-            original_filename=video.filename,
-            scene_sensitivity=scene_sensitivity,
-            shot_threshold=shot_threshold,
-            include_object_detection=include_object_detection,
-            include_shot_scale=include_shot_scale,
-        )
-        return result
+        temp_path, filename = await _save_upload(video)
+        result = await run_in_threadpool(_analyze_cancellable, token, form, temp_path, filename)
+        if form.mode == "preview" and form.refine:
+            job = _refine_in_background(temp_path, filename, result, form)
+            temp_path = None
+            result = dict(result, refine={"jobId": job.id, "status": job.status})
     except HTTPException:
         raise
+    except Cancelled:
+        METRICS.inc("cinemetrics_analyses_total", "cancelled")
+        raise HTTPException(status_code=499, detail="Client closed request.")
     except Exception as exc:
+        METRICS.inc("cinemetrics_analyses_total", "failed")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {exc}") from exc
     finally:
-        if temp_path and os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except OSError:
-                pass
+        watcher.cancel()
+        _remove_quietly(temp_path)
+    METRICS.inc("cinemetrics_analyses_total", "done")
+    return _payload_response(request, shaping.apply(result))
+
+
+@app.post("/api/jobs", status_code=202)
+async def create_job(video: UploadFile = File(...), form: AnalysisForm = Depends()):
+    temp_path, filename = await _save_upload(video)
+    job = jobs.create(filename)
+    # The upload outlives the request: background stages still read it.
+    job.on_finish(lambda: _remove_quietly(temp_path))
+    full = form.mode == "full" or form.refine
+
+    def run(job: Job) -> dict:
+        if form.mode == "preview":
+            preview = form.analyze(temp_path, job.filename)
+            if not form.refine:
+                return preview
+            job.set_preview(preview)
+        return form.analyze(temp_path, job.filename, mode="full", on_update=job.update)
+
+    jobs.submit(job, run, {"subtitles"} if form.include_subtitles and full else set())
+    return {"jobId": job.id, "status": job.status}
+
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str, request: Request, shaping: PayloadParams = Depends()):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job.")
+    snapshot = job.snapshot()
+    if snapshot["result"] is not None:
+        snapshot["result"] = shaping.apply(snapshot["result"])
+    return _payload_response(request, snapshot)
+
+
+@app.delete("/api/jobs/{job_id}")
+def cancel_job(job_id: str) -> dict:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job.")
+    if not job.cancel():
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}.")
+    return {"jobId": job.id, "status": job.status}
+
+
+@app.api_route("/api/charts/{key}.png", methods=["GET", "HEAD"])
+def chart_png(key: str, request: Request):
+    if not re.fullmatch(r"[0-9a-f]{40}", key):
+        raise HTTPException(status_code=404, detail="Unknown chart.")
+    try:
+        path = charts.get(key)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown chart.")
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Chart rendering failed: {exc}") from exc
+    # The key is the hash of the chart data, so it doubles as a strong ETag.
+    return artifact_response(request, path, etag=f'"{key}"', cache_control=IMMUTABLE, media_type="image/png")
+
+
+@app.api_route("/api/artifacts/{stem}/{path:path}", methods=["GET", "HEAD"])
+def artifact(stem: str, path: str, request: Request):
+    resolved = resolve_artifact(stem, path) if re.fullmatch(r"[A-Za-z0-9_-]+", stem) else None
+    if resolved is None:
+        raise HTTPException(status_code=404, detail="Unknown artifact.")
+    return artifact_response(request, resolved)
+
+
+def _store_for(stem: str) -> ResultStore:
+    try:
+        return ResultStore.for_stem(stem)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Unknown result.")
+
+
+@app.get("/api/results/{stem}")
+def stored_result(stem: str, request: Request, shaping: PayloadParams = Depends()):
+    store = _store_for(stem)
+    if not store.has_document("result"):
+        raise HTTPException(status_code=404, detail="Unknown result.")
+    return _payload_response(request, shaping.apply(store.read_document("result")))
+
+
+@app.get("/api/results/{stem}/tables")
+def list_tables(stem: str) -> dict:
+    store = _store_for(stem)
+    return {"tables": {name: store.meta(name) for name in store.tables()}}
+
+
+@app.get("/api/results/{stem}/tables/{table}.csv")
+def export_table(stem: str, table: str):
+    store = _store_for(stem)
+    try:
+        if not store.has_table(table):
+            raise HTTPException(status_code=404, detail="Unknown table.")
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Unknown table.")
+    return StreamingResponse(
+        store.iter_csv(table),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{stem}_{table}.csv"'},
+    )
+
+
+@app.get("/api/search/similar")
+def search_similar(
+    stem: str = Query(...),
+    shot_id: int = Query(...),
+    k: int = Query(10, ge=1, le=1000),
+    space: str = Query("look"),
+    mode: str = Query("auto"),
+    nprobe: int = Query(8, ge=1),
+    exclude_same_film: bool = Query(False),
+) -> dict:
+    if space not in SPACES or mode not in SEARCH_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"space must be one of {list(SPACES)}, mode one of {list(SEARCH_MODES)}.",
+        )
+    try:
+        return similar_shots(
+            stem, shot_id, k=k, space=space, mode=mode, nprobe=nprobe, exclude_same_film=exclude_same_film
+        )
+    except IndexNotReady as exc:
+        # The first index of this space is being built in the background.
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": str(int(REFRESH_SEC))})
+    except ValueError as exc:
+        # No film has the features of this space yet.
+        raise HTTPException(status_code=404, detail=str(exc))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown shot, or its film has no vectors in this space.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,165 @@
+import json
+from typing import Any
+
+import numpy as np
+
+# Response shaping for analysis results.
+#
+# By default a result is returned exactly as analyze_video builds it. Callers can
+# ask for less:
+#   fields      comma list of top-level keys or dotted paths ("meta,shots.shotId")
+#   shot_refs   scenes reference shots by index range instead of embedding copies
+#   shot_offset / shot_limit   page through `shots`
+#   precision   round floats to this many decimals
+# and for a denser encoding: MessagePack (Accept: application/msgpack) when the
+# optional msgpack package is installed. JSON is serialized directly to bytes,
+# skipping FastAPI's jsonable_encoder walk over every shot. Brotli is used when
+# the client accepts it and the optional brotli package is installed; otherwise
+# GZipMiddleware compresses the body.
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+class NotAcceptable(Exception):
+    pass
+
+
+def _field_tree(fields: str) -> dict[str, Any]:
+    tree: dict[str, Any] = {}
+    for path in fields.split(","):
+        parts = [p for p in path.strip().split(".") if p]
+        if not parts:
+            continue
+        node = tree
+        for part in parts[:-1]:
+            if node.get(part) is True:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = True
+    return tree
+
+
+def _select(value: Any, tree: dict[str, Any]) -> Any:
+    if isinstance(value, list):
+        return [_select(v, tree) for v in value]
+    if not isinstance(value, dict):
+        return value
+    out = {}
+    for key, sub in tree.items():
+        if key in value:
+            out[key] = value[key] if sub is True else _select(value[key], sub)
+    return out
+
+
+def _round_floats(value: Any, digits: int) -> Any:
+    if isinstance(value, float):
+        return round(value, digits)
+    if isinstance(value, list):
+        return [_round_floats(v, digits) for v in value]
+    if isinstance(value, dict):
+        return {k: _round_floats(v, digits) for k, v in value.items()}
+    return value
+
+
+def shape_result(
+    result: dict[str, Any],
+    *,
+    fields: str | None = None,
+    shot_refs: bool = False,
+    shot_offset: int = 0,
+    shot_limit: int | None = None,
+    precision: int | None = None,
+) -> dict[str, Any]:
+    shaped = dict(result)
+    shots = result.get("shots") or []
+
+    if shot_refs and "scenes" in shaped:
+        # Indices point into the full `shots` list, independent of pagination.
+        index = {s["shotId"]: i for i, s in enumerate(shots)}
+        scenes = []
+        for scene in shaped["scenes"]:
+            members = [index.get(s["shotId"]) for s in scene.get("shots", [])]
+            scene = {k: v for k, v in scene.items() if k != "shots"}
+            members = [i for i in members if i is not None]
+            scene["shotStartIndex"] = members[0] if members else None
+            scene["shotEndIndex"] = members[-1] if members else None
+            scenes.append(scene)
+        shaped["scenes"] = scenes
+
+    if shot_offset or shot_limit is not None:
+        offset = max(0, int(shot_offset))
+        end = len(shots) if shot_limit is None else offset + max(0, int(shot_limit))
+        shaped["shots"] = shots[offset:end]
+        shaped["shotPage"] = {"offset": offset, "limit": shot_limit, "total": len(shots)}
+
+    if fields:
+        tree = _field_tree(fields)
+        if "shotPage" in shaped:
+            tree.setdefault("shotPage", True)
+        shaped = _select(shaped, tree)
+
+    if precision is not None:
+        shaped = _round_floats(shaped, max(0, int(precision)))
+    return shaped
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (set, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def wants_msgpack(accept: str | None) -> bool:
+    accept = accept or ""
+    return any(t in accept for t in MSGPACK_TYPES)
+
+
+def encode(payload: Any, accept: str | None = None) -> tuple[bytes, str]:
+    accept = accept or ""
+    if wants_msgpack(accept):
+        try:
+            import msgpack
+        except ImportError:
+            if "application/json" not in accept and "*/*" not in accept:
+                raise NotAcceptable("MessagePack encoding requires the optional `msgpack` package.")
+        else:
+            return msgpack.packb(payload, default=_default, use_bin_type=True), "application/msgpack"
+    body = json.dumps(payload, default=_default, ensure_ascii=False, separators=(",", ":"))
+    return body.encode("utf-8"), "application/json"
+
+
+def accepts_encoding(accept_encoding: str | None, coding: str) -> bool:
+    # Accept-Encoding tokens with q-values: "gzip, br;q=0.5". The coding is
+    # acceptable when its own q (or that of "*" if it is not listed) is > 0.
+    weights: dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    q = weights.get(coding, weights.get("*", 0.0))
+    return q > 0
+
+
+def compress(body: bytes, accept_encoding: str | None, minimum_size: int = 1024) -> tuple[bytes, str | None]:
+    if len(body) < minimum_size or not accepts_encoding(accept_encoding, "br"):
+        return body, None
+    try:
+        import brotli
+    except ImportError:
+        return body, None
+    return brotli.compress(body, quality=5), "br"
@@ -0,0 +1,135 @@
+import re
+import threading
+from typing import Any, Iterator
+
+import numpy as np
+
+from app.backend.cancellation import cancellable, check_cancelled, current_token
+
+# Fast preview analysis: approximate shots from a decimated frame stream.
+#
+# ffmpeg decodes only the stream's keyframes (sample="keyframes", -skip_frame
+# nokey: the decoder never touches P/B frames, so a feature film is read in
+# seconds) or every frame resampled to a low rate (sample="fps"), scaled to a
+# small size. Cuts are placed where the colour histograms of consecutive
+# samples differ by more than a threshold. A cut therefore lands on the first
+# sample of the new shot: within one GOP when sampling keyframes (encoders
+# start a GOP at most scene cuts anyway) and within 1/fps seconds otherwise.
+# Only the first sample of every shot is kept in memory, for its keyframe.
+
+SAMPLE_MODES = ("keyframes", "fps")
+
+_BINS = 8  # per channel, 512 bins in total
+_SHIFT = 5  # 256 levels / 8 bins
+_SHOWINFO = re.compile(rb"\bn:\s*(\d+)\s+pts:\s*\S+\s+pts_time:\s*(-?[\d.]+)")
+
+
+def preview_size(width: int, height: int, max_dim: int = 256) -> tuple[int, int]:
+    # Even dimensions with the source aspect ratio; rawvideo frames need both.
+    if width <= 0 or height <= 0:
+        return max_dim, max_dim * 9 // 16 // 2 * 2
+    scale = max_dim / max(width, height)
+    return max(2, int(round(width * scale / 2)) * 2), max(2, int(round(height * scale / 2)) * 2)
+
+
+def color_histogram(frame: np.ndarray) -> np.ndarray:
+    q = (frame >> _SHIFT).astype(np.int32)
+    idx = (q[..., 0] * _BINS + q[..., 1]) * _BINS + q[..., 2]
+    hist = np.bincount(idx.ravel(), minlength=_BINS**3).astype(np.float32)
+    return hist / max(1, idx.size)
+
+
+def histogram_distance(a: np.ndarray, b: np.ndarray) -> float:
+    # Half the L1 distance of two normalized histograms: 0 identical, 1 disjoint.
+    return float(0.5 * np.abs(a - b).sum())
+
+
+class SampledDecoder:
+    # Iterates BGR frames of the decimated stream; times[i] is the presentation
+    # time of frame i, complete once the iteration has finished.
+
+    def __init__(
+        self,
+        video_path: str,
+        size: tuple[int, int],
+        sample: str = "keyframes",
+        sample_fps: float = 2.0,
+    ) -> None:
+        if sample not in SAMPLE_MODES:
+            raise ValueError(f"Unsupported preview sampling: {sample}")
+        self.video_path = video_path
+        self.width, self.height = size
+        self.sample = sample
+        self.sample_fps = max(0.1, float(sample_fps))
+        self.times: list[float] = []
+
+    def _start(self):
+        import ffmpeg
+
+        if self.sample == "keyframes":
+            stream = ffmpeg.input(self.video_path, skip_frame="nokey")
+        else:
+            stream = ffmpeg.input(self.video_path).filter("fps", fps=self.sample_fps)
+        stream = stream.filter("scale", self.width, self.height).filter("showinfo")
+        return (
+            stream.output("pipe:", format="rawvideo", pix_fmt="bgr24", fps_mode="passthrough")
+            .global_args("-hide_banner", "-nostats")
+            .run_async(pipe_stdout=True, pipe_stderr=True)
+        )
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        process = self._start()
+        token = current_token()
+        unregister = token.on_cancel(process.kill) if token is not None else (lambda: None)
+        err_chunks: list[bytes] = []
+        drain = threading.Thread(target=lambda: err_chunks.append(process.stderr.read()), daemon=True)
+        drain.start()
+        frame_bytes = self.width * self.height * 3
+        count = 0
+        try:
+            while True:
+                buf = process.stdout.read(frame_bytes)
+                if len(buf) < frame_bytes:
+                    break
+                count += 1
+                yield np.frombuffer(buf, np.uint8).reshape(self.height, self.width, 3)
+            process.wait()
+        finally:
+            unregister()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            drain.join()
+        check_cancelled()
+        err = b"".join(err_chunks)
+        if process.returncode != 0:
+            raise RuntimeError(f"FFmpeg failed to sample {self.video_path}: {err.decode(errors='replace')[-2000:]}")
+        times = {int(n): float(t) for n, t in _SHOWINFO.findall(err)}
+        # Without showinfo output (it should not happen) fall back to the nominal rate.
+        step = 1.0 / self.sample_fps
+        self.times = [times.get(i, i * step) for i in range(count)]
+
+
+def detect_preview_shots(
+    video_path: str,
+    size: tuple[int, int],
+    *,
+    sample: str = "keyframes",
+    sample_fps: float = 2.0,
+    threshold: float = 0.35,
+) -> tuple[list[dict[str, Any]], list[float]]:
+    # Returns one entry per shot (first sample index, its frame, summed colour
+    # of its samples) and the sample times.
+    decoder = SampledDecoder(video_path, size, sample=sample, sample_fps=sample_fps)
+    shots: list[dict[str, Any]] = []
+    prev: np.ndarray | None = None
+    for i, frame in enumerate(cancellable(decoder)):
+        hist = color_histogram(frame)
+        bgr = frame.reshape(-1, 3).mean(axis=0)
+        if prev is None or histogram_distance(hist, prev) >= threshold:
+            shots.append({"sample": i, "image": frame, "bgrSum": bgr, "samples": 1})
+        else:
+            shots[-1]["bgrSum"] = shots[-1]["bgrSum"] + bgr
+            shots[-1]["samples"] += 1
+        prev = hist
+    return shots, decoder.times
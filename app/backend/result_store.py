@@ -0,0 +1,150 @@
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import uuid
+from typing import Any, Iterator
+
+import numpy as np
+
+# Columnar result store.
+#
+# Each table is a directory of one .npy file per column plus a small _meta.json:
+#
+#   img/<stem>/store/<table>/<column>.npy
+#
+# Columns are written in bulk (one np.save per column) and read back memory-mapped,
+# so per-frame arrays and thousands of shots cost nothing until touched. Strings
+# are stored as fixed-width unicode arrays (no pickles). CSV is an export format
+# produced on demand from the columns; 2D/3D columns are flattened to
+# <name>0, <name>1, ... like the legacy colors.csv. Small JSON documents
+# (img/<stem>/store/<name>.json) hold whole results written by the batch CLI.
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+IMG_ROOT = os.path.join(PROJECT_ROOT, "img")
+_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def _check_name(name: str) -> str:
+    if not _NAME.match(name):
+        raise ValueError(f"Invalid store name: {name!r}")
+    return name
+
+
+def _as_column(values: Any) -> np.ndarray:
+    arr = np.asarray(values)
+    if arr.dtype == object:
+        arr = np.asarray([str(v) for v in values])
+    return arr
+
+
+class ResultStore:
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    @classmethod
+    def for_stem(cls, stem: str) -> "ResultStore":
+        return cls(os.path.join(IMG_ROOT, _check_name(stem), "store"))
+
+    def _table_dir(self, name: str) -> str:
+        return os.path.join(self.root, _check_name(name))
+
+    def write_table(self, name: str, columns: dict[str, Any]) -> str:
+        arrays = {col: _as_column(values) for col, values in columns.items()}
+        lengths = {len(a) for a in arrays.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns of table {name!r} have different lengths: {sorted(lengths)}")
+
+        # Write into a scratch directory and swap it in, so readers never see a half table.
+        final = self._table_dir(name)
+        os.makedirs(self.root, exist_ok=True)
+        tmp = os.path.join(self.root, f".{name}.{uuid.uuid4().hex[:8]}")
+        os.makedirs(tmp)
+        for col, arr in arrays.items():
+            np.save(os.path.join(tmp, f"{col}.npy"), arr, allow_pickle=False)
+        meta = {
+            "columns": list(arrays),
+            "rows": lengths.pop() if lengths else 0,
+            "dtypes": {col: arr.dtype.str for col, arr in arrays.items()},
+            "shapes": {col: list(arr.shape[1:]) for col, arr in arrays.items()},
+        }
+        with open(os.path.join(tmp, "_meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        if os.path.isdir(final):
+            old = f"{tmp}.old"
+            os.replace(final, old)
+            os.replace(tmp, final)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.replace(tmp, final)
+        return final
+
+    def write_document(self, name: str, body: bytes) -> str:
+        # Whole JSON documents (the full analysis result, batch provenance) live next to the tables.
+        path = os.path.join(self.root, f"{_check_name(name)}.json")
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+        return path
+
+    def has_document(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.root, f"{_check_name(name)}.json"))
+
+    def read_document(self, name: str) -> Any:
+        with open(os.path.join(self.root, f"{_check_name(name)}.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def meta(self, name: str) -> dict[str, Any]:
+        with open(os.path.join(self._table_dir(name), "_meta.json"), encoding="utf-8") as f:
+            meta: dict[str, Any] = json.load(f)
+        return meta
+
+    def has_table(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self._table_dir(name), "_meta.json"))
+
+    def tables(self) -> list[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(n for n in os.listdir(self.root) if _NAME.match(n) and self.has_table(n))
+
+    def read_table(
+        self, name: str, columns: list[str] | None = None, mmap: bool = True
+    ) -> dict[str, np.ndarray]:
+        table_dir = self._table_dir(name)
+        wanted = columns or self.meta(name)["columns"]
+        return {
+            col: np.load(os.path.join(table_dir, f"{col}.npy"), mmap_mode="r" if mmap else None, allow_pickle=False)
+            for col in wanted
+        }
+
+    def iter_csv(self, name: str, columns: list[str] | None = None, chunk_rows: int = 4096) -> Iterator[str]:
+        data = self.read_table(name, columns)
+        header: list[str] = []
+        for col, arr in data.items():
+            width = int(np.prod(arr.shape[1:])) if arr.ndim > 1 else 0
+            header.extend([f"{col}{i}" for i in range(width)] if width else [col])
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(header)
+        rows = len(next(iter(data.values()))) if data else 0
+        for start in range(0, rows, chunk_rows):
+            parts = [
+                arr[start : start + chunk_rows].reshape(min(chunk_rows, rows - start), -1).tolist()
+                for arr in data.values()
+            ]
+            writer.writerows([v for part in row for v in part] for row in zip(*parts))
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+        if buf.tell():
+            yield buf.getvalue()
+
+    def export_csv(self, name: str, path: str, columns: list[str] | None = None) -> str:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            for chunk in self.iter_csv(name, columns):
+                f.write(chunk)
+        return path
@@ -0,0 +1,248 @@
+from typing import Any, Callable, Iterable, Sequence
+
+import numpy as np
+
+# Scene segmentation over a shot feature matrix.
+#
+#   segmenter = SceneSegmenter(sensitivity=6)
+#   scenes = segmenter.segment(shot_features(shots, blocks=segmenter.blocks), shots)
+#
+# shot_features turns the shot rows into named feature blocks (mean colour,
+# duration, palette colour histogram, shot-scale one-hot, motion, optional
+# embeddings), each an (n, d) float array. A cue compares, for every position
+# between two shots, the mean feature of the `window` shots before it with the
+# `window` shots after it, as whole-array NumPy operations over all positions at
+# once (no per-pair Python work). The weighted cues
+# give one score per position, boundary rules (RULES, pluggable) turn scores
+# into candidate positions, and one pass over the candidates applies the
+# minimum and maximum scene length. The defaults (colour drift + 7 x duration
+# change between adjacent shots, adaptive threshold, 2..8 shots per scene)
+# reproduce the previous _group_scenes.
+
+SCALES = ("Long", "Medium", "Close-Up", "Unknown")
+PALETTE_BINS = 4  # per channel, 64 bins in total
+
+# cue name -> (feature block, distance)
+CUES: dict[str, tuple[str, str]] = {
+    "rgb_drift": ("rgb", "euclidean"),
+    "rhythm": ("duration", "euclidean"),
+    "palette": ("palette", "l1"),
+    "scale": ("scale", "l1"),
+    "motion": ("motion", "euclidean"),
+    "texture": ("texture", "euclidean"),
+    "embedding": ("embedding", "cosine"),
+}
+DEFAULT_CUES = {"rgb_drift": 1.0, "rhythm": 7.0}
+
+
+def _palette_histograms(palettes: Sequence[tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+    # Share-weighted colour histogram of every shot's palette, one bincount for all shots.
+    counts = np.array([len(colors) for colors, _ in palettes], dtype=np.int64)
+    bins = PALETTE_BINS**3
+    if not counts.sum():
+        return np.zeros((len(palettes), bins))
+    colors = np.concatenate([np.asarray(c, dtype=np.int64).reshape(-1, 3) for c, _ in palettes])
+    shares = np.concatenate([np.asarray(w, dtype=np.float64).reshape(-1) for _, w in palettes])
+    q = np.clip(colors * PALETTE_BINS // 256, 0, PALETTE_BINS - 1)
+    idx = np.repeat(np.arange(len(palettes)), counts) * bins + (q[:, 0] * PALETTE_BINS + q[:, 1]) * PALETTE_BINS + q[:, 2]
+    hist = np.bincount(idx, weights=shares, minlength=len(palettes) * bins).reshape(len(palettes), bins)
+    totals = hist.sum(axis=1, keepdims=True)
+    return hist / np.where(totals > 0, totals, 1.0)
+
+
+def shot_features(
+    shots: Sequence[dict[str, Any]],
+    *,
+    blocks: Iterable[str] | None = None,
+    scales: Sequence[str] | None = None,
+    palettes: Sequence[tuple[np.ndarray, np.ndarray]] | None = None,
+    embeddings: np.ndarray | None = None,
+) -> dict[str, np.ndarray]:
+    # Builds only the requested blocks (all available ones by default); pulling
+    # values out of the shot dicts is most of the cost. scales/palettes default
+    # to what the shot rows carry (shotScale, palette).
+    n = len(shots)
+    wanted = set(blocks) if blocks is not None else {"rgb", "duration", "motion", "texture", "scale", "palette"}
+    wanted.add("rgb")
+    features: dict[str, np.ndarray] = {}
+    for key, field, width in (
+        ("rgb", "avgRgb", 3),
+        ("duration", "durationSec", 1),
+        ("motion", "motion", 1),
+        ("texture", "texture", 1),
+    ):
+        if key in wanted:
+            # Explicit widths keep the blocks (0, d) for a film without shots.
+            features[key] = np.array([s.get(field, 0.0) for s in shots], dtype=np.float64).reshape(n, width)
+    if "scale" in wanted:
+        labels = scales if scales is not None else [s.get("shotScale", "Unknown") for s in shots]
+        codes = np.array([SCALES.index(x) if x in SCALES else len(SCALES) - 1 for x in labels], dtype=np.int64)
+        features["scale"] = np.eye(len(SCALES))[codes].reshape(n, len(SCALES))
+    if "palette" in wanted:
+        if palettes is None and any("palette" in s for s in shots):
+            palettes = [
+                (
+                    np.asarray([p["rgb"] for p in s.get("palette", [])]),
+                    np.asarray([p["share"] for p in s.get("palette", [])]),
+                )
+                for s in shots
+            ]
+        if palettes is not None:
+            features["palette"] = _palette_histograms(palettes)
+    if embeddings is not None:
+        # float32 halves the memory traffic of the widest block.
+        emb = np.asarray(embeddings, dtype=np.float32)
+        emb = emb.reshape(n, -1) if emb.size else emb.reshape(n, 0)
+        norms = np.sqrt(np.einsum("ij,ij->i", emb, emb))[:, None]
+        features["embedding"] = emb / np.where(norms > 0, norms, 1.0)
+    return features
+
+
+def window_means(block: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray]:
+    # Means of the `window` rows before and after each position 1..n-1, built
+    # from 2 x window shifted slices: windows are small, and a cumulative sum
+    # down the rows of a wide block (512-d embeddings) is several times slower.
+    n = len(block)
+    dtype = np.result_type(block.dtype, np.float32)
+    before = block[: n - 1].astype(dtype, copy=True)
+    after = block[1:].astype(dtype, copy=True)
+    for k in range(2, window + 1):
+        if k >= n:
+            break
+        before[k - 1 :] += block[: n - k]
+        after[: n - k] += block[k:]
+    if window > 1:
+        pos = np.arange(1, n)
+        before /= np.minimum(pos, window)[:, None]
+        after /= np.minimum(n - pos, window)[:, None]
+    return before, after
+
+
+def _distance(before: np.ndarray, after: np.ndarray, metric: str) -> np.ndarray:
+    out: np.ndarray
+    if metric == "euclidean":
+        d = before - after
+        out = np.sqrt(np.einsum("ij,ij->i", d, d))
+    elif metric == "l1":
+        out = 0.5 * np.abs(before - after).sum(axis=1)
+    elif metric == "cosine":
+        norms = np.sqrt(np.einsum("ij,ij->i", before, before) * np.einsum("ij,ij->i", after, after))
+        sims = np.einsum("ij,ij->i", before, after) / np.where(norms > 0, norms, 1.0)
+        out = 1.0 - sims.astype(np.float64)
+    else:
+        raise ValueError(f"Unknown distance: {metric}")
+    return out
+
+
+def cue_scores(features: dict[str, np.ndarray], cues: dict[str, float], window: int = 1) -> np.ndarray:
+    # Weighted sum of the cues at each position between two shots (n - 1 values).
+    n = len(features["rgb"])
+    score = np.zeros(max(0, n - 1))
+    if n < 2:
+        return score
+    for name, weight in cues.items():
+        if name not in CUES:
+            raise ValueError(f"Unknown scene cue: {name}")
+        key, metric = CUES[name]
+        if key not in features:
+            raise ValueError(f"Scene cue {name} needs the {key} feature")
+        if weight:
+            before, after = window_means(features[key], max(1, int(window)))
+            score += weight * _distance(before, after, metric)
+    return score
+
+
+# A boundary rule gets the scores and the segmenter and returns a boolean mask
+# over the positions: True where a scene may start. All rules must agree.
+def adaptive_threshold(scores: np.ndarray, segmenter: "SceneSegmenter") -> np.ndarray:
+    base = scores.mean() + scores.std() * max(0.45, 1.35 - segmenter.sensitivity * 0.08)
+    mask: np.ndarray = scores >= base
+    return mask
+
+
+def local_peak(scores: np.ndarray, segmenter: "SceneSegmenter") -> np.ndarray:
+    # Highest score within +-window positions; keeps windowed cues from firing
+    # on every position of a gradual change.
+    w = max(1, segmenter.window)
+    padded = np.pad(scores, w, constant_values=-np.inf)
+    view = np.lib.stride_tricks.sliding_window_view(padded, 2 * w + 1)
+    mask: np.ndarray = scores >= view.max(axis=1)
+    return mask
+
+
+RULES: dict[str, Callable[[np.ndarray, "SceneSegmenter"], np.ndarray]] = {
+    "adaptive": adaptive_threshold,
+    "peak": local_peak,
+}
+
+
+class SceneSegmenter:
+    def __init__(
+        self,
+        sensitivity: int = 6,
+        cues: dict[str, float] | None = None,
+        window: int = 1,
+        rules: Sequence[str | Callable[[np.ndarray, "SceneSegmenter"], np.ndarray]] = ("adaptive",),
+        min_shots: int = 2,
+        max_shots: int = 8,
+    ) -> None:
+        self.sensitivity = max(1, min(10, int(sensitivity)))
+        self.cues = dict(DEFAULT_CUES if cues is None else cues)
+        unknown = sorted(set(self.cues) - set(CUES))
+        if unknown:
+            raise ValueError(f"Unknown scene cues: {unknown}")
+        self.window = max(1, int(window))
+        self.rules = [RULES[r] if isinstance(r, str) else r for r in rules]
+        self.min_shots = max(1, int(min_shots))
+        self.max_shots = max(self.min_shots, int(max_shots))
+
+    @property
+    def blocks(self) -> set[str]:
+        # Feature blocks the weighted cues read.
+        return {CUES[name][0] for name, weight in self.cues.items() if weight}
+
+    def boundaries(self, features: dict[str, np.ndarray]) -> list[int]:
+        # Indices of the first shot of every scene.
+        n = len(features["rgb"])
+        if n < 2:
+            return [0] if n else []
+        scores = cue_scores(features, self.cues, self.window)
+        mask = np.ones(len(scores), dtype=bool)
+        for rule in self.rules:
+            mask &= rule(scores, self)
+        # Candidates shorter than min_shots after the last boundary are dropped;
+        # scenes longer than max_shots are split every max_shots shots.
+        starts = [0]
+        last = 0
+        for pos in (np.flatnonzero(mask) + 1).tolist():
+            while pos - last > self.max_shots:
+                last += self.max_shots
+                starts.append(last)
+            if pos - last >= self.min_shots:
+                starts.append(pos)
+                last = pos
+        while n - last > self.max_shots:
+            last += self.max_shots
+            starts.append(last)
+        return starts
+
+    def segment(self, features: dict[str, np.ndarray], shots: Sequence[dict[str, Any]]) -> list[dict[str, Any]]:
+        starts = self.boundaries(features)
+        ends = starts[1:] + [len(shots)]
+        return [
+            {
+                "sceneId": i + 1,
+                "shotStartIndex": s,
+                "shotEndIndex": e - 1,
+                "startSec": float(shots[s]["startSec"]),
+                "endSec": float(shots[e - 1]["endSec"]),
+            }
+            for i, (s, e) in enumerate(zip(starts, ends))
+        ]
+
+
+def segment_scenes(shots: Sequence[dict[str, Any]], sensitivity: int = 6, **options: Any) -> list[dict[str, Any]]:
+    embeddings = options.pop("embeddings", None)
+    segmenter = SceneSegmenter(sensitivity, **options)
+    features = shot_features(shots, blocks=segmenter.blocks, embeddings=embeddings)
+    return segmenter.segment(features, shots)
@@ -0,0 +1,703 @@
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from functools import lru_cache
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+
+from app.backend.embedding_cache import EmbeddingCache
+from app.backend.instrumentation import span
+from app.backend.result_store import IMG_ROOT, ResultStore, _check_name
+from app.backend.scenes import shot_features
+
+# Similar-shot search across every analysed film.
+#
+#   img/_search/<space>/index.json                 films, their table stamps, sizes
+#   img/_search/<space>/vectors/{film,shotId,vector,code}.npy
+#   img/_search/<space>/ivf/{centroid,offset}.npy
+#   img/_search/<space>/pq/codebook.npy
+#   img/_search/<space>/keys/{key,row}.npy         sorted (film, shotId) -> row
+#
+# A space turns each shot into one L2-normalized float32 vector: "look" joins
+# the mean colour, the palette histogram and the shot scale read from the
+# film's result store; "embedding" is the cached VGG19 keyframe embedding
+# (object detection), randomly projected to EMBEDDING_DIM. Similarity is the
+# inner product (cosine).
+#
+# The index is a set of ResultStore tables, so every array is read back
+# memory-mapped. Rows are stored grouped by IVF list: k-means centroids split
+# the vectors into ~sqrt(n) lists and each list is one contiguous slice.
+#   exact  scores every row in chunks (brute force, the reference)
+#   ivf    scores only the rows of the nprobe lists closest to the query
+#   ivfpq  ranks those rows by product-quantization codes of their residual
+#          to the list centroid (one byte per subvector, looked up in a
+#          per-query table) and re-scores the best k x rerank candidates with
+#          the full vectors
+#
+# Queries never build: they use the index on disk while a background thread
+# (at most every REFRESH_SEC) or the batch CLI brings it up to date. Films whose
+# tables changed are dropped and new ones appended to the trained lists, i.e.
+# assigned to the existing centroids and encoded with the existing codebooks.
+# Centroids and codebooks are retrained only once the row count has moved by
+# RETRAIN_GROWTH x since they were trained.
+#
+#   python -m app.backend.search [--retrain]
+
+INDEX_ROOT = os.path.join(IMG_ROOT, "_search")
+SPACES: dict[str, dict[str, float]] = {
+    "look": {"rgb": 1.0, "palette": 1.0, "scale": 0.5},
+    "embedding": {"embedding": 1.0},
+}
+MODES = ("auto", "exact", "ivf", "ivfpq")
+EMBEDDING_DIM = 256
+AUTO_EXACT_ROWS = 50_000  # below this brute force is as fast as probing lists
+PQ_SUBDIM = 4
+REFRESH_SEC = 30.0
+RETRAIN_GROWTH = 2.0
+_CHUNK = 1 << 18
+_ASSIGN_CHUNK = 1 << 14
+
+
+class IndexNotReady(Exception):
+    pass
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.sqrt(np.einsum("ij,ij->i", x, x))[:, None]
+    return x / np.where(norms > 0, norms, 1.0)
+
+
+@lru_cache(maxsize=4)
+def _projection(d_in: int, d_out: int) -> np.ndarray:
+    # Fixed Gaussian random projection: inner products survive up to a small
+    # distortion, and every film is projected the same way.
+    rng = np.random.default_rng(0)
+    out: np.ndarray = (rng.standard_normal((d_in, d_out)) / np.sqrt(d_out)).astype(np.float32)
+    return out
+
+
+def _look_vectors(store: ResultStore, shots: dict[str, np.ndarray]) -> np.ndarray:
+    n = len(shots["shotId"])
+    rows = [{"avgRgb": rgb} for rgb in (shots["avgRgb"] / 255.0).tolist()]
+    palettes = None
+    if store.has_table("colors"):
+        # The table keeps the palette colours of each keyframe, not their shares.
+        colors = store.read_table("colors")
+        by_frame = {int(f or 0): c.reshape(-1, 3) for f, c in zip(colors["FrameId"].tolist(), colors["Color"])}
+        empty = np.zeros((0, 3), dtype=np.int64)
+        palettes = []
+        for frame_id in shots["frameId"].tolist():
+            c = by_frame.get(int(frame_id), empty)
+            palettes.append((c, np.full(len(c), 1.0 / max(1, len(c)))))
+    features = shot_features(
+        rows, blocks=SPACES["look"], scales=[str(s) for s in shots["shotScale"]], palettes=palettes
+    )
+    features.setdefault("palette", np.zeros((n, 64)))
+    blocks = []
+    for name, weight in SPACES["look"].items():
+        block = features[name]
+        if name == "rgb":
+            blocks.append(weight * block / np.sqrt(3.0))
+        else:
+            blocks.append(weight * _normalize(block))
+    return _normalize(np.hstack(blocks))
+
+
+def _embedding_vectors(
+    store: ResultStore, shots: dict[str, np.ndarray], cache: EmbeddingCache
+) -> np.ndarray | None:
+    if not store.has_table("frame_keys"):
+        return None
+    table = store.read_table("frame_keys")
+    by_shot = dict(zip(table["shotId"].tolist(), (str(k) for k in table["frameKey"])))
+    keys = [by_shot.get(s) for s in shots["shotId"].tolist()]
+    if not all(keys):
+        return None
+    emb = cache.embeddings([str(k) for k in keys])
+    if emb is None:
+        return None
+    if emb.shape[1] > EMBEDDING_DIM:
+        emb = emb @ _projection(emb.shape[1], EMBEDDING_DIM)
+    return _normalize(emb)
+
+
+def film_vectors(
+    stem: str, space: str, cache: EmbeddingCache | None = None
+) -> tuple[np.ndarray, np.ndarray] | None:
+    # (shotId, vectors) of one film, or None when the film lacks the space's features.
+    store = ResultStore.for_stem(stem)
+    if not store.has_table("shots"):
+        return None
+    shots = store.read_table("shots", ["shotId", "frameId", "avgRgb", "shotScale"], mmap=False)
+    if not len(shots["shotId"]):
+        return None
+    vectors: np.ndarray | None
+    if space == "look":
+        vectors = _look_vectors(store, shots)
+    elif space == "embedding":
+        vectors = _embedding_vectors(store, shots, cache or EmbeddingCache())
+    else:
+        raise ValueError(f"Unknown search space: {space}")
+    if vectors is None:
+        return None
+    return shots["shotId"].astype(np.int32), vectors
+
+
+def archive_films() -> list[str]:
+    if not os.path.isdir(IMG_ROOT):
+        return []
+    films = []
+    for name in sorted(os.listdir(IMG_ROOT)):
+        try:
+            if ResultStore.for_stem(name).has_table("shots"):
+                films.append(name)
+        except ValueError:
+            continue
+    return films
+
+
+def film_stamp(stem: str) -> str:
+    # Changes whenever the film's shots/colors/frame_keys tables are rewritten.
+    store = ResultStore.for_stem(stem)
+    stamps = []
+    for table in ("shots", "colors", "frame_keys"):
+        path = os.path.join(store.root, table, "_meta.json")
+        stamps.append(str(os.stat(path).st_mtime_ns if os.path.exists(path) else 0))
+    return ":".join(stamps)
+
+
+def assign(x: np.ndarray, centroids: np.ndarray, chunk: int = _ASSIGN_CHUNK) -> np.ndarray:
+    # Nearest centroid (squared L2) of every row, in chunks of rows.
+    sq = np.einsum("ij,ij->i", centroids, centroids)
+    out = np.empty(len(x), dtype=np.int32)
+    for start in range(0, len(x), chunk):
+        block = np.asarray(x[start : start + chunk], dtype=np.float32)
+        out[start : start + len(block)] = (2.0 * (block @ centroids.T) - sq).argmax(axis=1)
+    return out
+
+
+def kmeans(x: np.ndarray, k: int, iters: int = 10, sample: int = 65536, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    if len(x) > sample:
+        x = x[np.sort(rng.choice(len(x), sample, replace=False))]
+    x = np.asarray(x, dtype=np.float32)
+    k = max(1, min(k, len(x)))
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iters):
+        labels = assign(x, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=k)
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+        sums = np.add.reduceat(x[order], starts, axis=0)
+        # Empty clusters keep their previous centroid.
+        centroids[nonempty] = sums / counts[nonempty, None]
+    return centroids
+
+
+def _pq_split(x: np.ndarray, m: int) -> np.ndarray:
+    # (n, d) -> (n, m, ceil(d / m)), zero-padded so every subvector has the same width.
+    n, d = x.shape
+    sub = -(-d // m)
+    if sub * m != d:
+        x = np.hstack([x, np.zeros((n, sub * m - d), dtype=x.dtype)])
+    return x.reshape(n, m, sub)
+
+
+def train_pq(x: np.ndarray, m: int, iters: int = 10, sample: int = 65536, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    if len(x) > sample:
+        x = x[np.sort(rng.choice(len(x), sample, replace=False))]
+    parts = _pq_split(np.asarray(x, dtype=np.float32), m)
+    ksub = min(256, len(parts))
+    return np.stack([kmeans(parts[:, j], ksub, iters, sample, seed + j) for j in range(m)])
+
+
+def encode_pq(x: np.ndarray, codebooks: np.ndarray, chunk: int = _CHUNK) -> np.ndarray:
+    m = len(codebooks)
+    codes = np.empty((len(x), m), dtype=np.uint8)
+    for start in range(0, len(x), chunk):
+        parts = _pq_split(np.asarray(x[start : start + chunk], dtype=np.float32), m)
+        for j in range(m):
+            codes[start : start + len(parts), j] = assign(parts[:, j], codebooks[j])
+    return codes
+
+
+def _encode_residuals(
+    x: np.ndarray, labels: np.ndarray, centroids: np.ndarray, codebooks: np.ndarray
+) -> np.ndarray:
+    # PQ encodes the residual to the list centroid, which is much smaller than the vector.
+    if not len(x):
+        return np.zeros((0, len(codebooks)), dtype=np.uint8)
+    return np.concatenate(
+        [
+            encode_pq(x[start : start + _CHUNK] - centroids[labels[start : start + _CHUNK]], codebooks)
+            for start in range(0, len(x), _CHUNK)
+        ]
+    )
+
+
+def _gather(
+    films: Iterable[tuple[str, np.ndarray, np.ndarray]], first: int = 0
+) -> tuple[list[str], np.ndarray, np.ndarray, np.ndarray | None]:
+    # (stems, film index, shotId, vectors) of the films; film indices start at first.
+    stems: list[str] = []
+    film_idx, shot_ids, parts = [], [], []
+    for stem, ids, vectors in films:
+        film_idx.append(np.full(len(ids), first + len(stems), dtype=np.int32))
+        shot_ids.append(np.asarray(ids, dtype=np.int32))
+        parts.append(np.asarray(vectors, dtype=np.float32))
+        stems.append(stem)
+    if not parts:
+        return stems, np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), None
+    return stems, np.concatenate(film_idx), np.concatenate(shot_ids), np.concatenate(parts)
+
+
+def _row_keys(film: np.ndarray, shot_id: np.ndarray) -> np.ndarray:
+    return (np.asarray(film, dtype=np.int64) << 32) | (np.asarray(shot_id, dtype=np.int64) & 0xFFFFFFFF)
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    # Positions of the k highest scores, best first.
+    if len(scores) > k:
+        idx = np.argpartition(scores, -k)[-k:]
+    else:
+        idx = np.arange(len(scores))
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+class VectorIndex:
+    def __init__(self, root: str) -> None:
+        self.root = root
+        store = ResultStore(root)
+        self.info = store.read_document("index")
+        self.films: list[str] = self.info["films"]
+        self._film_idx = {stem: i for i, stem in enumerate(self.films)}
+        vectors = store.read_table("vectors")
+        self.film = vectors["film"]
+        self.shot_id = vectors["shotId"]
+        self.vectors = vectors["vector"]
+        self.codes = vectors["code"]
+        keys = store.read_table("keys")
+        self.keys = keys["key"]
+        self.key_rows = keys["row"]
+        ivf = store.read_table("ivf", mmap=False)
+        self.centroids = ivf["centroid"]
+        self.offsets = np.append(ivf["offset"], len(self.vectors))
+        self.codebooks = np.asarray(store.read_table("pq", mmap=False)["codebook"])
+
+    @property
+    def rows(self) -> int:
+        return len(self.vectors)
+
+    def resolve_mode(self, mode: str) -> str:
+        if mode not in MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        if mode == "auto":
+            return "exact" if self.rows < AUTO_EXACT_ROWS else "ivfpq"
+        return mode
+
+    @classmethod
+    def build(
+        cls,
+        root: str,
+        films: Iterable[tuple[str, np.ndarray, np.ndarray]],
+        *,
+        nlist: int | None = None,
+        pq_m: int | None = None,
+        iters: int = 10,
+        seed: int = 0,
+        extra: dict[str, Any] | None = None,
+    ) -> "VectorIndex":
+        stems, film, shot_id, x = _gather(films)
+        if x is None:
+            raise ValueError("No shot vectors to index")
+        return cls._train(root, stems, film, shot_id, x, nlist=nlist, pq_m=pq_m, iters=iters, seed=seed, info=extra)
+
+    @classmethod
+    def _train(
+        cls,
+        root: str,
+        stems: list[str],
+        film: np.ndarray,
+        shot_id: np.ndarray,
+        x: np.ndarray,
+        *,
+        nlist: int | None = None,
+        pq_m: int | None = None,
+        iters: int = 10,
+        seed: int = 0,
+        info: dict[str, Any] | None = None,
+    ) -> "VectorIndex":
+        n, d = x.shape
+        nlist = max(1, min(n, int(nlist or min(4096, round(np.sqrt(n))))))
+        pq_m = max(1, int(pq_m or -(-d // PQ_SUBDIM)))
+        started = time.perf_counter()
+        centroids = kmeans(x, nlist, iters, seed=seed)
+        labels = assign(x, centroids)
+        sample = np.sort(np.random.default_rng(seed).choice(n, min(n, 65536), replace=False))
+        codebooks = train_pq(x[sample] - centroids[labels[sample]], pq_m, iters, seed=seed)
+        codes = _encode_residuals(x, labels, centroids, codebooks)
+        info = {
+            **(info or {}),
+            "trainedRows": n,
+            "trainedAt": time.time(),
+            "trainSec": round(time.perf_counter() - started, 3),
+        }
+        return cls._write(root, stems, film, shot_id, x, labels, codes, centroids, codebooks, info)
+
+    @classmethod
+    def _write(
+        cls,
+        root: str,
+        stems: list[str],
+        film: np.ndarray,
+        shot_id: np.ndarray,
+        x: np.ndarray,
+        labels: np.ndarray,
+        codes: np.ndarray,
+        centroids: np.ndarray,
+        codebooks: np.ndarray,
+        info: dict[str, Any],
+    ) -> "VectorIndex":
+        # Rows are grouped by list; built next to the live index and swapped in,
+        # so open memmaps of the old one stay valid.
+        order = np.argsort(labels, kind="stable")
+        film, shot_id = film[order], shot_id[order]
+        counts = np.bincount(labels, minlength=len(centroids))
+        keys = _row_keys(film, shot_id)
+        by_key = np.argsort(keys, kind="stable")
+
+        os.makedirs(os.path.dirname(root) or ".", exist_ok=True)
+        tmp = f"{root}.{uuid.uuid4().hex[:8]}"
+        store = ResultStore(tmp)
+        store.write_table("vectors", {"film": film, "shotId": shot_id, "vector": x[order], "code": codes[order]})
+        store.write_table("keys", {"key": keys[by_key], "row": by_key.astype(np.int64)})
+        store.write_table(
+            "ivf",
+            {"centroid": centroids, "offset": np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)},
+        )
+        store.write_table("pq", {"codebook": codebooks})
+        info = {
+            **info,
+            "films": stems,
+            "rows": len(film),
+            "dim": x.shape[1],
+            "nlist": len(centroids),
+            "pqM": len(codebooks),
+            "builtAt": time.time(),
+        }
+        store.write_document("index", json.dumps(info).encode("utf-8"))
+        if os.path.isdir(root):
+            old = f"{tmp}.old"
+            os.replace(root, old)
+            os.replace(tmp, root)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.replace(tmp, root)
+        return cls(root)
+
+    def extend(
+        self,
+        films: Iterable[tuple[str, np.ndarray, np.ndarray]],
+        *,
+        drop: Iterable[str] = (),
+        extra: dict[str, Any] | None = None,
+    ) -> "VectorIndex":
+        # Drops the films in drop, then appends films to the trained lists
+        # without retraining centroids or codebooks.
+        dropped = sorted({self._film_idx[stem] for stem in drop if stem in self._film_idx})
+        kept = [i for i in range(len(self.films)) if i not in set(dropped)]
+        remap = np.full(len(self.films), -1, dtype=np.int32)
+        remap[kept] = np.arange(len(kept), dtype=np.int32)
+        keep = ~np.isin(self.film, dropped) if dropped else np.ones(self.rows, dtype=bool)
+        labels = np.repeat(np.arange(len(self.centroids), dtype=np.int32), np.diff(self.offsets))[keep]
+
+        stems = [self.films[i] for i in kept]
+        new_stems, new_film, new_ids, new_x = _gather(films, first=len(stems))
+        if new_x is None:
+            new_x = np.zeros((0, self.vectors.shape[1]), dtype=np.float32)
+        elif new_x.shape[1] != self.vectors.shape[1]:
+            raise ValueError(f"Vectors have {new_x.shape[1]} dimensions, the index {self.vectors.shape[1]}")
+        new_labels = assign(new_x, self.centroids)
+        film = np.concatenate([remap[np.asarray(self.film)[keep]], new_film])
+        if not len(film):
+            raise ValueError("No shot vectors to index")
+        return self._write(
+            self.root,
+            stems + new_stems,
+            film,
+            np.concatenate([np.asarray(self.shot_id)[keep], new_ids]),
+            np.concatenate([np.asarray(self.vectors)[keep], new_x]),
+            np.concatenate([labels, new_labels]),
+            np.concatenate(
+                [np.asarray(self.codes)[keep], _encode_residuals(new_x, new_labels, self.centroids, self.codebooks)]
+            ),
+            self.centroids,
+            self.codebooks,
+            {**self.info, **(extra or {})},
+        )
+
+    def retrain(self, **options: Any) -> "VectorIndex":
+        return self._train(
+            self.root,
+            self.films,
+            np.asarray(self.film),
+            np.asarray(self.shot_id),
+            np.asarray(self.vectors),
+            info=self.info,
+            **options,
+        )
+
+    def needs_retraining(self) -> bool:
+        trained = self.info.get("trainedRows", self.rows)
+        return not trained / RETRAIN_GROWTH < self.rows < trained * RETRAIN_GROWTH
+
+    def row(self, stem: str, shot_id: int) -> int:
+        if stem not in self._film_idx:
+            raise KeyError(stem)
+        key = _row_keys(np.array([self._film_idx[stem]]), np.array([shot_id]))[0]
+        i = int(np.searchsorted(self.keys, key))
+        if i == len(self.keys) or self.keys[i] != key:
+            raise KeyError((stem, shot_id))
+        return int(self.key_rows[i])
+
+    def _slices(self, query: np.ndarray, mode: str, nprobe: int) -> Iterator[tuple[float, int, int]]:
+        # (query . list centroid, start, end) of the row slices to score.
+        if mode == "exact":
+            for start in range(0, self.rows, _CHUNK):
+                yield 0.0, start, min(self.rows, start + _CHUNK)
+            return
+        sims = self.centroids @ query
+        for c in _top(sims, max(1, nprobe)).tolist():
+            if self.offsets[c + 1] > self.offsets[c]:
+                yield float(sims[c]), int(self.offsets[c]), int(self.offsets[c + 1])
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 10,
+        mode: str = "auto",
+        nprobe: int = 8,
+        rerank: int = 16,
+        exclude_rows: Iterable[int] = (),
+        exclude_film: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # Returns (rows, scores), best first.
+        mode = self.resolve_mode(mode)
+        q = _normalize(np.asarray(query).reshape(1, -1))[0]
+        excluded = np.fromiter(exclude_rows, dtype=np.int64)
+        keep = k * max(1, rerank) if mode == "ivfpq" else k
+        if mode == "ivfpq":
+            table = np.einsum("md,mkd->mk", _pq_split(q[None], len(self.codebooks))[0], self.codebooks)
+            flat = table.ravel()
+            shift = (np.arange(len(self.codebooks)) * table.shape[1]).astype(np.intp)
+        rows_out, scores_out = [], []
+        for base, start, end in self._slices(q, mode, nprobe):
+            if mode == "ivfpq":
+                scores = base + flat[self.codes[start:end] + shift].sum(axis=1)
+            else:
+                scores = np.asarray(self.vectors[start:end]) @ q
+            if exclude_film is not None:
+                scores[np.asarray(self.film[start:end]) == exclude_film] = -np.inf
+            inside = excluded[(excluded >= start) & (excluded < end)]
+            scores[inside - start] = -np.inf
+            best = _top(scores, keep)
+            rows_out.append(best + start)
+            scores_out.append(scores[best])
+        if not rows_out:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        rows = np.concatenate(rows_out)
+        scores = np.concatenate(scores_out)
+        best = _top(scores, keep)
+        rows, scores = rows[best], scores[best]
+        rows, scores = rows[np.isfinite(scores)], scores[np.isfinite(scores)]
+        if mode == "ivfpq" and len(rows):
+            rows = np.sort(rows)
+            scores = np.asarray(self.vectors[rows]) @ q
+        best = _top(scores, k)
+        return rows[best], scores[best]
+
+
+def _open(path: str) -> VectorIndex | None:
+    # None when there is no index yet, or only one written before the row keys were stored.
+    store = ResultStore(path)
+    if not store.has_document("index") or not store.has_table("keys"):
+        return None
+    return VectorIndex(path)
+
+
+def update_index(space: str, root: str = INDEX_ROOT, *, retrain: bool = False) -> VectorIndex:
+    # Brings the index of a space up to date with the archive: changed films are
+    # re-read and re-appended, unchanged ones keep their rows.
+    if space not in SPACES:
+        raise ValueError(f"Unknown search space: {space}")
+    path = os.path.join(root, _check_name(space))
+    index = _open(path)
+    films = archive_films()
+    stamps = {stem: film_stamp(stem) for stem in films}
+    old = index.info.get("stamps", {}) if index is not None else {}
+    if index is not None and old == stamps and not retrain:
+        return index
+    cache = EmbeddingCache()
+
+    def vectors(stems: list[str]) -> Iterator[tuple[str, np.ndarray, np.ndarray]]:
+        for stem in stems:
+            found = film_vectors(stem, space, cache)
+            if found is not None:
+                yield (stem, *found)
+
+    with span("search_index_build") as sp:
+        if index is None:
+            index = VectorIndex.build(path, vectors(films), extra={"space": space, "stamps": stamps})
+        else:
+            if old != stamps:
+                changed = [stem for stem in films if old.get(stem) != stamps[stem]]
+                drop = [stem for stem in index.films if old.get(stem) != stamps.get(stem)]
+                index = index.extend(vectors(changed), drop=drop, extra={"stamps": stamps})
+            if retrain or index.needs_retraining():
+                index = index.retrain()
+        sp.items = index.rows
+    return index
+
+
+_indexes: dict[str, VectorIndex] = {}
+_checked: dict[str, float] = {}
+_building: set[str] = set()
+_errors: dict[str, str] = {}
+_lock = threading.Lock()
+
+
+def _refresh(space: str, root: str, path: str) -> None:
+    try:
+        index = update_index(space, root)
+        with _lock:
+            _indexes[path] = index
+            _errors.pop(path, None)
+    except Exception as exc:  # e.g. no film has vectors in this space (any more)
+        with _lock:
+            # The old index may point at removed films; stop serving it.
+            _indexes.pop(path, None)
+            _errors[path] = str(exc) if isinstance(exc, ValueError) else f"{type(exc).__name__}: {exc}"
+    finally:
+        with _lock:
+            _building.discard(path)
+
+
+def archive_index(space: str, root: str = INDEX_ROOT) -> VectorIndex:
+    # The current index of every analysed film. At most every REFRESH_SEC a
+    # background thread updates it; queries keep the one they have meanwhile.
+    if space not in SPACES:
+        raise ValueError(f"Unknown search space: {space}")
+    path = os.path.join(root, _check_name(space))
+    with _lock:
+        index = _indexes.get(path)
+        if index is None and path not in _errors:
+            index = _open(path)
+            if index is not None:
+                _indexes[path] = index
+        now = time.monotonic()
+        if path not in _building and (path not in _checked or now - _checked[path] >= REFRESH_SEC):
+            _checked[path] = now
+            _building.add(path)
+            threading.Thread(
+                target=_refresh, args=(space, root, path), name=f"search-index-{space}", daemon=True
+            ).start()
+        error = _errors.get(path)
+    if index is not None:
+        return index
+    if error is not None:
+        raise ValueError(error)
+    raise IndexNotReady(f"The {space} index is being built")
+
+
+def similar_shots(
+    stem: str,
+    shot_id: int,
+    *,
+    k: int = 10,
+    space: str = "look",
+    mode: str = "auto",
+    nprobe: int = 8,
+    exclude_same_film: bool = False,
+) -> dict[str, Any]:
+    if mode not in MODES:
+        raise ValueError(f"Unknown search mode: {mode}")
+    index = archive_index(space)
+    mode = index.resolve_mode(mode)
+    started = time.perf_counter()
+    row = index.row(stem, shot_id)
+    with span("similarity_search") as sp:
+        rows, scores = index.search(
+            index.vectors[row],
+            k,
+            mode,
+            nprobe,
+            exclude_rows=[row],
+            exclude_film=int(index.film[row]) if exclude_same_film else None,
+        )
+        sp.items = index.rows
+    latency = time.perf_counter() - started
+
+    results = []
+    tables: dict[str, dict[str, np.ndarray] | None] = {}
+    for r, score in zip(rows.tolist(), scores.tolist()):
+        film = index.films[int(index.film[r])]
+        if film not in tables:
+            try:
+                tables[film] = ResultStore.for_stem(film).read_table(
+                    "shots", ["shotId", "startSec", "endSec", "frameId"]
+                )
+            except OSError:  # removed since the index was built
+                tables[film] = None
+        shots = tables[film]
+        if shots is None:
+            continue
+        sid = int(index.shot_id[r])
+        hit = np.flatnonzero(shots["shotId"] == sid)
+        entry: dict[str, Any] = {"stem": film, "shotId": sid, "score": round(float(score), 6)}
+        if len(hit):
+            i = int(hit[0])
+            entry.update(
+                startSec=float(shots["startSec"][i]),
+                endSec=float(shots["endSec"][i]),
+                frameId=int(shots["frameId"][i]),
+            )
+        results.append(entry)
+    return {
+        "query": {"stem": stem, "shotId": shot_id},
+        "space": space,
+        "mode": mode,
+        "results": results,
+        "index": {key: index.info[key] for key in ("rows", "dim", "nlist", "pqM", "builtAt")}
+        | {"films": len(index.films)},
+        "latencyMs": round(latency * 1000, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or update the similar-shot search indexes.")
+    parser.add_argument("--space", nargs="+", default=list(SPACES), choices=list(SPACES))
+    parser.add_argument("--retrain", action="store_true", help="retrain centroids and codebooks")
+    args = parser.parse_args()
+    report: dict[str, Any] = {}
+    for space in args.space:
+        try:
+            index = update_index(space, retrain=args.retrain)
+        except ValueError as exc:
+            report[space] = {"error": str(exc)}
+            continue
+        report[space] = {key: index.info[key] for key in ("rows", "nlist", "trainedRows", "builtAt")} | {
+            "films": len(index.films)
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
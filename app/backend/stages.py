@@ -0,0 +1,231 @@
+import contextvars
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable
+
+from app.backend.cancellation import Cancelled
+from app.backend.checkpoints import Checkpoints
+
+# Stage graph executor for the analysis pipeline.
+#
+# A stage declares the context keys it reads (inputs) and the keys it produces
+# (outputs). A stage becomes ready once all of its inputs exist, and ready
+# stages start as soon as a slot of their resource class is free: "cpu" for
+# model inference and pixel work, "io" for decoding/reading files. Stages run on
+# threads; the heavy parts (TF, torch, OpenCV, numpy) release the GIL. Every run
+# records a timeline of when each stage started and finished.
+#
+# With a Checkpoints store, finished stages are saved and a re-run restores them
+# instead of running them again (see checkpoints.py); invalidated stages and
+# everything downstream of a stage that actually ran are recomputed. A stage's
+# fingerprint includes the digests of its upstream outputs, so a checkpoint left
+# over from a run on different upstream results is never restored.
+
+
+class NoCheckpoint(dict):
+    # Returned by a stage whose outputs are a fallback (e.g. the model failed to
+    # load): used for this run, but not checkpointed, so a re-run tries again.
+    pass
+
+
+def default_slots() -> dict[str, int]:
+    cpus = os.cpu_count() or 1
+    return {"cpu": 2 if cpus >= 4 else 1, "io": 4}
+
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[..., dict[str, Any]],
+        inputs: tuple[str, ...] = (),
+        outputs: tuple[str, ...] = (),
+        resource: str = "cpu",
+        params: dict[str, Any] | None = None,
+        verify: Callable[[dict[str, Any]], bool] | None = None,
+    ) -> None:
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.resource = resource
+        # params: settings that change the stage's output (part of the checkpoint fingerprint).
+        # verify: checks a restored checkpoint still matches the workspace (e.g. files exist).
+        self.params = dict(params or {})
+        self.verify = verify
+
+
+class StageGraph:
+    def __init__(self, slots: dict[str, int] | None = None, checkpoints: Checkpoints | None = None) -> None:
+        self.slots = dict(slots or default_slots())
+        self.checkpoints = checkpoints
+        self.stages: dict[str, Stage] = {}
+        self.timeline: list[dict[str, Any]] = []
+
+    def add(
+        self,
+        name: str,
+        fn: Callable[..., dict[str, Any]],
+        *,
+        inputs: tuple[str, ...] = (),
+        outputs: tuple[str, ...] = (),
+        resource: str = "cpu",
+        params: dict[str, Any] | None = None,
+        verify: Callable[[dict[str, Any]], bool] | None = None,
+    ) -> Stage:
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        if resource not in self.slots:
+            raise ValueError(f"Stage {name} uses unknown resource {resource!r}")
+        stage = Stage(name, fn, inputs, outputs, resource, params, verify)
+        self.stages[name] = stage
+        return stage
+
+    def _validate(self, available: set[str]) -> None:
+        produced = set(available)
+        for stage in self.stages.values():
+            for key in stage.outputs:
+                if key in produced:
+                    raise ValueError(f"Context key {key!r} is produced twice (stage {stage.name})")
+                produced.add(key)
+        for stage in self.stages.values():
+            missing = [k for k in stage.inputs if k not in produced]
+            if missing:
+                raise ValueError(f"Stage {stage.name} needs {missing}, which no stage produces")
+
+    def _restore(self, stage: Stage, fingerprint: str, t0: float) -> tuple[dict[str, Any], str] | None:
+        start = time.perf_counter()
+        loaded = self.checkpoints.load(stage.name, fingerprint) if self.checkpoints else None
+        if loaded is None:
+            return None
+        out, digest = loaded
+        if any(k not in out for k in stage.outputs):
+            return None
+        out = {k: out[k] for k in stage.outputs}
+        if stage.verify is not None and not stage.verify(out):
+            return None
+        end = time.perf_counter()
+        self.timeline.append(
+            {
+                "stage": stage.name,
+                "resource": stage.resource,
+                "thread": threading.current_thread().name,
+                "startSec": round(start - t0, 4),
+                "endSec": round(end - t0, 4),
+                "durationSec": round(end - start, 4),
+                "status": "restored",
+            }
+        )
+        return out, digest
+
+    def _call(
+        self, stage: Stage, kwargs: dict[str, Any], t0: float, fingerprint: str | None = None
+    ) -> tuple[dict[str, Any], str]:
+        # Returns the outputs and their digest (a unique token when they were not saved).
+        start = time.perf_counter()
+        entry: dict[str, Any] = {
+            "stage": stage.name,
+            "resource": stage.resource,
+            "thread": threading.current_thread().name,
+            "startSec": round(start - t0, 4),
+        }
+        duration = 0.0
+        try:
+            out = stage.fn(**kwargs) or {}
+            entry["status"] = "done"
+        except Cancelled:
+            entry["status"] = "cancelled"
+            raise
+        except BaseException:
+            entry["status"] = "failed"
+            raise
+        finally:
+            end = time.perf_counter()
+            duration = round(end - start, 4)
+            entry["endSec"] = round(end - t0, 4)
+            entry["durationSec"] = duration
+            self.timeline.append(entry)
+        missing = [k for k in stage.outputs if k not in out]
+        if missing:
+            raise RuntimeError(f"Stage {stage.name} did not produce {missing}")
+        degraded = isinstance(out, NoCheckpoint)
+        out = {k: out[k] for k in stage.outputs}
+        digest = uuid.uuid4().hex
+        if self.checkpoints is not None and fingerprint is not None and not degraded:
+            try:
+                digest = self.checkpoints.save(stage.name, fingerprint, out, duration)
+            except (OSError, TypeError, ValueError):
+                pass  # a checkpoint is an optimization; the analysis result does not depend on it
+        return out, digest
+
+    def run(self, initial: dict[str, Any] | None = None, invalidate: tuple[str, ...] = ()) -> dict[str, Any]:
+        unknown = sorted(set(invalidate) - set(self.stages))
+        if unknown:
+            raise ValueError(f"Unknown stages to invalidate: {unknown}")
+        ctx: dict[str, Any] = dict(initial or {})
+        self._validate(set(ctx))
+        self.timeline = []
+        pending = dict(self.stages)
+        running: dict[Future, Stage] = {}
+        busy = {resource: 0 for resource in self.slots}
+        producer = {key: stage.name for stage in self.stages.values() for key in stage.outputs}
+        executed: set[str] = set()
+        digests: dict[str, str] = {}
+        t0 = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=sum(self.slots.values()), thread_name_prefix="stage") as pool:
+            while pending or running:
+                # Start ready stages in declaration order while their resource has a free slot.
+                # Restoring a checkpoint takes no slot and can make further stages ready.
+                progressed = True
+                while progressed:
+                    progressed = False
+                    for name, stage in list(pending.items()):
+                        if not all(k in ctx for k in stage.inputs):
+                            continue
+                        fingerprint = None
+                        if self.checkpoints is not None:
+                            upstream = sorted({producer[k] for k in stage.inputs if k in producer})
+                            fingerprint = self.checkpoints.fingerprint(
+                                name, stage.params, tuple(digests[u] for u in upstream)
+                            )
+                            if name not in invalidate and not set(upstream) & executed:
+                                restored = self._restore(stage, fingerprint, t0)
+                                if restored is not None:
+                                    del pending[name]
+                                    ctx.update(restored[0])
+                                    digests[name] = restored[1]
+                                    progressed = True
+                                    continue
+                        if busy[stage.resource] >= self.slots[stage.resource]:
+                            continue
+                        del pending[name]
+                        executed.add(name)
+                        if self.checkpoints is not None:
+                            self.checkpoints.discard(name)
+                        busy[stage.resource] += 1
+                        kwargs = {k: ctx[k] for k in stage.inputs}
+                        # Copy the context so stage code sees the caller's context variables.
+                        ctx_copy = contextvars.copy_context()
+                        running[pool.submit(ctx_copy.run, self._call, stage, kwargs, t0, fingerprint)] = stage
+                if not running:
+                    if pending:
+                        raise RuntimeError(f"Stages can never run: {sorted(pending)}")
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    stage = running.pop(fut)
+                    busy[stage.resource] -= 1
+                    exc = fut.exception()
+                    if exc is not None:
+                        for other in running:
+                            other.cancel()
+                        raise exc
+                    out, digests[stage.name] = fut.result()
+                    ctx.update(out)
+        self.timeline.sort(key=lambda e: e["startSec"])
+        return ctx
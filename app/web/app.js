@@ -183,8 +183,12 @@ async function analyzeViaBackend(url, file, sceneSensitivity) {
   form.append("include_object_detection", "true");
   form.append("include_shot_scale", "true");
 
+  // Scenes reference shots by index; normalizeApiResult resolves them.
+  const target = new URL(url, window.location.href);
+  target.searchParams.set("shot_refs", "true");
+
   setProgress(12);
-  const res = await fetch(url, { method: "POST", body: form });
+  const res = await fetch(target, { method: "POST", body: form });
   setProgress(78);
   if (!res.ok) {
     let detail = `HTTP ${res.status}`;
@@ -205,11 +209,17 @@ function normalizeApiResult(data, interval, sensitivity) {
   if (!data || !data.meta || !data.global || !Array.isArray(data.scenes)) {
     throw new Error("Invalid backend response shape.");
   }
+  const shots = Array.isArray(data.shots) ? data.shots : [];
+  const scenes = data.scenes.map((scene) =>
+    Array.isArray(scene.shots)
+      ? scene
+      : { ...scene, shots: shots.slice(scene.shotStartIndex ?? 0, (scene.shotEndIndex ?? -1) + 1) },
+  );
   return {
     meta: data.meta,
     global: data.global,
-    scenes: data.scenes,
-    shots: Array.isArray(data.shots) ? data.shots : [],
+    scenes,
+    shots,
     outputs: data.outputs || {},
     config: { interval, sensitivity, source: "backend" },
   };
@@ -0,0 +1,145 @@
+import argparse
+import gzip
+import json
+import random
+import time
+from typing import Any
+
+from app.backend.payload import encode, shape_result
+
+# Response payload size and serialize time for a synthetic analysis result:
+#
+#   python -m benchmarks.payload --shots 2000
+#
+# "legacy" is what FastAPI did before: jsonable_encoder over the whole result,
+# then JSONResponse rendering, with every shot embedded twice.
+
+_SCALES = ["Long", "Medium", "Close-Up", "Unknown"]
+
+
+def synthetic_result(n_shots: int, shots_per_scene: int = 8, seed: int = 0) -> dict[str, Any]:
+    rng = random.Random(seed)
+    fps = 24.0
+    shots: list[dict[str, Any]] = []
+    frame = 0
+    for i in range(n_shots):
+        length = rng.randint(12, 240)
+        rgb = [rng.uniform(0, 255) for _ in range(3)]
+        shots.append(
+            {
+                "shotId": i + 1,
+                "startFrame": frame,
+                "endFrame": frame + length,
+                "lengthFrames": length,
+                "startSec": frame / fps,
+                "endSec": (frame + length) / fps,
+                "durationSec": length / fps,
+                "frameFile": f"frame{frame:06d}.jpg",
+                "frameId": frame,
+                "avgRgb": rgb,
+                "shotScale": rng.choice(_SCALES),
+                "shotScaleRaw": rng.choice(_SCALES),
+                "focus": rng.random(),
+                "texture": rng.random(),
+                "frameUrl": f"/api/artifacts/film/frame/frame{frame:06d}.jpg",
+                "thumbUrl": f"/api/artifacts/film/frame_thumb/frame{frame:06d}.jpg",
+            }
+        )
+        frame += length
+    scenes = []
+    for j, s in enumerate(range(0, n_shots, shots_per_scene)):
+        members = shots[s : s + shots_per_scene]
+        scenes.append(
+            {
+                "sceneId": j + 1,
+                "startSec": members[0]["startSec"],
+                "endSec": members[-1]["endSec"],
+                "durationSec": members[-1]["endSec"] - members[0]["startSec"],
+                "shotCount": len(members),
+                "averageShotLengthSec": sum(m["durationSec"] for m in members) / len(members),
+                "shotScaleComposition": {"longPct": 40, "mediumPct": 35, "closePct": 25},
+                "dominantRgb": [rng.uniform(0, 255) for _ in range(3)],
+                "dominantHue": rng.uniform(0, 360),
+                "props": [{"label": "set decoration", "score": 0.55, "count": 1}],
+                "shots": members,
+                "motionProxy": 0.0,
+            }
+        )
+    return {
+        "meta": {"id": "film", "filename": "film.mp4", "durationSec": frame / fps, "fpsEstimated": fps},
+        "global": {"shotCount": n_shots, "sceneCount": len(scenes)},
+        "shots": shots,
+        "scenes": scenes,
+        "outputs": {"imageBase": "/img/film"},
+    }
+
+
+def _legacy(result: dict[str, Any]) -> bytes:
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    return bytes(JSONResponse(jsonable_encoder(result)).body)
+
+
+def _measure(fn, repeat: int) -> tuple[bytes, float]:
+    best = float("inf")
+    body = b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn()
+        best = min(best, time.perf_counter() - start)
+    return body, best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark analysis response payloads.")
+    parser.add_argument("--shots", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    result = synthetic_result(args.shots)
+    variants = {
+        "legacy": lambda: _legacy(result),
+        "json": lambda: encode(shape_result(result))[0],
+        "json_refs": lambda: encode(shape_result(result, shot_refs=True))[0],
+        "json_refs_p3": lambda: encode(shape_result(result, shot_refs=True, precision=3))[0],
+        "json_fields": lambda: encode(
+            shape_result(result, shot_refs=True, fields="meta,global,scenes,shots.shotId,shots.startSec,shots.durationSec")
+        )[0],
+        "json_page100": lambda: encode(shape_result(result, shot_refs=True, shot_limit=100))[0],
+    }
+    try:
+        import msgpack  # noqa: F401
+
+        variants["msgpack_refs_p3"] = lambda: encode(
+            shape_result(result, shot_refs=True, precision=3), "application/msgpack"
+        )[0]
+    except ImportError:
+        pass
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    report: dict[str, Any] = {"shots": args.shots, "variants": {}}
+    for name, fn in variants.items():
+        body, sec = _measure(fn, args.repeat)
+        start = time.perf_counter()
+        gz = gzip.compress(body, compresslevel=6)
+        gzip_sec = time.perf_counter() - start
+        row = {
+            "bytes": len(body),
+            "serializeMs": round(sec * 1000, 2),
+            "gzipBytes": len(gz),
+            "gzipMs": round(gzip_sec * 1000, 2),
+        }
+        if brotli is not None:
+            start = time.perf_counter()
+            row["brBytes"] = len(brotli.compress(body, quality=5))
+            row["brMs"] = round((time.perf_counter() - start) * 1000, 2)
+        report["variants"][name] = row
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import json
+import random
+import time
+from typing import Any, Callable
+
+import numpy as np
+
+from app.backend.scenes import SceneSegmenter, segment_scenes, shot_features
+from benchmarks.payload import synthetic_result
+
+# Scene segmentation on synthetic shot lists:
+#
+#   python -m benchmarks.scenes --shots 1000 10000
+#
+# "legacy" is the per-pair Python loop scene grouping used before
+# app/backend/scenes.py (kept here as the reference); "default" is the
+# segmenter with the same cues and rules, and must produce the same scenes.
+# The other configurations add windowed and multi-feature cues.
+
+_CONFIGS: dict[str, dict[str, Any]] = {
+    "default": {},
+    "window4_peak": {"window": 4, "rules": ("adaptive", "peak")},
+    "multi_feature": {
+        "cues": {"rgb_drift": 1.0, "rhythm": 7.0, "palette": 60.0, "scale": 40.0, "motion": 1.0},
+        "window": 3,
+        "rules": ("adaptive", "peak"),
+    },
+    "embedding": {"cues": {"rgb_drift": 1.0, "embedding": 200.0}, "window": 2},
+}
+
+
+def _legacy_group_scenes(shots: list[dict[str, Any]], sensitivity: int) -> list[dict[str, Any]]:
+    def distance(a: list[float], b: list[float]) -> float:
+        da = np.array(a, dtype=float) - np.array(b, dtype=float)
+        return float(np.sqrt(np.dot(da, da)))
+
+    def avg(values: list[float]) -> float:
+        return float(sum(values) / len(values)) if values else 0.0
+
+    def std(values: list[float]) -> float:
+        if len(values) < 2:
+            return 0.0
+        m = avg(values)
+        return float((sum((v - m) ** 2 for v in values) / len(values)) ** 0.5)
+
+    if not shots:
+        return []
+    cue_scores = []
+    for i in range(1, len(shots)):
+        prev, cur = shots[i - 1], shots[i]
+        cue_scores.append(distance(prev["avgRgb"], cur["avgRgb"]) + abs(prev["durationSec"] - cur["durationSec"]) * 7.0)
+    base = avg(cue_scores) + std(cue_scores) * max(0.45, 1.35 - sensitivity * 0.08)
+    boundaries = [0]
+    for i in range(1, len(shots)):
+        prev, cur = shots[i - 1], shots[i]
+        cue = distance(prev["avgRgb"], cur["avgRgb"]) + abs(prev["durationSec"] - cur["durationSec"]) * 7.0
+        shots_since = i - boundaries[-1]
+        if (cue >= base and shots_since >= 2) or shots_since >= 8:
+            boundaries.append(i)
+    boundaries.append(len(shots))
+    return [
+        {
+            "sceneId": i + 1,
+            "shotStartIndex": boundaries[i],
+            "shotEndIndex": boundaries[i + 1] - 1,
+            "startSec": float(shots[boundaries[i]]["startSec"]),
+            "endSec": float(shots[boundaries[i + 1] - 1]["endSec"]),
+        }
+        for i in range(len(boundaries) - 1)
+    ]
+
+
+def _shots(n: int, seed: int) -> list[dict[str, Any]]:
+    rng = random.Random(seed)
+    shots: list[dict[str, Any]] = synthetic_result(n, seed=seed)["shots"]
+    for shot in shots:
+        shot["motion"] = rng.uniform(0, 60)
+        shot["palette"] = [
+            {"rgb": [rng.randrange(256) for _ in range(3)], "share": share} for share in (0.4, 0.3, 0.2, 0.1)
+        ]
+    return shots
+
+
+def _best_ms(fn: Callable[[], Any], repeat: int) -> tuple[Any, float]:
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return out, round(best * 1000, 3)
+
+
+def bench(n: int, repeat: int, sensitivity: int, seed: int) -> dict[str, Any]:
+    shots = _shots(n, seed)
+    embeddings = np.random.default_rng(seed).standard_normal((n, 512)).astype(np.float32)
+    legacy, legacy_ms = _best_ms(lambda: _legacy_group_scenes(shots, sensitivity), max(1, repeat // 2))
+    report: dict[str, Any] = {"shots": n, "legacyMs": legacy_ms, "configs": {}}
+    for name, options in _CONFIGS.items():
+        segmenter = SceneSegmenter(sensitivity, **options)
+        emb = embeddings if "embedding" in segmenter.cues else None
+        features, features_ms = _best_ms(lambda: shot_features(shots, blocks=segmenter.blocks, embeddings=emb), repeat)
+        scenes, segment_ms = _best_ms(lambda: segmenter.segment(features, shots), repeat)
+        row: dict[str, Any] = {"scenes": len(scenes), "featuresMs": features_ms, "segmentMs": segment_ms}
+        if name == "default":
+            _, total_ms = _best_ms(lambda: segment_scenes(shots, sensitivity), repeat)
+            row["totalMs"] = total_ms
+            row["speedup"] = round(legacy_ms / total_ms, 1) if total_ms else None
+            row["matchesLegacy"] = scenes == legacy
+        report["configs"][name] = row
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark scene segmentation.")
+    parser.add_argument("--shots", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sensitivity", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps([bench(n, args.repeat, args.sensitivity, args.seed) for n in args.shots], indent=2))
+
+
+if __name__ == "__main__":
+    main()
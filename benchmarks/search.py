@@ -0,0 +1,116 @@
+import argparse
+import json
+import shutil
+import tempfile
+import time
+from typing import Any
+
+import numpy as np
+
+from app.backend.search import VectorIndex
+
+# Similar-shot search latency on synthetic shot vectors:
+#
+#   python -m benchmarks.search --rows 1000000 --dim 64
+#
+# Vectors are drawn around random "look" centres (films reuse a few set-ups,
+# so real shots cluster too), split into films of --film-shots shots and
+# indexed in a temporary directory. Queries are indexed shots, excluded from
+# their own results like GET /api/search/similar does. Brute force is the
+# reference: recall@k of the ivf/ivfpq modes is the share of its k results they
+# also return. appendSec is the time to add one more film to the built index
+# without retraining, as the server and the batch CLI do.
+
+
+def _vectors(rows: int, dim: int, clusters: int, seed: int, chunk: int = 1 << 17) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    out = np.empty((rows, dim), dtype=np.float32)
+    for start in range(0, rows, chunk):
+        n = min(chunk, rows - start)
+        block = centres[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim), dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        out[start : start + n] = block
+    return out
+
+
+def _films(vectors: np.ndarray, film_shots: int):
+    for i, start in enumerate(range(0, len(vectors), film_shots)):
+        part = vectors[start : start + film_shots]
+        yield f"film{i:05d}", np.arange(1, len(part) + 1, dtype=np.int32), part
+
+
+def _latency(
+    index: VectorIndex, queries: np.ndarray, k: int, **options: Any
+) -> tuple[list[np.ndarray], dict[str, Any]]:
+    found, times = [], []
+    for row in queries.tolist():
+        start = time.perf_counter()
+        rows, _ = index.search(index.vectors[row], k, exclude_rows=[row], **options)
+        times.append(time.perf_counter() - start)
+        found.append(rows)
+    ms = np.array(times) * 1000
+    return found, {
+        "p50Ms": round(float(np.percentile(ms, 50)), 3),
+        "p95Ms": round(float(np.percentile(ms, 95)), 3),
+        "meanMs": round(float(ms.mean()), 3),
+    }
+
+
+def _recall(found: list[np.ndarray], truth: list[np.ndarray], k: int) -> float:
+    hits = sum(len(np.intersect1d(f, t)) for f, t in zip(found, truth))
+    return round(hits / max(1, k * len(truth)), 4)
+
+
+def bench(args: argparse.Namespace, rows: int) -> dict[str, Any]:
+    vectors = _vectors(rows, args.dim, args.clusters, args.seed)
+    root = tempfile.mkdtemp(prefix="cinemetrics_search_")
+    try:
+        start = time.perf_counter()
+        films = _films(vectors, args.film_shots)
+        index = VectorIndex.build(f"{root}/index", films, nlist=args.nlist, seed=args.seed)
+        build_sec = time.perf_counter() - start
+        del vectors
+        queries = np.random.default_rng(args.seed + 1).choice(index.rows, args.queries, replace=False)
+        truth, exact = _latency(index, queries, args.k, mode="exact")
+        report: dict[str, Any] = {
+            "rows": index.rows,
+            "dim": args.dim,
+            "nlist": index.info["nlist"],
+            "pqM": index.info["pqM"],
+            "buildSec": round(build_sec, 3),
+            "modes": {"exact": exact},
+        }
+        for nprobe in args.nprobe:
+            for mode in ("ivf", "ivfpq"):
+                found, row = _latency(index, queries, args.k, mode=mode, nprobe=nprobe, rerank=args.rerank)
+                row[f"recall@{args.k}"] = _recall(found, truth, args.k)
+                row["speedup"] = round(exact["p50Ms"] / row["p50Ms"], 1) if row["p50Ms"] else None
+                report["modes"][f"{mode}_nprobe{nprobe}"] = row
+        extra = _vectors(args.film_shots, args.dim, args.clusters, args.seed + 2)
+        start = time.perf_counter()
+        index = index.extend([("appended", np.arange(1, len(extra) + 1, dtype=np.int32), extra)])
+        report["appendSec"] = round(time.perf_counter() - start, 3)
+        return report
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark similar-shot search.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000])
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--film-shots", type=int, default=1500)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16])
+    parser.add_argument("--rerank", type=int, default=16)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps([bench(args, n) for n in args.rows], indent=2))
+
+
+if __name__ == "__main__":
+    main()
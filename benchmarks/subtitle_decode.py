@@ -0,0 +1,67 @@
+import argparse
+import json
+import time
+
+import cv2
+
+from app.backend.algorithms.framereader import iter_sampled_ffmpeg, iter_sampled_opencv, video_size
+
+# Decode-only comparison of the subtitle sampler strategies on a real file:
+#
+#   python -m benchmarks.subtitle_decode path/to/feature.mp4 --step 48
+
+
+def _seek_per_sample(v_path: str, step: int, box) -> int:
+    # Pre-refactor strategy: one CAP_PROP_POS_FRAMES seek per sample, full-frame decode.
+    cap = cv2.VideoCapture(v_path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    y0, y1, x0, x1 = box
+    n = 0
+    i = 0
+    while i < frame_count:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, i)
+        ok, frame = cap.read()
+        if not ok:
+            break
+        _ = frame[y0:y1, x0:x1]
+        n += 1
+        i += step
+    cap.release()
+    return n
+
+
+def _timed(fn) -> dict:
+    start = time.perf_counter()
+    samples = fn()
+    elapsed = time.perf_counter() - start
+    return {"samples": samples, "seconds": round(elapsed, 3), "samplesPerSec": round(samples / elapsed, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare subtitle sampling decoders.")
+    parser.add_argument("video")
+    parser.add_argument("--step", type=int, default=48)
+    parser.add_argument("--skip-seek", action="store_true", help="skip the slow seek-per-sample baseline")
+    args = parser.parse_args()
+
+    w, h, n = video_size(args.video)
+    band = ((h // 3) * 2, h, w // 20, (w // 20) * 19)
+    report: dict = {"video": args.video, "frames": n, "width": w, "height": h, "step": args.step}
+
+    if not args.skip_seek:
+        report["seek"] = _timed(lambda: _seek_per_sample(args.video, args.step, band))
+    report["sequential"] = _timed(
+        lambda: sum(1 for _ in iter_sampled_opencv(args.video, args.step, box=band))
+    )
+    report["ffmpegBand"] = _timed(
+        lambda: sum(1 for _ in iter_sampled_ffmpeg(args.video, args.step, box=band))
+    )
+    if "seek" in report:
+        base = report["seek"]["seconds"]
+        for key in ("sequential", "ffmpegBand"):
+            report[key]["speedup"] = round(base / report[key]["seconds"], 2) if report[key]["seconds"] else None
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Callable
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import ensure_videos, parse_size
+
+# Stage benchmark suite on synthetic videos:
+#
+#   python -m benchmarks.suite --seconds 30 120 --sizes 640x360 1280x720 --out bench.json
+#   python -m benchmarks.suite --baseline bench.json --fail-on-regression
+#
+# Times predict_frames, keyframe extraction, shotscale.predict, ObjectDetection,
+# ColorAnalysis, scene segmentation and the full analyze_video on each video. Stages
+# whose model or framework is not available are reported as "skipped" with the
+# reason, so the suite runs (partially) anywhere. Keyframe extraction uses the
+# ground-truth cuts, so it does not depend on TransNetV2.
+
+
+def _env() -> dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpuCount": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+    }
+
+
+def _timed(fn: Callable[[], int], repeat: int) -> dict[str, Any]:
+    best = float("inf")
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = fn()
+        best = min(best, time.perf_counter() - start)
+    return {
+        "status": "ok",
+        "seconds": round(best, 6),
+        "items": items,
+        "perItemMs": round(best * 1000 / items, 3) if items else None,
+    }
+
+
+def _skipped(exc: BaseException) -> dict[str, Any]:
+    return {"status": "skipped", "reason": f"{type(exc).__name__}: {exc}"[:300]}
+
+
+def _cut_accuracy(predicted: list[int], truth: list[int], tolerance: int = 2) -> dict[str, float]:
+    matched = sum(1 for c in truth if any(abs(c - p) <= tolerance for p in predicted))
+    hits = sum(1 for p in predicted if any(abs(c - p) <= tolerance for c in truth))
+    return {
+        "precision": round(hits / len(predicted), 3) if predicted else 0.0,
+        "recall": round(matched / len(truth), 3) if truth else 1.0,
+    }
+
+
+class _Models:
+    # Loaded lazily once per suite run; a failed load is remembered as the skip reason.
+    def __init__(self) -> None:
+        self._cache: dict[str, Any] = {}
+
+    def get(self, name: str, loader: Callable[[], Any]) -> Any:
+        if name not in self._cache:
+            try:
+                self._cache[name] = loader()
+            except BaseException as exc:  # ImportError, missing weights, cv2.error, ...
+                self._cache[name] = exc
+        value = self._cache[name]
+        if isinstance(value, BaseException):
+            raise value
+        return value
+
+
+def _load_transnet():
+    from app.backend.algorithms.shotcutTransNetV2 import get_model
+
+    return get_model()
+
+
+def _load_shotscale():
+    from app.backend.algorithms.shotscale import get_shotscale
+
+    return get_shotscale(25)
+
+
+def _load_object_detection():
+    from app.backend.algorithms.objectDetection import ObjectDetection
+
+    detector = ObjectDetection(None)
+    detector.make_model()
+    return detector
+
+
+def bench_video(truth: dict[str, Any], models: _Models, repeat: int, full: bool) -> dict[str, Any]:
+    from app.backend.algorithms.img2Colors import ColorAnalysis
+    from app.backend.algorithms.keyframes import FRAME_EXTENSIONS, KeyframeWriter, extract_keyframes
+    from app.backend.analysis_pipeline import _build_shots
+    from app.backend.scenes import segment_scenes
+
+    video = truth["video"]
+    stages: dict[str, Any] = {}
+    work = tempfile.mkdtemp(prefix="cinemetrics_bench_")
+    try:
+        frame_dir = os.path.join(work, "frame")
+
+        try:
+            model = models.get("transnet", _load_transnet)
+            frames = np.frombuffer(_decode_48x27(video), np.uint8).reshape([-1, 27, 48, 3])
+            result: dict[str, Any] = {}
+
+            def predict() -> int:
+                single, _ = model.predict_frames(frames)
+                # transNetV2_run cuts after the last frame of every scene but the final one.
+                scenes = model.predictions_to_scenes(single)
+                result["cuts"] = [int(end) + 1 for _, end in scenes[:-1]]
+                return len(frames)
+
+            stages["predict_frames"] = _timed(predict, 1)
+            stages["predict_frames"]["accuracy"] = _cut_accuracy(result["cuts"], truth["cuts"])
+        except BaseException as exc:
+            stages["predict_frames"] = _skipped(exc)
+
+        # extract_keyframes takes the last frame of each shot, like TransNetV2's output.
+        ends = [c - 1 for c in truth["cuts"]]
+        shot_len: list[list[int]] = []
+
+        def keyframes() -> int:
+            writer = KeyframeWriter(frame_dir)
+            writer.clear()
+            shot_len[:] = extract_keyframes(video, ends, writer)
+            return len(shot_len) + 1
+
+        stages["keyframes"] = _timed(keyframes, repeat)
+        frame_files = sorted(f for f in os.listdir(frame_dir) if f.lower().endswith(FRAME_EXTENSIONS))
+        paths = [os.path.join(frame_dir, f) for f in frame_files]
+
+        try:
+            runner = models.get("shotscale", _load_shotscale)
+            stages["shotscale"] = _timed(lambda: sum(1 for p in paths if runner.predict(p)), 1)
+        except BaseException as exc:
+            stages["shotscale"] = _skipped(exc)
+
+        try:
+            detector = models.get("objects", _load_object_detection)
+            detector.image_path = work
+            stages["object_detection"] = _timed(
+                lambda: len(detector.object_detection(plot=False, write_csv=False) or []), 1
+            )
+        except BaseException as exc:
+            stages["object_detection"] = _skipped(exc)
+
+        def colors() -> int:
+            analysis = ColorAnalysis(None)
+            for path in paths:
+                analysis.filename = path
+                points, counts = analysis.load_weighted()
+                centers = analysis.kmeans(points, min(5, len(points)), counts)
+                analysis.calculate_distances(centers, points)
+            return len(paths)
+
+        stages["color_analysis"] = _timed(colors, repeat)
+
+        meta = {"frameCount": truth["frames"], "durationSec": truth["frames"] / truth["fps"]}
+        shots = _build_shots(shot_len, frame_files, frame_dir, truth["fps"], meta, "bench", None)
+        stages["group_scenes"] = _timed(lambda: len(segment_scenes(shots, 6)) and len(shots), max(repeat, 5))
+
+        if full:
+            stages["analyze_video"] = _bench_full(video, models)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    return {
+        "frames": truth["frames"],
+        "width": truth["width"],
+        "height": truth["height"],
+        "shots": len(truth["shots"]),
+        "stages": stages,
+    }
+
+
+def _decode_48x27(video: str) -> bytes:
+    import ffmpeg
+
+    out, _ = (
+        ffmpeg.input(video)
+        .output("pipe:", format="rawvideo", pix_fmt="rgb24", s="48x27")
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+    raw: bytes = out
+    return raw
+
+
+def _bench_full(video: str, models: _Models) -> dict[str, Any]:
+    from app.backend.analysis_pipeline import _safe_stem, analyze_video
+    from app.backend.result_store import IMG_ROOT
+
+    try:
+        models.get("transnet", _load_transnet)
+    except BaseException as exc:
+        return _skipped(exc)
+    flags = {}
+    for flag, name, loader in (
+        ("include_shot_scale", "shotscale", _load_shotscale),
+        ("include_object_detection", "objects", _load_object_detection),
+    ):
+        try:
+            models.get(name, loader)
+            flags[flag] = True
+        except BaseException:
+            flags[flag] = False
+    out: dict[str, Any] = {}
+    filename = f"bench_{os.path.basename(video)}"
+
+    def run() -> int:
+        result = analyze_video(
+            video_path=video,
+            original_filename=filename,
+            include_shot_scale=flags["include_shot_scale"],
+            include_object_detection=flags["include_object_detection"],
+        )
+        out["timings"] = result["meta"]["timings"]
+        return len(result["shots"])
+
+    try:
+        entry = _timed(run, 1)
+    except BaseException as exc:
+        return _skipped(exc)
+    finally:
+        shutil.rmtree(os.path.join(IMG_ROOT, _safe_stem(filename)), ignore_errors=True)
+    entry["flags"] = flags
+    entry["timings"] = out["timings"]
+    return entry
+
+
+def compare(report: dict[str, Any], baseline: dict[str, Any], tolerance: float, min_seconds: float) -> list[dict]:
+    rows = []
+    for video, current in report["videos"].items():
+        base_video = baseline.get("videos", {}).get(video)
+        if not base_video:
+            continue
+        for stage, cur in current["stages"].items():
+            base = base_video["stages"].get(stage)
+            if not base or cur.get("status") != "ok" or base.get("status") != "ok":
+                continue
+            slower = cur["seconds"] - base["seconds"] > min_seconds
+            ratio = cur["seconds"] / base["seconds"] if base["seconds"] else None
+            regressed = slower and (ratio is None or ratio > 1 + tolerance)
+            rows.append(
+                {
+                    "video": video,
+                    "stage": stage,
+                    "baseline": base["seconds"],
+                    "current": cur["seconds"],
+                    "ratio": round(ratio, 3) if ratio is not None else None,
+                    "regressed": regressed,
+                }
+            )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark analysis stages on synthetic videos.")
+    parser.add_argument("--videos-dir", default=os.path.join(tempfile.gettempdir(), "cinemetrics_bench_videos"))
+    parser.add_argument("--seconds", type=float, nargs="+", default=[30.0])
+    parser.add_argument("--sizes", nargs="+", default=["640x360"], help="WxH")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="best-of-N for the cheap stages")
+    parser.add_argument("--no-full", action="store_true", help="skip the full analyze_video run")
+    parser.add_argument("--out", default=None, help="write the JSON report here")
+    parser.add_argument("--baseline", default=None, help="compare against a previous report")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown ratio")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="ignore smaller absolute slowdowns")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    truths = ensure_videos(args.videos_dir, args.seconds, [parse_size(s) for s in args.sizes], args.seed)
+    models = _Models()
+    report: dict[str, Any] = {"env": _env(), "videos": {}}
+    for truth in truths:
+        name = os.path.basename(truth["video"])
+        report["videos"][name] = bench_video(truth, models, args.repeat, not args.no_full)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            rows = compare(report, json.load(f), args.tolerance, args.min_seconds)
+        report["comparison"] = rows
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+    regressions = [r for r in report.get("comparison", []) if r["regressed"]]
+    for r in regressions:
+        print(
+            f"REGRESSION {r['video']} {r['stage']}: {r['baseline']:.3f}s -> {r['current']:.3f}s (x{r['ratio']})",
+            file=sys.stderr,
+        )
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+from typing import Any
+
+import cv2
+import numpy as np
+
+# Synthetic test videos with known ground truth:
+#
+#   python -m benchmarks.synthetic bench_videos --seconds 30 120 --sizes 640x360 1280x720
+#
+# Each shot is a layout of flat colour blocks plus zero to three "people"
+# (head + torso + legs silhouettes) framed as a long, medium or close-up shot,
+# drifting slightly so consecutive frames are not identical. Hard cuts happen
+# at known frames. A <video>.json sidecar records the cuts, the shots and the
+# intended framing of every shot.
+
+_SCALES = ("Long", "Medium", "Close-Up")
+
+
+def _person(frame: np.ndarray, cx: int, floor: int, height: int, color: tuple[int, int, int]) -> None:
+    head = max(2, height // 8)
+    cy = floor - height + head
+    cv2.circle(frame, (cx, cy), head, color, -1)
+    torso_w = max(2, int(head * 1.6))
+    cv2.rectangle(frame, (cx - torso_w, cy + head), (cx + torso_w, cy + head + height // 3), color, -1)
+    leg_top = cy + head + height // 3
+    cv2.line(frame, (cx - torso_w // 2, leg_top), (cx - torso_w, floor), color, max(1, head // 2))
+    cv2.line(frame, (cx + torso_w // 2, leg_top), (cx + torso_w, floor), color, max(1, head // 2))
+
+
+def _shot_layout(rng: np.random.Generator, w: int, h: int) -> dict[str, Any]:
+    blocks = []
+    for _ in range(int(rng.integers(2, 5))):
+        x0, y0 = int(rng.integers(0, w * 3 // 4)), int(rng.integers(0, h * 3 // 4))
+        blocks.append(
+            {
+                "box": (x0, y0, x0 + int(rng.integers(w // 8, w // 2)), y0 + int(rng.integers(h // 8, h // 2))),
+                "color": tuple(int(c) for c in rng.integers(0, 256, 3)),
+            }
+        )
+    scale = _SCALES[int(rng.integers(0, len(_SCALES)))]
+    people = int(rng.integers(0, 4))
+    # A close-up shows a figure several times the frame height (head and shoulders only).
+    height = {"Long": h // 3, "Medium": int(h * 1.1), "Close-Up": int(h * 2.6)}[scale]
+    floor = {"Long": h - h // 8, "Medium": int(h * 1.35), "Close-Up": int(h * 2.9)}[scale]
+    return {
+        "background": tuple(int(c) for c in rng.integers(0, 256, 3)),
+        "blocks": blocks,
+        "scale": scale if people else "Empty",
+        "people": [
+            {"cx": int(rng.integers(w // 6, w * 5 // 6)), "color": tuple(int(c) for c in rng.integers(0, 256, 3))}
+            for _ in range(people)
+        ],
+        "height": height,
+        "floor": floor,
+        "drift": int(rng.choice([-2, -1, 1, 2])),
+    }
+
+
+def _render(layout: dict[str, Any], t: int, w: int, h: int, noise: np.ndarray) -> np.ndarray:
+    frame = np.empty((h, w, 3), dtype=np.uint8)
+    frame[:] = layout["background"]
+    for block in layout["blocks"]:
+        x0, y0, x1, y1 = block["box"]
+        cv2.rectangle(frame, (x0, y0), (x1, y1), block["color"], -1)
+    for person in layout["people"]:
+        _person(frame, person["cx"] + layout["drift"] * t, layout["floor"], layout["height"], person["color"])
+    return cv2.add(frame, noise)
+
+
+def make_video(
+    path: str,
+    *,
+    seconds: float = 30.0,
+    size: tuple[int, int] = (640, 360),
+    fps: float = 24.0,
+    shot_seconds: tuple[float, float] = (1.0, 4.0),
+    seed: int = 0,
+) -> dict[str, Any]:
+    rng = np.random.default_rng(seed)
+    w, h = size
+    total = int(round(seconds * fps))
+    shots: list[dict[str, Any]] = []
+    start = 0
+    while start < total:
+        length = min(total - start, max(2, int(rng.uniform(*shot_seconds) * fps)))
+        shots.append({"start": start, "end": start + length, "length": length})
+        start += length
+
+    noise_bank = [rng.integers(0, 6, (h, w, 3), dtype=np.uint8) for _ in range(4)]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter.fourcc(*"mp4v"), fps, (w, h))
+    if not writer.isOpened():
+        raise RuntimeError(f"Cannot open a video writer for {path}")
+    try:
+        for shot in shots:
+            layout = _shot_layout(rng, w, h)
+            shot["scale"] = layout["scale"]
+            shot["people"] = len(layout["people"])
+            shot["background"] = list(layout["background"])
+            for t in range(shot["length"]):
+                writer.write(_render(layout, t, w, h, noise_bank[t % len(noise_bank)]))
+    finally:
+        writer.release()
+
+    truth = {
+        "video": os.path.abspath(path),
+        "fps": fps,
+        "width": w,
+        "height": h,
+        "frames": total,
+        "seed": seed,
+        "cuts": [s["start"] for s in shots[1:]],
+        "shots": shots,
+    }
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(truth, f, indent=1)
+    return truth
+
+
+def parse_size(text: str) -> tuple[int, int]:
+    w, h = text.lower().split("x")
+    return int(w), int(h)
+
+
+def ensure_videos(
+    out_dir: str, seconds: list[float], sizes: list[tuple[int, int]], seed: int = 0
+) -> list[dict[str, Any]]:
+    # Reuse existing videos with the same parameters; generation is deterministic.
+    truths = []
+    for sec in seconds:
+        for w, h in sizes:
+            path = os.path.join(out_dir, f"synthetic_{int(sec)}s_{w}x{h}_s{seed}.mp4")
+            sidecar = path + ".json"
+            if os.path.exists(path) and os.path.exists(sidecar):
+                with open(sidecar, encoding="utf-8") as f:
+                    truths.append(json.load(f))
+            else:
+                truths.append(make_video(path, seconds=sec, size=(w, h), seed=seed))
+    return truths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate synthetic benchmark videos.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[30.0])
+    parser.add_argument("--sizes", nargs="+", default=["640x360"], help="WxH")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    truths = ensure_videos(args.out_dir, args.seconds, [parse_size(s) for s in args.sizes], args.seed)
+    for t in truths:
+        print(f"{t['video']}: {t['frames']} frames, {len(t['shots'])} shots")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+
+from app.backend.algorithms.wordcloud2frame import WordCloud2Frame, get_jieba
+
+# Word-frequency engine on a synthetic subtitle corpus:
+#
+#   python -m benchmarks.wordfreq --rows 200000 --parallel 4
+
+_PHRASES = [
+    "我们今天晚上去哪里", "这件事情你不要告诉别人", "电影院门口见", "他已经离开这座城市了",
+    "你还记得那年夏天吗", "请把门关上", "警察马上就到", "我不相信你说的话",
+    "天气预报说明天有雨", "这是我们最后一次见面", "火车站人很多", "妈妈做的饭最好吃",
+    "快跑", "小心后面", "对不起我来晚了", "我们结婚吧",
+]
+
+
+def _legacy_wordfrequency(filename: str) -> dict:
+    # Pre-refactor algorithm (string concatenation, dict counting, full sort), prints removed.
+    jieba = get_jieba()
+    data = []
+    with open(filename, encoding="utf-8") as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader)
+        for row in reader:
+            data.append(row[1])
+    allstr = ""
+    for d in data:
+        allstr = allstr + " " + d.replace(", ", ",").replace(" ", "")
+    tf: dict = {}
+    for seg in jieba.cut(allstr, cut_all=False):
+        tf[seg] = tf.get(seg, 0) + 1
+    for seg in list(tf):
+        if "一" in seg or "," in seg or ";" in seg or " " in seg:
+            tf.pop(seg)
+    pairs = sorted(((n, w) for w, n in tf.items()), reverse=True)
+    return {w: n for n, w in pairs}
+
+
+def _write_corpus(path: str, rows: int, seed: int) -> None:
+    rng = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["FrameId", "Subtitles"])
+        for i in range(rows):
+            writer.writerow([i * 48, "".join(rng.sample(_PHRASES, 2))])
+
+
+def _timed(fn) -> tuple[float, dict]:
+    start = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - start, out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark subtitle word-frequency counting.")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--top", type=int, default=200)
+    parser.add_argument("--parallel", type=int, default=0)
+    parser.add_argument("--skip-legacy", action="store_true")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    get_jieba()  # dictionary load is a one-time cost, keep it out of the timings
+    wc2f = WordCloud2Frame()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "subtitle.csv")
+        _write_corpus(path, args.rows, args.seed)
+        report: dict = {"rows": args.rows, "top": args.top}
+        if not args.skip_legacy:
+            sec, legacy = _timed(lambda: _legacy_wordfrequency(path))
+            report["legacySec"] = round(sec, 3)
+        sec, full = _timed(lambda: wc2f.wordfrequency(path))
+        report["streamingSec"] = round(sec, 3)
+        sec, _ = _timed(lambda: wc2f.wordfrequency(path, top_n=args.top))
+        report["streamingTopNSec"] = round(sec, 3)
+        if args.parallel > 1:
+            sec, _ = _timed(lambda: wc2f.wordfrequency(path, top_n=args.top, parallel=args.parallel))
+            report["parallelTopNSec"] = round(sec, 3)
+            report["parallel"] = args.parallel
+        report["distinctWords"] = len(full)
+        if not args.skip_legacy:
+            report["speedup"] = round(report["legacySec"] / report["streamingTopNSec"], 2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()